@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+In-process fake of the SSC endpoints used by FortifyApi, for benchmarking the client. Listings are generated on the
+fly, uploads are read and discarded, and downloads are generated as they are sent, so the server itself needs little
+memory even for multi-GB transfers. Latency, payload size and error rate are configurable.
+"""
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+_LISTINGS = {
+    'projects': 'project_count',
+    'projectVersions': 'version_count',
+    'attributeDefinitions': 'attribute_definition_count',
+    'cloudjobs': 'cloudscan_job_count',
+}
+_CHILD_LISTING = re.compile(r'^/ssc/api/v1/projectVersions/(\d+)/(attributes|artifacts|issues)/?$')
+_PROJECT_VERSION = re.compile(r'^/ssc/api/v1/projectVersions/(\d+)$')
+_CLOUDSCAN_JOB = re.compile(r'^/ssc/api/v1/cloudjobs/([^/]+)$')
+_ARTIFACT = re.compile(r'^/ssc/api/v1/artifacts/(\d+)$')
+# Id of the first uploaded artifact, above the ids of listed artifacts
+_FIRST_UPLOADED_ARTIFACT_ID = 1000000
+_DOWNLOAD_BLOCK = b'\x5a' * (1024 * 1024)
+
+
+class MockSSC(object):
+    """
+    Fake SSC server running on a background thread.
+        with MockSSC(latency=0.005, version_count=10000) as ssc:
+            api = FortifyApi(ssc.url, token='benchmark')
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, payload_size=256, project_count=100,
+                 version_count=1000, attribute_definition_count=50, cloudscan_job_count=100, child_count=20,
+                 issue_count=1000, download_size=64 * 1024 * 1024, download_body=None, check_tokens=False,
+                 token_lifetime=3600, seed=0):
+        """
+        :param latency: seconds added to every response
+        :param jitter: maximum extra seconds added at random to every response
+        :param error_rate: fraction of requests answered with 503 Service Unavailable
+        :param payload_size: bytes of filler text in every generated entity
+        :param project_count: number of projects listed
+        :param version_count: number of project versions listed
+        :param attribute_definition_count: number of attribute definitions listed
+        :param cloudscan_job_count: number of cloudscan jobs listed
+        :param child_count: number of attributes and artifacts listed per project version
+        :param issue_count: number of issues listed per project version
+        :param download_size: bytes sent by the download endpoints
+        :param download_body: bytes sent by the download endpoints instead of download_size generated bytes, e.g. an
+                              FPR
+        :param check_tokens: answer 401 to requests not authenticated with basic credentials or with a token minted by
+                             /auth/token that has not expired or been revoked
+        :param token_lifetime: seconds until a minted token expires
+        :param seed: seed of the random generator used for jitter and errors
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self.project_count = project_count
+        self.version_count = version_count
+        self.attribute_definition_count = attribute_definition_count
+        self.cloudscan_job_count = cloudscan_job_count
+        self.child_count = child_count
+        self.issue_count = issue_count
+        self.download_size = download_size if download_body is None else len(download_body)
+        self.download_body = download_body
+        # Bytes after which downloads are cut off, None to send them whole
+        self.download_cut = None
+        self.check_tokens = check_tokens
+        self.token_lifetime = token_lifetime
+        self.requests = 0
+        # Requests authenticated with basic credentials, the costly check the client should avoid
+        self.basic_auths = 0
+        # Answer basic credentials with 401, as SSC does for a wrong password
+        self.reject_basic = False
+        # Minted token to the epoch time it expires at
+        self.tokens = {}
+        self.errors = 0
+        self.bytes_uploaded = 0
+        # Cloudscan job token to the states it goes through, one per poll; the last state is kept once reached
+        self.cloudscan_jobs = {}
+        # Processing states an uploaded artifact goes through, one per poll; the last state is kept once reached
+        self.artifact_states = ['SCHED_PROCESSING', 'PROCESSING', 'PROCESS_COMPLETE']
+        # Uploaded artifact id to the artifact and the states it has left to go through
+        self.artifacts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.ssc = self
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def entity(self, kind, entity_id):
+        return {
+            'id': entity_id,
+            'name': '%s-%d' % (kind, entity_id),
+            'project': {'id': entity_id % max(self.project_count, 1), 'name': 'project-%d' % (entity_id % 97)},
+            'description': 'x' * self.payload_size,
+            '_href': 'http://ssc/api/v1/%s/%d' % (kind, entity_id),
+        }
+
+    def cloudscan_job(self, token):
+        """Advance a cloudscan job to its next state and return it, or None for an unknown token."""
+        with self._lock:
+            states = self.cloudscan_jobs.get(token)
+            if not states:
+                return None
+            state = states.pop(0) if len(states) > 1 else states[0]
+        return {'jobToken': token, 'jobState': state, 'scaState': 'NOT_STARTED'}
+
+    def artifact(self, artifact_id, advance=True):
+        """Return an uploaded artifact, advanced to its next processing state unless advance is False."""
+        with self._lock:
+            artifact, states = self.artifacts.get(artifact_id, (None, None))
+            if artifact is None:
+                return None
+            if advance and len(states) > 1:
+                states.pop(0)
+            return dict(artifact, status=states[0])
+
+    def uploaded_artifacts(self, project_version_id):
+        """Return the artifacts uploaded to a project version, newest first."""
+        with self._lock:
+            ids = [artifact_id for artifact_id, (artifact, _) in self.artifacts.items()
+                   if artifact['projectVersionId'] == project_version_id]
+        return [self.artifact(artifact_id, advance=False) for artifact_id in sorted(ids, reverse=True)]
+
+    def revoke_tokens(self):
+        """Invalidate every minted token, as an SSC restart would."""
+        with self._lock:
+            self.tokens.clear()
+
+    def _authenticate(self, authorization):
+        """:return: 'basic' or 'token' for a valid Authorization header, None otherwise"""
+        scheme, _, credentials = (authorization or '').partition(' ')
+        with self._lock:
+            if scheme == 'Basic' and credentials and not self.reject_basic:
+                self.basic_auths += 1
+                return 'basic'
+            if scheme == 'FortifyToken' and self.tokens.get(credentials, 0) > time.time():
+                return 'token'
+        return None
+
+    def _mint_token(self):
+        with self._lock:
+            token = base64.b64encode(('minted-%d' % len(self.tokens)).encode('utf-8')).decode('ascii')
+            terminal = time.time() + self.token_lifetime
+            self.tokens[token] = terminal
+        return {
+            'token': token,
+            'creationDate': time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime()),
+            'terminalDate': time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime(terminal)),
+        }
+
+    def _delay_and_fail(self):
+        """Apply the configured latency; return True if the request must fail."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        return fail
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def _handle(self, method):
+        ssc = self.server.ssc
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.startswith('/ssc/upload/'):
+            return self._upload(ssc, query)
+
+        body = self._read_body()
+        if ssc._delay_and_fail():
+            return self._send_json(503, {'message': 'Service Unavailable', 'responseCode': 503})
+
+        authenticated = ssc._authenticate(self.headers.get('Authorization'))
+        if ssc.check_tokens and authenticated is None:
+            return self._send_json(401, {'message': 'Unauthorized', 'responseCode': 401})
+
+        if url.path.startswith('/ssc/download/'):
+            return self._download(ssc)
+
+        path = url.path
+        if path == '/ssc/api/v1/auth/token':
+            if authenticated != 'basic':
+                return self._send_json(401, {'message': 'Unauthorized', 'responseCode': 401})
+            return self._send_json(200, {'data': ssc._mint_token(), 'responseCode': 200})
+        name = path.rsplit('/', 1)[-1]
+        if method == 'GET' and path.startswith('/ssc/api/v1/') and name in _LISTINGS:
+            return self._listing(name, getattr(ssc, _LISTINGS[name]), query)
+
+        match = _CHILD_LISTING.match(path)
+        if match and method == 'GET':
+            uploaded = ssc.uploaded_artifacts(int(match.group(1))) if match.group(2) == 'artifacts' else None
+            if uploaded:
+                return self._send_listing(uploaded, query)
+            count = ssc.issue_count if match.group(2) == 'issues' else ssc.child_count
+            return self._listing(match.group(2), count, query)
+        if match and method == 'POST':
+            return self._send_json(201, {'data': json.loads(body or b'{}'), 'responseCode': 201})
+
+        match = _PROJECT_VERSION.match(path)
+        if match:
+            return self._send_json(200, {'data': ssc.entity('projectVersions', int(match.group(1))),
+                                         'responseCode': 200})
+
+        if path == '/ssc/api/v1/fileTokens':
+            return self._send_json(201, {'data': {'token': 'benchmark-file-token'}, 'responseCode': 201})
+        if path == '/ssc/api/v1/issueTemplates':
+            return self._send_json(200, {'data': [ssc.entity('issueTemplates', 1)], 'count': 1, 'responseCode': 200})
+        match = _CLOUDSCAN_JOB.match(path)
+        if match:
+            job = ssc.cloudscan_job(match.group(1))
+            if job is None:
+                return self._send_json(404, {'message': 'Not Found', 'responseCode': 404})
+            return self._send_json(200, {'data': job, 'responseCode': 200})
+        match = _ARTIFACT.match(path)
+        if match:
+            artifact = ssc.artifact(int(match.group(1)))
+            if artifact is None:
+                return self._send_json(404, {'message': 'Not Found', 'responseCode': 404})
+            return self._send_json(200, {'data': artifact, 'responseCode': 200})
+
+        if path == '/ssc/api/v1/bulk':
+            requests = json.loads(body)['requests']
+            data = [{'request': request, 'responses': [{'request': request, 'body': self._bulk_body(ssc, request)}]}
+                    for request in requests]
+            return self._send_json(200, {'data': data, 'responseCode': 200})
+
+        return self._send_json(404, {'message': 'Not Found', 'responseCode': 404})
+
+    @staticmethod
+    def _bulk_body(ssc, request):
+        path = urlparse(request['uri']).path
+        match = _CLOUDSCAN_JOB.match(path)
+        if request['httpVerb'] == 'GET' and match:
+            job = ssc.cloudscan_job(match.group(1))
+            if job is None:
+                return {'message': 'Not Found', 'responseCode': 404}
+            return {'data': job, 'responseCode': 200}
+        match = _ARTIFACT.match(path)
+        if request['httpVerb'] == 'GET' and match:
+            artifact = ssc.artifact(int(match.group(1)))
+            if artifact is None:
+                return {'message': 'Not Found', 'responseCode': 404}
+            return {'data': artifact, 'responseCode': 200}
+        return {'data': request.get('postData'), 'responseCode': 200}
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _listing(self, kind, count, query):
+        start = max(int(query.get('start', ['0'])[0]), 0)
+        limit = int(query.get('limit', ['200'])[0])
+        end = count if limit < 0 else min(count, start + limit)
+        ids = range(start, end)
+        if query.get('orderby') == ['-id']:
+            ids = (count - 1 - index for index in ids)
+        data = [self.server.ssc.entity(kind, entity_id) for entity_id in ids]
+        self._send_listing(data, query, count)
+
+    def _send_listing(self, data, query, count=None):
+        """Send a page of entities. Without a count, data is the whole listing and the page is cut from it."""
+        if count is None:
+            count = len(data)
+            start = max(int(query.get('start', ['0'])[0]), 0)
+            limit = int(query.get('limit', ['200'])[0])
+            data = data[start:] if limit < 0 else data[start:start + limit]
+        fields = query.get('fields')
+        if fields:
+            wanted = fields[0].split(',')
+            data = [dict((field, entity[field]) for field in wanted if field in entity) for entity in data]
+        self._send_json(200, {'data': data, 'count': count, 'responseCode': 200})
+
+    def _upload(self, ssc, query):
+        # Read and discard the multipart body in chunks so multi-GB uploads need no memory
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            with ssc._lock:
+                ssc.bytes_uploaded += len(chunk)
+        if ssc._delay_and_fail():
+            return self._send(503, b'', 'text/xml')
+        with ssc._lock:
+            artifact_id = _FIRST_UPLOADED_ARTIFACT_ID + len(ssc.artifacts)
+            artifact = {
+                'id': artifact_id,
+                'projectVersionId': int(query.get('entityId', ['0'])[0]),
+                'originalFileName': query.get('Filename', [''])[0],
+                'uploadDate': '2017-01-01T00:00:%02d.000+0000' % (len(ssc.artifacts) % 60),
+            }
+            ssc.artifacts[artifact_id] = (artifact, list(ssc.artifact_states))
+        self._send(200, b'<?xml version="1.0"?><RequestStatus><code>0</code><msg>OK</msg></RequestStatus>',
+                   'text/xml')
+
+    def _download(self, ssc):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(ssc.download_size))
+        self.send_header('Content-Disposition', 'attachment; filename="benchmark.fpr"')
+        self.end_headers()
+        size = ssc.download_size if ssc.download_cut is None else min(ssc.download_cut, ssc.download_size)
+        # A cut download drops the connection short of its Content-Length
+        self.close_connection = ssc.download_cut is not None
+        if ssc.download_body is not None:
+            self.wfile.write(ssc.download_body[:size])
+            return
+        remaining = size
+        while remaining:
+            block = _DOWNLOAD_BLOCK if remaining >= len(_DOWNLOAD_BLOCK) else _DOWNLOAD_BLOCK[:remaining]
+            self.wfile.write(block)
+            remaining -= len(block)
+
+    def _send_json(self, code, payload):
+        self._send(code, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def _send(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
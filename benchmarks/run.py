@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks FortifyApi against the in-process MockSSC server.
+
+    python -m benchmarks.run                                    # run every scenario with the defaults
+    python -m benchmarks.run --scenarios list_full,list_paged --latency 0.01 --versions 20000
+    python -m benchmarks.run --transfer-size 4G --scenarios upload,download
+    python -m benchmarks.run --save benchmarks/results/baseline.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Each scenario runs in a fresh interpreter, so its peak RSS is not inflated by the scenarios that ran before it. For
+every scenario the run reports request throughput, data throughput where it applies, p50/p99 request latency and
+peak RSS. A saved run can be compared against later ones; differences beyond --threshold are flagged.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from fortifyapi import __version__ as version
+from fortifyapi.coalesce import SingleFlight
+from fortifyapi.fortify import FortifyApi
+from fortifyapi.poller import ArtifactPoller
+from fortifyapi.query import Query
+from fortifyapi.upload import UploadPipeline
+
+from .mock_ssc import MockSSC
+
+SCENARIOS = {}
+
+
+def scenario(function):
+    SCENARIOS[function.__name__] = function
+    return function
+
+
+@scenario
+def list_full(api, options):
+    """Unpaged listing of every project version (start=-1&limit=-1)."""
+    response = api.get_project_versions()
+    return {'entities': len(response.data['data'])}
+
+
+@scenario
+def list_paged(api, options):
+    """Paged listing of every project version, one page at a time."""
+    return {'entities': sum(1 for _ in api.iter_project_versions(page_size=options['page_size']))}
+
+
+@scenario
+def list_concurrent(api, options):
+    """Paged listing of every project version with pages prefetched in parallel."""
+    versions = api.iter_project_versions(page_size=options['page_size'], concurrency=options['concurrency'])
+    return {'entities': sum(1 for _ in versions)}
+
+
+@scenario
+def list_projected(api, options):
+    """Unpaged listing of every project version, returning only id, name and project."""
+    response = api.get_project_versions(query=Query().select('id', 'name', 'project.name'))
+    return {'entities': len(response.data['data'])}
+
+
+@scenario
+def attribute_posts(api, options):
+    """One POST per project version attribute."""
+    for index in range(options['operations']):
+        api.add_project_version_attribute(index % 100, index, 'value-%d' % index, None)
+    return {'entities': options['operations']}
+
+
+@scenario
+def attribute_bulk(api, options):
+    """The attribute_posts workload sent through the bulk endpoint."""
+    with api.bulk(max_batch_size=options['batch_size']) as batch:
+        for index in range(options['operations']):
+            batch.add_project_version_attribute(index % 100, index, 'value-%d' % index, None)
+    return {'entities': options['operations']}
+
+
+@scenario
+def concurrent_reads(api, options):
+    """Many threads reading project version attributes through one shared FortifyApi instance."""
+    per_thread = max(1, options['operations'] // options['concurrency'])
+
+    def worker(offset):
+        for index in range(per_thread):
+            api.get_project_version_attributes(offset + index)
+
+    threads = [threading.Thread(target=worker, args=(n * per_thread,)) for n in range(options['concurrency'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'entities': per_thread * options['concurrency']}
+
+
+@scenario
+def fanout_reads(api, options):
+    """Many threads reading the same few resources at once, with identical reads merged by a SingleFlight."""
+    api.single_flight = SingleFlight()
+    per_thread = max(1, options['operations'] // options['concurrency'])
+
+    def worker():
+        for index in range(per_thread):
+            api.get_project_version_attributes(index % 4)
+
+    threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'entities': per_thread * options['concurrency'], 'shared': api.single_flight.stats()['shared']}
+
+
+@scenario
+def export_issues(api, options):
+    """Issues of 16 project versions exported to NDJSON.gz files, concurrency versions at a time."""
+    directory = tempfile.mkdtemp()
+    try:
+        results = api.export_issues(range(16), directory, max_workers=options['concurrency'],
+                                    page_size=options['page_size'])
+        exported = sum(response.data['count'] for response in results.values() if response.success)
+        written = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    finally:
+        shutil.rmtree(directory)
+    return {'entities': exported, 'file_bytes': written}
+
+
+@scenario
+def upload(api, options):
+    """Streaming upload of a transfer_size scan file."""
+    handle, path = tempfile.mkstemp(suffix='.fpr')
+    try:
+        # A sparse file: it costs no disk space, and reading it back is not limited by disk speed
+        os.ftruncate(handle, options['transfer_size'])
+        os.close(handle)
+        api.upload_artifact_scan(path, 1)
+    finally:
+        os.remove(path)
+    return {'bytes': options['transfer_size']}
+
+
+@scenario
+def upload_pipeline(api, options):
+    """operations small scan files uploaded to 4 project versions, concurrency at a time, until processed."""
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for n in range(options['operations']):
+            paths.append(os.path.join(directory, 'scan-{0}.fpr'.format(n)))
+            with open(paths[-1], 'wb') as f:
+                f.write(b'\0' * 64 * 1024)
+        intervals = dict((state, 0.01) for state in ArtifactPoller.INTERVALS)
+        with ArtifactPoller(api, intervals=intervals, default_interval=0.01) as poller:
+            with UploadPipeline(api, max_workers=options['concurrency'], poller=poller) as pipeline:
+                futures = pipeline.upload_all((path, n % 4) for n, path in enumerate(paths))
+        processed = sum(1 for future in futures if future.result()['status'] == 'PROCESS_COMPLETE')
+    finally:
+        shutil.rmtree(directory)
+    return {'entities': processed}
+
+
+@scenario
+def download(api, options):
+    """Streaming download of a transfer_size scan to a file."""
+    handle, path = tempfile.mkstemp(suffix='.fpr')
+    os.close(handle)
+    try:
+        response, _ = api.download_artifact_scan(1, destination=path)
+        written = response.data['size'] if response.success else 0
+    finally:
+        os.remove(path)
+    return {'bytes': written}
+
+
+def run_scenario(name, options):
+    """
+    Run a single scenario in this process.
+    :return: a dict of results
+    """
+    latencies = []
+    ssc = MockSSC(latency=options['latency'], jitter=options['jitter'], error_rate=options['error_rate'],
+                  payload_size=options['payload_size'], version_count=options['versions'],
+                  issue_count=options['issues'], download_size=options['transfer_size'])
+    with ssc:
+        with FortifyApi(ssc.url, token='benchmark', pool_maxsize=max(10, options['concurrency'])) as api:
+            api.add_hook('post_response', lambda record: latencies.append(record.elapsed))
+            started = time.time()
+            result = SCENARIOS[name](api, options)
+            elapsed = time.time() - started
+
+    latencies.sort()
+    result.update({
+        'elapsed': elapsed,
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed if elapsed else None,
+        'p50': _percentile(latencies, 50),
+        'p99': _percentile(latencies, 99),
+        'server_errors': ssc.errors,
+        'peak_rss': _peak_rss(),
+    })
+    if 'bytes' in result:
+        result['megabytes_per_second'] = result['bytes'] / elapsed / 1e6 if elapsed else None
+    if 'entities' in result:
+        result['entities_per_second'] = result['entities'] / elapsed if elapsed else None
+    return result
+
+
+def run_isolated(name, options):
+    """Run a scenario in a fresh interpreter and return its results."""
+    command = [sys.executable, '-m', 'benchmarks.run', '--worker', name, '--options', json.dumps(options)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output(command, cwd=root)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def compare(baseline, results, threshold):
+    """
+    :return: a list of (scenario, metric, baseline value, current value, relative change, regressed) tuples
+    """
+    # For these metrics a higher value is better; for the others, lower is better
+    higher_is_better = ('requests_per_second', 'entities_per_second', 'megabytes_per_second')
+    rows = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in higher_is_better + ('p50', 'p99', 'peak_rss'):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / float(old)
+            regressed = -change > threshold if metric in higher_is_better else change > threshold
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def _peak_rss():
+    """:return: peak resident set size of this process in bytes, or None where it cannot be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _git_revision():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _size(value):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    value = value.strip().upper()
+    if value[-1:] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def _format(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return '%.4g' % value
+    return str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark FortifyApi against a local mock SSC server.')
+    parser.add_argument('--scenarios', default=','.join(sorted(SCENARIOS)),
+                        help='comma separated scenarios to run, from: ' + ', '.join(sorted(SCENARIOS)))
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds of server latency per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='maximum random extra latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with 503')
+    parser.add_argument('--payload-size', type=int, default=256, help='filler bytes per listed entity')
+    parser.add_argument('--versions', type=int, default=5000, help='number of project versions listed')
+    parser.add_argument('--issues', type=int, default=2000, help='number of issues per project version')
+    parser.add_argument('--page-size', type=int, default=200, help='page size of the paged listings')
+    parser.add_argument('--operations', type=int, default=500, help='requests made by the attribute and read '
+                                                                    'scenarios')
+    parser.add_argument('--batch-size', type=int, default=50, help='sub-requests per bulk request')
+    parser.add_argument('--concurrency', type=int, default=8, help='threads or pages in flight')
+    parser.add_argument('--transfer-size', type=_size, default=_size('256M'),
+                        help='bytes uploaded and downloaded, e.g. 512M or 4G')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results with a JSON file written by --save')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change reported as a regression')
+    parser.add_argument('--in-process', action='store_true', help='run every scenario in this interpreter')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--options', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_scenario(args.worker, json.loads(args.options))))
+        return 0
+
+    options = {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'payload_size': args.payload_size,
+        'versions': args.versions,
+        'issues': args.issues,
+        'page_size': args.page_size,
+        'operations': args.operations,
+        'batch_size': args.batch_size,
+        'concurrency': args.concurrency,
+        'transfer_size': args.transfer_size,
+    }
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(unknown))
+
+    results = {}
+    columns = ('requests', 'requests_per_second', 'entities_per_second', 'megabytes_per_second', 'p50', 'p99',
+               'peak_rss')
+    print('%-18s' % 'scenario' + ''.join('%22s' % column for column in columns))
+    for name in names:
+        results[name] = run_scenario(name, options) if args.in_process else run_isolated(name, options)
+        print('%-18s' % name + ''.join('%22s' % _format(results[name].get(column)) for column in columns))
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'fortifyapi': version,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'options': options,
+        },
+        'results': results,
+    }
+
+    if args.save:
+        directory = os.path.dirname(os.path.abspath(args.save))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, sort_keys=True, indent=4, separators=(',', ': '))
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\ncompared with %s (revision %s)' % (args.compare, baseline.get('meta', {}).get('revision')))
+        for name, metric, old, new, change, regressed in compare(baseline, results, args.threshold):
+            regressions += regressed
+            print('%-18s %-22s %14s -> %-14s %+7.1f%%%s' % (name, metric, _format(old), _format(new), change * 100,
+                                                           '  REGRESSION' if regressed else ''))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
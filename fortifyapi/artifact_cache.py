@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import collections
+import contextlib
+import errno
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: entries are only locked between threads of one process
+    fcntl = None
+
+# os.rename does not replace an existing file on Windows, os.replace (Python 3.3+) does
+_replace = getattr(os, 'replace', os.rename)
+
+# Temporary files older than this many seconds are left over by crashed downloads and are removed during eviction
+STALE_TEMP_AGE = 24 * 3600
+
+
+class ArtifactCache(object):
+    """
+    Content-addressed on-disk cache of downloaded artifacts, which may be shared by several threads and processes.
+
+    Files are stored once per distinct content under objects/, named by their SHA-256, and an index entry per cache
+    key points at the content. Downloads are written to a temporary file and moved into place, so a file in the cache
+    is always complete. Each key is locked while it is looked up and filled, so concurrent requests for the same
+    artifact, in this process or another, wait for the first download instead of starting their own. Once the stored
+    files exceed max_bytes the least recently used ones are removed.
+    """
+
+    def __init__(self, directory, max_bytes=10 * 1024 ** 3):
+        """
+        :param directory: directory holding the cache, created if missing
+        :param max_bytes: total size of the stored files above which the least recently used ones are evicted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        for name in ('objects', 'index', 'locks', 'tmp'):
+            _makedirs(os.path.join(directory, name))
+        self._key_locks = {}
+        self._key_locks_guard = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counts = collections.Counter()
+
+    @staticmethod
+    def key(*parts):
+        """
+        :param parts: values identifying a download, e.g. host, kind, id and revision
+        :return: the cache key of the download
+        """
+        return hashlib.sha256(u'\0'.join(u'{0}'.format(part) for part in parts).encode('utf-8')).hexdigest()
+
+    @contextlib.contextmanager
+    def locked(self, key):
+        """Hold the lock of a key, both against other threads and, where fcntl is available, other processes."""
+        with self._key_lock(key):
+            with open(os.path.join(self.directory, 'locks', key + '.lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def lookup(self, key):
+        """
+        :param key: cache key
+        :return: the index entry of the key, a dict holding 'path', 'size', 'sha256' and 'content_disposition', or
+                 None on a miss
+        """
+        index_path = self._index_path(key)
+        try:
+            with open(index_path) as f:
+                entry = json.load(f)
+            # Touch the file so that eviction sees it as recently used
+            os.utime(entry['path'], None)
+        except (IOError, OSError, ValueError, KeyError):
+            # No entry, or one whose file has been evicted
+            if os.path.exists(index_path):
+                _remove(index_path)
+            self._count('misses')
+            return None
+        self._count('hits')
+        return entry
+
+    def temp_path(self):
+        """
+        :return: a path to download into before calling store
+        """
+        return os.path.join(self.directory, 'tmp', uuid.uuid4().hex + '.part')
+
+    def store(self, key, temp_path, sha256, content_disposition=None):
+        """
+        Move a completed download into the cache and evict least recently used files if the cache is over size.
+        :param key: cache key
+        :param temp_path: path returned by temp_path holding the downloaded file
+        :param sha256: hex SHA-256 of the file
+        :param content_disposition: Content-Disposition header of the download, kept to recover the file name
+        :return: the index entry
+        """
+        object_path = os.path.join(self.directory, 'objects', sha256[:2], sha256)
+        _makedirs(os.path.dirname(object_path))
+        if os.path.exists(object_path):
+            # Identical content is already stored under another key
+            _remove(temp_path)
+            os.utime(object_path, None)
+        else:
+            _replace(temp_path, object_path)
+
+        entry = {
+            'path': object_path,
+            'size': os.path.getsize(object_path),
+            'sha256': sha256,
+            'content_disposition': content_disposition,
+        }
+        index_temp = self.temp_path()
+        with open(index_temp, 'w') as f:
+            json.dump(entry, f)
+        _replace(index_temp, self._index_path(key))
+        self._count('stores')
+        self.evict(keep=object_path)
+        return entry
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used files until the stored files fit in max_bytes, and remove stale temporary files.
+        :param keep: path of a file that must not be removed, e.g. the one just stored
+        :return: number of files removed
+        """
+        with self.locked('evict'):
+            now = time.time()
+            temp_directory = os.path.join(self.directory, 'tmp')
+            for name in os.listdir(temp_directory):
+                path = os.path.join(temp_directory, name)
+                if now - _mtime(path, now) > STALE_TEMP_AGE:
+                    _remove(path)
+
+            files = []
+            for root, _, names in os.walk(os.path.join(self.directory, 'objects')):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                # A reader that already opened the file keeps reading it; index entries pointing at it become misses
+                _remove(path)
+                total -= size
+                removed += 1
+            self._count('evictions', removed)
+            return removed
+
+    def stats(self):
+        """
+        :return: a dict of hit, miss, store and eviction counts of this process
+        """
+        with self._stats_lock:
+            return dict((name, self._counts[name]) for name in ('hits', 'misses', 'stores', 'evictions'))
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._counts[name] += amount
+
+    def _index_path(self, key):
+        return os.path.join(self.directory, 'index', key + '.json')
+
+    @contextlib.contextmanager
+    def _key_lock(self, key):
+        # flock is per open file on Linux but per process elsewhere, so threads are serialized separately
+        with self._key_locks_guard:
+            lock, users = self._key_locks.get(key, (None, 0))
+            lock = lock or threading.Lock()
+            self._key_locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._key_locks_guard:
+                lock, users = self._key_locks[key]
+                if users == 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (lock, users - 1)
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _mtime(path, default):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return default
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
@@ -0,0 +1,556 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import asyncio
+import collections
+import hashlib
+import json
+import ntpath
+import os
+import time
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is an optional dependency, only needed for the asyncio client
+    aiohttp = None
+
+from . import __version__ as version
+from .fortify import (DOWNLOAD_CHUNK_SIZE, UPLOAD_CHUNK_SIZE, FortifyApi, FortifyApiError, FortifyResponse,
+                      MultipartFileEncoder)
+from .query import Query, query_params
+
+
+class AsyncFortifyApi(object):
+    """
+    asyncio counterpart of FortifyApi. Every method is a coroutine (the iter_* methods are async generators) returning
+    the same FortifyResponse objects as the synchronous client. All requests share a single aiohttp connection pool,
+    which is created on first use and released by close() or by leaving an ``async with`` block.
+    """
+
+    def __init__(self, host, username=None, password=None, token=None, verify_ssl=True, timeout=60, user_agent=None,
+                 client_version='17.10.0158', pool_maxsize=100, pool_maxsize_per_host=0, page_size=200):
+        if aiohttp is None:
+            raise ImportError('AsyncFortifyApi requires aiohttp, install it with: pip install fortifyapi[async]')
+
+        self.host = host
+        self.username = username
+        self.password = password
+        self.token = token
+        self.verify_ssl = verify_ssl
+        self.timeout = timeout
+        self.client_version = client_version
+        self.page_size = page_size
+        self.pool_maxsize = pool_maxsize
+        self.pool_maxsize_per_host = pool_maxsize_per_host
+        self._session = None
+
+        if not user_agent:
+            self.user_agent = 'fortify_api/' + version
+        else:
+            self.user_agent = user_agent
+
+        # Set auth_type based on what's been provided
+        if username is not None:
+            self.auth_type = 'basic'
+        elif token is not None:
+            self.auth_type = 'token'
+        else:
+            self.auth_type = 'unauthenticated'
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the underlying connection pool. The instance must not be used afterwards.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        """
+        Create the shared aiohttp session on first use, which has to happen inside the running event loop.
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize, limit_per_host=self.pool_maxsize_per_host,
+                                             ssl=None if self.verify_ssl else False)
+            headers = {'User-Agent': self.user_agent}
+            auth = None
+            if self.auth_type == 'basic':
+                auth = aiohttp.BasicAuth(self.username, self.password)
+            elif self.auth_type == 'token':
+                headers['Authorization'] = 'FortifyToken ' + self.token
+
+            # Mirror the requests semantics of the synchronous client: the timeout applies to connecting and to each
+            # socket read, not to the whole transfer, so large downloads are not cut off
+            timeout = aiohttp.ClientTimeout(sock_connect=self.timeout, sock_read=self.timeout)
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers, auth=auth, timeout=timeout)
+        return self._session
+
+    async def add_project_version_attribute(self, project_version_id, attribute_definition_id, value,
+                                            values, guid=None):
+        """
+        :param project_version_id: Project version id
+        :param attribute_definition_id: Attribute definition ID
+        :param guid: GUID
+        :param value: Value
+        :param values: Values
+        :return: A response object containing the result of the attribute change
+        """
+        project_version_attribute = dict(attributeDefinitionId=attribute_definition_id, guid=guid, value=value,
+                                         values=values)
+
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/attributes'
+        data = json.dumps(project_version_attribute)
+        return await self._request('POST', url, data=data)
+
+    async def commit_project_version(self, project_version_id):
+        """
+        Set the commit attribute of the specified project version to true
+        :param project_version_id:
+        :return: A response object containing the result of the attribute change
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id)
+        data = json.dumps({"committed": True})
+        return await self._request('PUT', url, data=data)
+
+    async def create_project_version(self, project_name, project_id, project_template, version_name, description):
+        """
+        :param project_name: Project name
+        :param project_id: Project ID
+        :param project_template: Project template
+        :param version_name: Version name
+        :param description: Description of project version
+        :return: A response object containing the created project version
+        """
+        issue_template_id = await self._get_issue_template_id(project_template)
+        data = json.dumps(FortifyApi.__formatted_application_version_payload__(project_name=project_name,
+                                                                               project_id=project_id,
+                                                                               version_name=version_name,
+                                                                               issue_template_id=issue_template_id,
+                                                                               description=description))
+        url = '/ssc/api/v1/projectVersions'
+        return await self._request('POST', url, data=data)
+
+    async def create_new_project_version(self, project_name, project_template, version_name, description):
+        """
+        :param project_name: Project name
+        :param project_template: Project template
+        :param version_name: Version name
+        :param description: Description of project version
+        :return: A response object containing the newly created project and project version
+        """
+        issue_template_id = await self._get_issue_template_id(project_template)
+        data = json.dumps(FortifyApi.__formatted_new_application_version_payload__(project_name=project_name,
+                                                                                   version_name=version_name,
+                                                                                   issue_template_id=issue_template_id,
+                                                                                   description=description))
+        url = '/ssc/api/v1/projectVersions'
+        return await self._request('POST', url, data=data)
+
+    async def download_artifact(self, artifact_id, destination=None, chunk_size=DOWNLOAD_CHUNK_SIZE, progress=None,
+                                checksum=None):
+        """
+        See FortifyApi.download_artifact
+        :return: A response object and the file name
+        """
+        url = "/ssc/download/artifactDownload.html?id=" + str(artifact_id) + "&clientVersion=" + self.client_version
+        return await self._download_file(url, destination, chunk_size, progress, checksum)
+
+    async def download_artifact_scan(self, artifact_id, destination=None, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                                     progress=None, checksum=None):
+        """
+        See FortifyApi.download_artifact_scan
+        :return: A response object and the file name
+        """
+        url = "/ssc/download/currentStateFprDownload.html?id=" + str(
+            artifact_id) + "&clientVersion=" + self.client_version + "&includeSource=true"
+        return await self._download_file(url, destination, chunk_size, progress, checksum)
+
+    async def get_artifact_scans(self, parent_id, query=None):
+        """
+        :param parent_id: parent resource identifier
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: A response object containing artifact scans
+        """
+        url = "/ssc/api/v1/artifacts/" + str(parent_id) + "/scans"
+        return await self._request('GET', url, params=query_params(query))
+
+    async def get_attribute_definition(self, search_expression):
+        """
+        :param search_expression: A fortify-formatted search expression, e.g. name:"Development Phase"
+        :return: A response object containing the result of the get
+        """
+        if search_expression:
+            url = '/ssc/api/v1/attributeDefinitions'
+            return await self._request('GET', url, params=Query(q=search_expression).params())
+        else:
+            return FortifyResponse(message='A search expression must be provided', success=False)
+
+    async def get_attribute_definitions(self, query=None):
+        """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: A response object containing all attribute definitions
+        """
+        url = '/ssc/api/v1/attributeDefinitions?start=-1&limit=-1'
+        return await self._request('GET', url, params=query_params(query))
+
+    async def get_cloudscan_jobs(self, query=None):
+        """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: A response object containing all cloudscan jobs
+        """
+        url = '/ssc/api/v1/cloudjobs?start=-1&limit=-1'
+        return await self._request('GET', url, params=query_params(query))
+
+    async def get_cloudscan_job_status(self, scan_id):
+        """
+        :return: A response object containing a cloudscan job
+        """
+        url = '/ssc/api/v1/cloudjobs/' + scan_id
+        return await self._request('GET', url)
+
+    async def get_file_token(self, purpose):
+        """
+        :param purpose: specify if the token is for file 'UPLOAD' or 'DOWNLOAD'
+        :return: a response body containing a file token for the specified purpose
+        """
+        if purpose not in ('UPLOAD', 'DOWNLOAD'):
+            return FortifyResponse(message='attribute purpose must be either UPLOAD or DOWNLOAD', success=False)
+
+        url = "/ssc/api/v1/fileTokens"
+        data = json.dumps({"fileTokenType": purpose})
+        return await self._request('POST', url, data=data)
+
+    async def get_issue_template(self, project_template_id):
+        """
+        :param project_template_id: id of project template
+        :return: A response object with data containing issue templates for the supplied project name
+        """
+        url = "/ssc/api/v1/issueTemplates"
+        params = Query(q={'id': project_template_id}).params()
+        params['limit'] = 1
+        return await self._request('GET', url, params=params)
+
+    async def get_project_version_artifacts(self, parent_id, query=None):
+        """
+        :param parent_id: parent resource identifier
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: A response object containing project version artifacts
+        """
+        url = "/ssc/api/v1/projectVersions/" + str(parent_id) + "/artifacts?start=-1&limit=-1"
+        return await self._request('GET', url, params=query_params(query))
+
+    async def get_project_version_attributes(self, project_version_id, query=None):
+        """
+        :param project_version_id: Project version id
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: A response object containing the project version attributes
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/attributes/?start=-1&limit=-1'
+        return await self._request('GET', url, params=query_params(query))
+
+    async def get_project_versions(self, query=None):
+        """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: A response object with data containing project versions
+        """
+        url = "/ssc/api/v1/projectVersions?start=-1&limit=-1"
+        return await self._request('GET', url, params=query_params(query))
+
+    async def get_projects(self, query=None):
+        """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: A response object with data containing projects
+        """
+        url = "/ssc/api/v1/projects?start=-1&limit=-1"
+        return await self._request('GET', url, params=query_params(query))
+
+    async def get_token(self, token_type=None, ttl=None):
+        """
+        :param token_type: token type to get
+        :param ttl: ttl for the token
+        :return: A response object with data containing create date, terminal date, and the actual token
+        """
+        url = '/ssc/api/v1/auth/token?'
+        if token_type is not None:
+            url = url + 'token=' + str(token_type) + '&'
+        if ttl is not None:
+            url = url + 'ttl=' + str(ttl)
+
+        return await self._request('GET', url)
+
+    def iter_attribute_definitions(self, page_size=None, concurrency=1, query=None):
+        """
+        :return: an async generator yielding one attribute definition at a time
+        """
+        return self._iter_paged('/ssc/api/v1/attributeDefinitions', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_cloudscan_jobs(self, page_size=None, concurrency=1, query=None):
+        """
+        :return: an async generator yielding one cloudscan job at a time
+        """
+        return self._iter_paged('/ssc/api/v1/cloudjobs', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_project_version_artifacts(self, parent_id, page_size=None, concurrency=1, query=None):
+        """
+        :return: an async generator yielding one artifact at a time
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(parent_id) + '/artifacts'
+        return self._iter_paged(url, params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_project_version_attributes(self, project_version_id, page_size=None, concurrency=1, query=None):
+        """
+        :return: an async generator yielding one attribute at a time
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/attributes'
+        return self._iter_paged(url, params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_project_version_issues(self, project_version_id, page_size=None, concurrency=1, query=None,
+                                    filterset=None, folder=None, show_hidden=False, show_removed=False,
+                                    show_suppressed=False):
+        """
+        :return: an async generator yielding one issue at a time
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/issues'
+        params = FortifyApi._issue_params(query, filterset, folder, show_hidden, show_removed, show_suppressed)
+        return self._iter_paged(url, params=params, page_size=page_size, concurrency=concurrency)
+
+    def iter_project_versions(self, page_size=None, concurrency=1, query=None):
+        """
+        :return: an async generator yielding one project version at a time
+        """
+        return self._iter_paged('/ssc/api/v1/projectVersions', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_projects(self, page_size=None, concurrency=1, query=None):
+        """
+        :return: an async generator yielding one project at a time
+        """
+        return self._iter_paged('/ssc/api/v1/projects', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    async def post_attribute_definition(self, attribute_definition):
+        """
+        :param attribute_definition:
+        :return:
+        """
+        url = '/ssc/api/v1/attributeDefinitions'
+        data = json.dumps(attribute_definition)
+        return await self._request('POST', url, data=data)
+
+    async def upload_artifact_scan(self, file_path, project_version_id, chunk_size=UPLOAD_CHUNK_SIZE, progress=None):
+        """
+        See FortifyApi.upload_artifact_scan. File reads are done on the default executor so the event loop is never
+        blocked on disk.
+        :return: Response from the file upload operation
+        """
+        response = await self.get_file_token('UPLOAD')
+        if not response.success:
+            return response
+        url = "/ssc/upload/resultFileUpload.html?mat=" + response.data['data']['token']
+
+        params = {
+            'entityId': project_version_id,
+            'clientVersion': self.client_version,
+            'Upload': "Submit Query",
+            'Filename': ntpath.basename(file_path)
+        }
+
+        loop = asyncio.get_event_loop()
+        with MultipartFileEncoder('file', file_path, chunk_size=chunk_size, progress=progress) as body:
+            async def chunks():
+                while True:
+                    chunk = await loop.run_in_executor(None, body.read, chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+
+            headers = {
+                'Accept': 'Accept:application/xml, text/xml, */*; q=0.01',
+                'Content-Type': body.content_type,
+                'Content-Length': str(len(body))
+            }
+            return await self._request('POST', url, params=params, data=chunks(), headers=headers)
+
+    async def _download_file(self, url, destination, chunk_size, progress, checksum):
+        """
+        Fetch a DOWNLOAD file token and download the given url, streaming to destination if one is given.
+        :return: A response object and the file name
+        """
+        response = await self.get_file_token('DOWNLOAD')
+        if not response.success:
+            return response, ''
+        url = url + "&mat=" + response.data['data']['token']
+
+        headers = {
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+            'Accept-Encoding': 'gzip, deflate'
+        }
+
+        if destination is not None:
+            response = await self._download(url, destination, headers, chunk_size, progress, checksum)
+        else:
+            response = await self._request('GET', url, headers=headers)
+
+        try:
+            file_name = response.headers['Content-Disposition'].split('=')[1].strip("\"'")
+        except (KeyError, IndexError, TypeError):
+            file_name = ''
+
+        return response, file_name
+
+    async def _download(self, url, destination, headers, chunk_size, progress, checksum):
+        """
+        Stream a GET response body to a file path or writable binary file-like object, one chunk at a time.
+        :return: A response object whose data is a dict holding the number of bytes written and the hex digest
+        """
+        digest = hashlib.new(checksum) if checksum else None
+        owns_file = isinstance(destination, str)
+        written = 0
+        try:
+            async with self._get_session().get(self.host + url, headers=headers) as response:
+                response.raise_for_status()
+
+                total = response.content_length if not response.headers.get('Content-Encoding') else None
+                out = open(destination, 'wb') if owns_file else destination
+                try:
+                    started = time.time()
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        out.write(chunk)
+                        written += len(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                        if progress is not None:
+                            elapsed = time.time() - started
+                            progress(written, total, written / elapsed if elapsed > 0 else None)
+                finally:
+                    if owns_file:
+                        out.close()
+        except (aiohttp.ClientError, asyncio.TimeoutError, IOError, OSError) as e:
+            if owns_file and os.path.exists(destination):
+                os.remove(destination)
+            if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                return self._error_response(e)
+            return FortifyResponse(message='Could not write the download to {0}. {1}'.format(destination, e),
+                                   success=False)
+
+        data = {'size': written, 'checksum': digest.hexdigest() if digest is not None else None}
+        return FortifyResponse(success=True, response_code=response.status, data=data, headers=response.headers)
+
+    def _error_response(self, e):
+        """
+        Translate an aiohttp exception into an unsuccessful response object, using the same messages as FortifyApi.
+        """
+        if isinstance(e, aiohttp.ClientSSLError):
+            return FortifyResponse(message='An SSL error occurred. {0}'.format(e), success=False)
+        if isinstance(e, aiohttp.ClientConnectionError):
+            return FortifyResponse(message='A connection error occurred. {0}'.format(e), success=False)
+        if isinstance(e, asyncio.TimeoutError):
+            return FortifyResponse(message='The request timed out after ' + str(self.timeout) + ' seconds.',
+                                   success=False)
+        # A ClientResponseError, e.g. from raise_for_status, carries the HTTP status like FortifyApi's HTTPError
+        response_code = e.status if isinstance(e, aiohttp.ClientResponseError) else -1
+        return FortifyResponse(message='There was an error while handling the request. {0}'.format(e), success=False,
+                               response_code=response_code)
+
+    async def _get_issue_template_id(self, project_template):
+        issue_template = await self.get_issue_template(project_template_id=project_template)
+        issue_template_id = issue_template.data['data'][0]['_href']
+        # SSC API returns the full url for the issue template, strip away just the ID
+        return issue_template_id.rsplit('/', 1)[1]
+
+    async def _get_page(self, url, params, start, limit):
+        """
+        Fetch a single page of a listing endpoint.
+        :return: a tuple of the entities on the page and the total count reported by SSC (None if not reported)
+        :raises FortifyApiError: if the page could not be retrieved
+        """
+        page_params = dict(params or {})
+        page_params.update({'start': start, 'limit': limit})
+        response = await self._request('GET', url, params=page_params)
+        if not response.success:
+            raise FortifyApiError(response)
+        return response.data.get('data') or [], response.data.get('count')
+
+    async def _iter_paged(self, url, params=None, page_size=None, concurrency=1):
+        """
+        Async counterpart of FortifyApi._iter_paged. With concurrency > 1 the remaining pages are requested as tasks
+        once the first page has reported the total count, keeping at most concurrency requests in flight.
+        """
+        page_size = page_size or self.page_size
+        start = 0
+        entities, count = await self._get_page(url, params, start, page_size)
+        while True:
+            for entity in entities:
+                yield entity
+
+            start += len(entities)
+            if not entities or (count is not None and start >= count) or (count is None and len(entities) < page_size):
+                return
+
+            if concurrency > 1 and count is not None:
+                # SSC may cap the page size below what was asked for, so step by what the first page actually held
+                offsets = iter(range(start, count, start))
+                pending = collections.deque()
+                try:
+                    for offset in offsets:
+                        pending.append(asyncio.ensure_future(self._get_page(url, params, offset, start)))
+                        if len(pending) >= concurrency:
+                            break
+                    while pending:
+                        entities, _ = await pending.popleft()
+                        for offset in offsets:
+                            pending.append(asyncio.ensure_future(self._get_page(url, params, offset, start)))
+                            break
+                        for entity in entities:
+                            yield entity
+                finally:
+                    for task in pending:
+                        task.cancel()
+                    # Wait for the cancellations to complete, so no task outlives the generator and no exception of
+                    # an abandoned page is left unretrieved
+                    if pending:
+                        await asyncio.gather(*pending, return_exceptions=True)
+                return
+
+            del entities
+            entities, count = await self._get_page(url, params, start, page_size)
+
+    async def _request(self, method, url, params=None, data=None, headers=None):
+        """Common handler for all HTTP requests."""
+        if not headers:
+            headers = {
+                'Accept': 'application/json'
+            }
+            if method == 'GET' or method == 'POST' or method == 'PUT':
+                headers.update({'Content-Type': 'application/json'})
+
+        try:
+            async with self._get_session().request(method, self.host + url, params=params, data=data,
+                                                   headers=headers) as response:
+                response.raise_for_status()
+                body = await response.read()
+
+                # two flavors of response are successful, GETs return 200, PUTs return 204 with empty response text.
+                # As in FortifyApi, the body is only decoded when the caller first reads data.
+                response_code = response.status
+                success = True if response_code // 100 == 2 else False
+                return FortifyResponse(success=success, response_code=response_code, raw=body,
+                                       headers=response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return self._error_response(e)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import calendar
+import re
+import threading
+import time
+
+import requests.auth
+import requests.exceptions
+
+# terminalDate as returned by SSC, e.g. 2017-10-20T14:22:35.000+0000
+_SSC_DATE = re.compile(r'^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.\d+)?(Z|[+-]\d\d:?\d\d)?$')
+
+
+class TokenMintError(requests.exceptions.RequestException):
+    """Raised when a token could not be minted from the basic credentials."""
+
+
+class TokenMinter(object):
+    """
+    Holds a FortifyToken minted from basic credentials, so that SSC checks the credentials once per token instead of
+    on every request. The token is minted on first use and minted again refresh_margin seconds before its
+    terminalDate: the first caller to notice mints the new token while concurrent callers keep using the current one.
+    Only when there is no usable token at all do callers wait, for a single mint shared by all of them.
+    """
+
+    def __init__(self, token_type='UnifiedLoginToken', ttl=None, refresh_margin=300):
+        """
+        :param token_type: type of the minted tokens, e.g. UnifiedLoginToken or AnalysisUploadToken
+        :param ttl: optional lifetime requested for the minted tokens, as understood by SSC
+        :param refresh_margin: seconds before its terminalDate at which a token is replaced
+        """
+        self.token_type = token_type
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.mints = 0
+        self._token = None
+        self._terminal = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._mint_lock = threading.Lock()
+
+    def token(self, mint):
+        """
+        :param mint: callable invoked as mint(token_type, ttl) when a token must be minted, returning the token and
+                     the epoch time of its terminalDate, or None if it has none
+        :return: a usable token
+        :raises TokenMintError: if there is no usable token and minting one failed
+        """
+        with self._lock:
+            token, terminal = self._token, self._terminal
+            usable = token is not None and (terminal is None or time.time() < terminal)
+            if usable and (terminal is None or time.time() < terminal - self.refresh_margin):
+                return token
+            refresh = usable and not self._refreshing
+            if refresh:
+                self._refreshing = True
+        if usable and not refresh:
+            # Another caller is already minting the replacement
+            return token
+
+        if refresh:
+            try:
+                return self._mint(mint)
+            except TokenMintError:
+                # The current token is still valid, the next caller tries again
+                return token
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        with self._mint_lock:
+            with self._lock:
+                if self._token is not None and self._token != token:
+                    # Minted by another caller while this one was waiting
+                    return self._token
+            return self._mint(mint)
+
+    def invalidate(self, token):
+        """
+        Drop a token SSC rejected, unless it has already been replaced.
+        :param token: the rejected token
+        """
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                self._terminal = None
+
+    def _mint(self, mint):
+        token, terminal = mint(self.token_type, self.ttl)
+        with self._lock:
+            self._token, self._terminal = token, terminal
+            self.mints += 1
+        return token
+
+
+class MintedTokenAuth(requests.auth.AuthBase):
+    """Authenticates requests with the current token of a TokenMinter."""
+
+    def __init__(self, minter, mint):
+        """
+        :param minter: the TokenMinter
+        :param mint: callable minting a token, passed to TokenMinter.token
+        """
+        self.minter = minter
+        self.mint = mint
+
+    def __call__(self, r):
+        r.headers['Authorization'] = 'FortifyToken ' + self.minter.token(self.mint)
+        return r
+
+
+def parse_ssc_date(value):
+    """
+    :param value: date as returned by SSC, e.g. 2017-10-20T14:22:35.000+0000
+    :return: the date as epoch seconds, or None if it is missing or not understood
+    """
+    match = _SSC_DATE.match(value or '')
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, zone = match.groups()
+    epoch = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    if zone and zone != 'Z':
+        zone = zone.replace(':', '')
+        offset = int(zone[1:3]) * 3600 + int(zone[3:5]) * 60
+        epoch -= offset if zone[0] == '+' else -offset
+    return epoch
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import collections
+import threading
+import time
+
+# Seconds an entry stays valid, per resource. Resources not listed here use default_ttl.
+DEFAULT_TTLS = {
+    'attribute_definition': 600,
+    'attribute_definitions': 600,
+    'file_token': 300,
+    'issue_template': 3600,
+}
+
+
+class TTLCache(object):
+    """
+    Thread-safe in-process cache for near-static SSC lookups. Entries expire after a per-resource TTL and the least
+    recently used entry is evicted once maxsize entries are held. Hits and misses are counted per resource.
+    """
+
+    def __init__(self, ttls=None, default_ttl=300, maxsize=1024):
+        """
+        :param ttls: dict of resource name to TTL in seconds, merged over DEFAULT_TTLS
+        :param default_ttl: TTL in seconds of resources missing from ttls
+        :param maxsize: maximum number of entries held across all resources
+        """
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl = default_ttl
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = collections.Counter()
+        self._misses = collections.Counter()
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, resource, key):
+        """
+        :param resource: resource name, e.g. 'issue_template'
+        :param key: lookup key within the resource
+        :return: the cached value, or None if it is missing or has expired
+        """
+        with self._lock:
+            entry = self._entries.pop((resource, key), None)
+            if entry is None or entry[0] <= time.time():
+                self._misses[resource] += 1
+                return None
+            # Re-insert to mark the entry as most recently used
+            self._entries[(resource, key)] = entry
+            self._hits[resource] += 1
+            return entry[1]
+
+    def set(self, resource, key, value):
+        """
+        :param resource: resource name, e.g. 'issue_template'
+        :param key: lookup key within the resource
+        :param value: value to cache for the resource's TTL
+        """
+        expires = time.time() + self.ttls.get(resource, self.default_ttl)
+        with self._lock:
+            self._entries.pop((resource, key), None)
+            self._entries[(resource, key)] = (expires, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, resource=None, key=None):
+        """
+        Drop cached entries. With no arguments the whole cache is cleared, with only a resource every entry of that
+        resource is dropped.
+        :param resource: resource name to invalidate
+        :param key: single key within the resource to invalidate
+        """
+        with self._lock:
+            if resource is None:
+                self._entries.clear()
+            elif key is not None:
+                self._entries.pop((resource, key), None)
+            else:
+                for cached in [cached for cached in self._entries if cached[0] == resource]:
+                    del self._entries[cached]
+
+    def stats(self):
+        """
+        :return: a dict with overall hit, miss and eviction counts, the current size, and hits/misses per resource
+        """
+        with self._lock:
+            resources = set(self._hits) | set(self._misses)
+            return {
+                'hits': sum(self._hits.values()),
+                'misses': sum(self._misses.values()),
+                'evictions': self._evictions,
+                'size': len(self._entries),
+                'resources': dict((resource, {'hits': self._hits[resource], 'misses': self._misses[resource]})
+                                  for resource in resources)
+            }
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import collections
+import threading
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'exception')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+    Thread-safe request coalescing. While a call for a key is in flight, further calls for the same key do not run
+    their own: they wait for the first one and get its result, or its exception. Nothing is kept once the call
+    returns, so unlike a cache this never serves a stale result, it only merges calls made at the same time.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, function):
+        """
+        :param key: hashable key; calls with equal keys are merged
+        :param function: callable taking no arguments, run only if no call for key is in flight
+        :return: the result of function, as returned to every merged caller
+        :raises: the exception raised by function, re-raised in every merged caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counts['calls'] += 1
+            else:
+                self._counts['shared'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """
+        :return: a dict holding the number of calls run ('calls') and of calls served by one already in flight
+                 ('shared')
+        """
+        with self._lock:
+            return {'calls': self._counts['calls'], 'shared': self._counts['shared']}
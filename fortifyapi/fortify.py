@@ -7,20 +7,62 @@ __contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
 __status__ = "Production"
 __license__ = "MIT"
 
-import urllib
+import collections
+import concurrent.futures
+import contextlib
+import itertools
 import urllib3
 import json
 import ntpath
+import os
+import time
+import hashlib
+import uuid
 import requests
+import requests.adapters
 import requests.auth
 import requests.exceptions
 import requests.packages.urllib3
 from . import __version__ as version
+from .auth import MintedTokenAuth, TokenMintError, parse_ssc_date
+from .export import open_writer
+from .metrics import RequestRecord
+from .query import Query, query_params
+from .retry import CircuitOpenError
+from .throttle import Throttle
+
+try:
+    string_types = basestring  # Python 2
+except NameError:
+    string_types = str  # Python 3
+
+try:
+    # orjson is an optional, faster JSON decoder; its errors subclass ValueError like those of json
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+# Bytes read from the socket and written to disk at a time when streaming a download
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Bytes read from disk at a time when streaming an upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Headers of artifact downloads
+DOWNLOAD_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive'
+}
+# Url fragments identifying requests that move a lot of data: uploads, downloads and unpaged listings
+HEAVY_URL_MARKERS = ('/ssc/upload/', '/ssc/download/', 'limit=-1')
+# Stands in for a throttle when none is configured
+_UNTHROTTLED = Throttle()
 
 
 class FortifyApi(object):
     def __init__(self, host, username=None, password=None, token=None, verify_ssl=True, timeout=60, user_agent=None,
-                 client_version='17.10.0158'):
+                 client_version='17.10.0158', pool_connections=10, pool_maxsize=10, pool_block=False, page_size=200,
+                 cache=None, retry=None, circuit_breaker=None, throttle=None, heavy_throttle=None,
+                 artifact_cache=None, single_flight=None, token_minter=None):
 
         self.host = host
         self.username = username
@@ -29,6 +71,25 @@ class FortifyApi(object):
         self.verify_ssl = verify_ssl
         self.timeout = timeout
         self.client_version = client_version
+        self.page_size = page_size
+        # Opt-in TTLCache for issue templates, attribute definitions and file tokens
+        self.cache = cache
+        # Opt-in ArtifactCache keeping downloaded artifacts on disk
+        self.artifact_cache = artifact_cache
+        # Opt-in RetryPolicy and CircuitBreaker applied to every request
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        # Opt-in Throttle objects limiting request rate and concurrency. Heavy requests (uploads, downloads and full
+        # listings) go through heavy_throttle when one is given, so they get a budget of their own.
+        self.throttle = throttle
+        self.heavy_throttle = heavy_throttle
+        # Opt-in SingleFlight merging identical GETs made at the same time by different threads
+        self.single_flight = single_flight
+        # Opt-in TokenMinter: with basic credentials, requests carry a token minted from them rather than the
+        # credentials themselves
+        self.token_minter = token_minter
+        # Instrumentation callbacks, see add_hook
+        self._hooks = {'pre_request': [], 'post_response': []}
 
         if not user_agent:
             self.user_agent = 'fortify_api/' + version
@@ -45,6 +106,50 @@ class FortifyApi(object):
             self.auth_type = 'token'
         else:
             self.auth_type = 'unauthenticated'
+        if token_minter is not None and self.auth_type != 'basic':
+            raise ValueError('token_minter mints tokens from basic credentials, username and password are required')
+
+        self._session = self._create_session(pool_connections, pool_maxsize, pool_block)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the underlying connection pool. The instance must not be used afterwards.
+        """
+        self._session.close()
+
+    def _create_session(self, pool_connections, pool_maxsize, pool_block):
+        """
+        Build the long-lived session shared by every request made through this instance. Connections are kept alive
+        and reused per host; the urllib3 pools behind the adapter are thread-safe, so a single FortifyApi may be
+        shared between worker threads.
+        :param pool_connections: number of per-host connection pools to cache
+        :param pool_maxsize: maximum number of connections kept alive in each pool
+        :param pool_block: if True, block when the pool is exhausted instead of opening throwaway connections
+        :return: a configured requests.Session
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                                pool_block=pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        # Also passed with every request: REQUESTS_CA_BUNDLE and CURL_CA_BUNDLE override a session-level verify=False
+        session.verify = self.verify_ssl
+        session.headers.update({'User-Agent': self.user_agent})
+
+        if self.auth_type == 'basic' and self.token_minter is not None:
+            session.auth = MintedTokenAuth(self.token_minter, self._mint_token)
+        elif self.auth_type == 'basic':
+            session.auth = (self.username, self.password)
+        elif self.auth_type == 'token':
+            session.auth = FortifyTokenAuth(self.token)
+
+        return session
 
     @staticmethod
     def __formatted_application_version_payload__(project_name, project_id, version_name, issue_template_id,
@@ -99,15 +204,14 @@ class FortifyApi(object):
 
         return json_application_version
 
-    def add_project_version_attribute(self, project_version_id, attribute_definition_id, value,
-                                      values, guid=None):
+    @staticmethod
+    def __formatted_project_version_attribute_payload__(attribute_definition_id, value, values, guid):
         """
-        :param project_version_id: Project version id
         :param attribute_definition_id: Attribute definition ID
-        :param guid: GUID
         :param value: Value
         :param values: Values
-        :return: A response object containing the result of the attribute change
+        :param guid: GUID
+        :return:
         """
         project_version_attribute = dict(attributeDefinitionId="", guid="", value="", values=values)
 
@@ -116,10 +220,52 @@ class FortifyApi(object):
         project_version_attribute['value'] = value
         project_version_attribute['values'] = values
 
+        return project_version_attribute
+
+    def add_hook(self, event, callback):
+        """
+        Register an instrumentation callback. Hooks are called synchronously on the thread making the request.
+            metrics = MetricsCollector()
+            api.add_hook('post_response', metrics)
+        :param event: 'pre_request' to be called before each request is sent, or 'post_response' to be called once
+                      its response has been handled
+        :param callback: callable receiving a fortifyapi.metrics.RequestRecord
+        """
+        if event not in self._hooks:
+            raise ValueError('event must be one of: ' + ', '.join(sorted(self._hooks)))
+        self._hooks[event].append(callback)
+
+    def add_project_version_attribute(self, project_version_id, attribute_definition_id, value,
+                                      values, guid=None):
+        """
+        :param project_version_id: Project version id
+        :param attribute_definition_id: Attribute definition ID
+        :param guid: GUID
+        :param value: Value
+        :param values: Values
+        :return: A response object containing the result of the attribute change
+        """
+        project_version_attribute = self.__formatted_project_version_attribute_payload__(
+            attribute_definition_id=attribute_definition_id, value=value, values=values, guid=guid)
+
         url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/attributes'
         data = json.dumps(project_version_attribute)
         return self._request('POST', url, data=data)
 
+    def bulk(self, max_batch_size=50):
+        """
+        Start collecting operations to send through the SSC bulk endpoint, many sub-requests per round trip.
+            with api.bulk() as batch:
+                for definition_id, value in attributes:
+                    batch.add_project_version_attribute(version_id, definition_id, value, None)
+                batch.commit_project_version(version_id)
+            for response in batch.responses:
+                print response.success
+        :param max_batch_size: maximum number of sub-requests sent in a single bulk request
+        :return: A FortifyBulkRequest bound to this instance
+        """
+        return FortifyBulkRequest(self, max_batch_size=max_batch_size)
+
     def commit_project_version(self, project_version_id):
         """
         Set the commit attribute of the specified project version to true
@@ -174,87 +320,181 @@ class FortifyApi(object):
         url = '/ssc/api/v1/projectVersions'
         return self._request('POST', url, data=data)
 
-    def download_artifact(self, artifact_id):
+    def download_artifact(self, artifact_id, destination=None, chunk_size=DOWNLOAD_CHUNK_SIZE, progress=None,
+                          checksum=None, revision=None):
         """
         You might use this method like this, for example
             api = FortifyApi("https://my-fortify-server:my-port", token=get_token())
-            response, file_name = api.download_artifact_scan("my-id")
-            if response.success:
-                file_content = response.data
-                with open('/path/to/some/folder/' + file_name, 'wb') as f:
-                    f.write(file_content)
-            else:
+            response, file_name = api.download_artifact("my-id", destination='/path/to/some/folder/my-id.fpr')
+            if not response.success:
                 print response.message
 
-        We've coded this for the entire file to load into memory. A future change may be to permit
-        streaming/chunking of the file and handing back a stream instead of content.
+        When a destination is given the body is streamed to it chunk by chunk, so files of any size can be downloaded
+        with constant memory. Without a destination the entire file is loaded into memory and returned as the
+        response data. With an artifact_cache, a cached artifact is served without contacting SSC.
         :param artifact_id: the id of the artifact to download
-        :return: binary file data and file name
+        :param destination: optional file path or writable binary file-like object to stream the file to
+        :param chunk_size: number of bytes written per chunk when streaming to a destination
+        :param progress: optional callable invoked after every chunk as progress(bytes_written, total_bytes,
+                         bytes_per_second)
+        :param checksum: optional hashlib algorithm name, e.g. 'sha256', of a digest computed while streaming
+        :param revision: optional value, e.g. the artifact uploadDate, added to the artifact_cache key. Artifacts
+                         do not change once uploaded, so the id alone identifies the content by default.
+        :return: A response object and the file name. When streaming, the response data is a dict holding the
+                 number of bytes written ('size') and the hex digest ('checksum'); otherwise it is the file content.
         """
-        file_token = self.get_file_token('DOWNLOAD').data['data']['token']
-
-        url = "/ssc/download/artifactDownload.html?mat=" + file_token + "&id=" + str(
-            artifact_id) + "&clientVersion=" + self.client_version
-
-        headers = {
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive'
-        }
-
-        response = self._request('GET', url, stream=True, headers=headers)
+        def url(file_token):
+            return "/ssc/download/artifactDownload.html?mat=" + file_token + "&id=" + str(
+                artifact_id) + "&clientVersion=" + self.client_version
 
-        try:
-            file_name = response.headers['Content-Disposition'].split('=')[1].strip("\"'")
-        except:
-            file_name = ''
+        cache_key = None
+        if self.artifact_cache is not None:
+            cache_key = self._artifact_cache_key('artifact', artifact_id, revision or '')
+        return self._download_artifact(url, destination, chunk_size, progress, checksum, cache_key)
 
-        return response, file_name
-
-    def download_artifact_scan(self, artifact_id):
+    def download_artifact_scan(self, artifact_id, destination=None, chunk_size=DOWNLOAD_CHUNK_SIZE, progress=None,
+                               checksum=None, revision=None):
         """
         You might use this method like this, for example
             api = FortifyApi("https://my-fortify-server:my-port", token=get_token())
-            response, file_name = api.download_artifact_scan("my-id")
-            if response.success:
-                file_content = response.data
-                with open('/path/to/some/folder/' + file_name, 'wb') as f:
-                    f.write(file_content)
-            else:
+            response, file_name = api.download_artifact_scan("my-id", destination='/path/to/some/folder/my-id.fpr')
+            if not response.success:
                 print response.message
 
-        We've coded this for the entire file to load into memory. A future change may be to permit
-        streaming/chunking of the file and handing back a stream instead of content.
-        :param artifact_id: the id of the artifact scan to download
-        :return: binary file data and file name
+        When a destination is given the body is streamed to it chunk by chunk, so files of any size can be downloaded
+        with constant memory. Without a destination the entire file is loaded into memory and returned as the
+        response data.
+
+        The current state FPR changes whenever an artifact is uploaded to the project version, so with an
+        artifact_cache the cache key includes a revision. Unless one is given, it is looked up with a single small
+        request for the most recently uploaded artifact of the project version.
+        :param artifact_id: the id of the project version whose current state FPR is downloaded
+        :param destination: optional file path or writable binary file-like object to stream the file to
+        :param chunk_size: number of bytes written per chunk when streaming to a destination
+        :param progress: optional callable invoked after every chunk as progress(bytes_written, total_bytes,
+                         bytes_per_second)
+        :param checksum: optional hashlib algorithm name, e.g. 'sha256', of a digest computed while streaming
+        :param revision: optional value identifying the current state, used as part of the artifact_cache key
+        :return: A response object and the file name. When streaming, the response data is a dict holding the
+                 number of bytes written ('size') and the hex digest ('checksum'); otherwise it is the file content.
+        """
+        def url(file_token):
+            return self._artifact_scan_url(artifact_id, file_token)
+
+        cache_key = None
+        if self.artifact_cache is not None:
+            revision = revision or self._latest_artifact_revision(artifact_id)
+            # Without a revision the cached copy could be stale, so the cache is bypassed
+            if revision:
+                cache_key = self._artifact_cache_key('scan', artifact_id, revision)
+        return self._download_artifact(url, destination, chunk_size, progress, checksum, cache_key)
+
+    def download_artifacts(self, artifact_ids, directory, max_workers=4, scans=False, checksum=None):
+        """
+        Download several artifacts in parallel, each to <directory>/<artifact_id>.fpr. Repeated ids are downloaded
+        once, and with an artifact_cache an artifact already being downloaded by another thread or process is waited
+        for instead of being downloaded again.
+        :param artifact_ids: ids of the artifacts, or of the project versions when scans is True
+        :param directory: existing directory the files are written to
+        :param max_workers: number of downloads run in parallel; keep pool_maxsize at least this large
+        :param scans: download current state FPRs with download_artifact_scan instead of download_artifact
+        :param checksum: optional hashlib algorithm name of a digest computed for every file
+        :return: a dict of id to the (response, file_name) tuple of the download; a failed download gets an
+                 unsuccessful response and an empty file name
+        """
+        download = self.download_artifact_scan if scans else self.download_artifact
+        unique_ids = list(collections.OrderedDict.fromkeys(artifact_ids))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict((artifact_id, executor.submit(
+                download, artifact_id, destination=os.path.join(directory, '{0}.fpr'.format(artifact_id)),
+                checksum=checksum)) for artifact_id in unique_ids)
+            results = {}
+            for artifact_id, future in futures.items():
+                try:
+                    results[artifact_id] = future.result()
+                except Exception as e:
+                    # A download that failed unexpectedly must not lose the results of the others
+                    results[artifact_id] = (FortifyResponse(
+                        message='Could not download {0}. {1}'.format(artifact_id, e), success=False), '')
+            return results
+
+    def export_issues(self, project_version_ids, directory, export_format='ndjson.gz', max_workers=4, page_size=None,
+                      query=None, filterset=None, folder=None, show_hidden=False, show_removed=False,
+                      show_suppressed=False):
+        """
+        Export the issues of several project versions concurrently, one file per version named
+        <project_version_id>.<export_format> in directory. At most max_workers versions are exported at a time, each
+        holding one page of issues in memory; keep pool_maxsize at least max_workers.
+        :param project_version_ids: ids of the project versions to export
+        :param directory: existing directory the files are written to
+        :param export_format: 'ndjson.gz', 'ndjson' or 'parquet'
+        :param max_workers: number of versions exported in parallel
+        :return: a dict of project version id to the response object of export_project_version_issues
+        """
+        def export(project_version_id):
+            destination = os.path.join(directory, '{0}.{1}'.format(project_version_id, export_format))
+            return self.export_project_version_issues(
+                project_version_id, destination, export_format=export_format, page_size=page_size, query=query,
+                filterset=filterset, folder=folder, show_hidden=show_hidden, show_removed=show_removed,
+                show_suppressed=show_suppressed)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict((project_version_id, executor.submit(export, project_version_id))
+                           for project_version_id in project_version_ids)
+            return dict((project_version_id, future.result()) for project_version_id, future in futures.items())
+
+    def export_project_version_issues(self, project_version_id, destination, export_format=None, page_size=None,
+                                      concurrency=1, query=None, filterset=None, folder=None, show_hidden=False,
+                                      show_removed=False, show_suppressed=False):
+        """
+        Stream the issues of a project version to a file as they are paged in, without holding more than the pages in
+        flight in memory. A partially written file is removed if the export fails.
+        :param project_version_id: Project version id
+        :param destination: file path to write to
+        :param export_format: 'ndjson.gz', 'ndjson' or 'parquet', defaults to the format selected by the file name
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :return: A response object whose data is a dict holding the file path ('path') and number of issues ('count')
         """
-        file_token = self.get_file_token('DOWNLOAD').data['data']['token']
-
-        url = "/ssc/download/currentStateFprDownload.html?mat=" + file_token + "&id=" + str(
-            artifact_id) + "&clientVersion=" + self.client_version + "&includeSource=true"
-
-        headers = {
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive'
-        }
-
-        response = self._request('GET', url, stream=True, headers=headers)
-
         try:
-            file_name = response.headers['Content-Disposition'].split('=')[1].strip("\"'")
-        except:
-            file_name = ''
+            writer = open_writer(destination, export_format)
+        except (ValueError, ImportError, IOError, OSError) as e:
+            return FortifyResponse(message='Could not export to {0}. {1}'.format(destination, e), success=False)
 
-        return response, file_name
+        issues = self.iter_project_version_issues(
+            project_version_id, page_size=page_size, concurrency=concurrency, query=query, filterset=filterset,
+            folder=folder, show_hidden=show_hidden, show_removed=show_removed, show_suppressed=show_suppressed)
+        try:
+            try:
+                for issue in issues:
+                    writer.write(issue)
+            finally:
+                issues.close()
+                writer.close()
+        except (FortifyApiError, IOError, OSError) as e:
+            if os.path.exists(destination):
+                os.remove(destination)
+            if isinstance(e, FortifyApiError):
+                return e.response
+            return FortifyResponse(message='Could not export to {0}. {1}'.format(destination, e), success=False)
+
+        return FortifyResponse(success=True, data={'path': destination, 'count': writer.count})
+
+    def get_artifact(self, artifact_id):
+        """
+        :param artifact_id: artifact id
+        :return: A response object containing the artifact, including its uploadDate
+        """
+        url = "/ssc/api/v1/artifacts/" + str(artifact_id)
+        return self._request('GET', url)
 
-    def get_artifact_scans(self, parent_id):
+    def get_artifact_scans(self, parent_id, query=None):
         """
         :param parent_id: parent resource identifier
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
         :return: A response object containing artifact scans
         """
         url = "/ssc/api/v1/artifacts/" + str(parent_id) + "/scans"
-        return self._request('GET', url)
+        return self._request('GET', url, params=query_params(query))
 
     def get_attribute_definition(self, search_expression):
         """
@@ -262,29 +502,30 @@ class FortifyApi(object):
         :return: A response object containing the result of the get
         """
         if search_expression:
-            try:
-                # Python 2
-                url = '/ssc/api/v1/attributeDefinitions?q=' + urllib.quote(str(search_expression))
-            except:
-                # Python 3
-                url = '/ssc/api/v1/attributeDefinitions?q=' + urllib.parse.quote(str(search_expression))
-            return self._request('GET', url)
+            url = '/ssc/api/v1/attributeDefinitions'
+            params = Query(q=search_expression).params()
+            return self._cached('attribute_definition', search_expression,
+                                lambda: self._request('GET', url, params=params))
         else:
             return FortifyResponse(message='A search expression must be provided', success=False)
 
-    def get_attribute_definitions(self):
+    def get_attribute_definitions(self, query=None):
         """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
         :return: A response object containing all attribute definitions
         """
         url = '/ssc/api/v1/attributeDefinitions?start=-1&limit=-1'
-        return self._request('GET', url)
+        params = query_params(query)
+        key = tuple(sorted(params.items())) if params else None
+        return self._cached('attribute_definitions', key, lambda: self._request('GET', url, params=params))
 
-    def get_cloudscan_jobs(self):
+    def get_cloudscan_jobs(self, query=None):
         """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
         :return: A response object containing all cloudscan jobs
         """
         url = '/ssc/api/v1/cloudjobs?start=-1&limit=-1'
-        return self._request('GET', url)
+        return self._request('GET', url, params=query_params(query))
 
     def get_cloudscan_job_status(self, scan_id):
         """
@@ -315,7 +556,7 @@ class FortifyApi(object):
         else:
             return FortifyResponse(message='attribute purpose must be either UPLOAD or DOWNLOAD', success=False)
 
-        return self._request('POST', url, data=data)
+        return self._cached('file_token', purpose, lambda: self._request('POST', url, data=data))
 
     def get_issue_template(self, project_template_id):
         """
@@ -323,43 +564,51 @@ class FortifyApi(object):
         :return: A response object with data containing issue templates for the supplied project name
         """
 
-        url = "/ssc/api/v1/issueTemplates" + "?limit=1&fields=q=id:\"" + project_template_id + "\""
-        return self._request('GET', url)
+        url = "/ssc/api/v1/issueTemplates"
+        params = Query(q={'id': project_template_id}).params()
+        params['limit'] = 1
+        return self._cached('issue_template', project_template_id, lambda: self._request('GET', url, params=params))
 
-    def get_project_version_artifacts(self, parent_id):
+    def get_project_version_artifacts(self, parent_id, query=None):
         """
         :param parent_id: parent resource identifier
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
         :return: A response object containing project version artifacts
         """
         url = "/ssc/api/v1/projectVersions/" + str(parent_id) + "/artifacts?start=-1&limit=-1"
-        return self._request('GET', url)
+        return self._request('GET', url, params=query_params(query))
 
-    def get_project_version_attributes(self, project_version_id):
+    def get_project_version_attributes(self, project_version_id, query=None):
         """
         :param project_version_id: Project version id
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
         :return: A response object containing the project version attributes
         """
         url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/attributes/?start=-1&limit=-1'
-        return self._request('GET', url)
+        return self._request('GET', url, params=query_params(query))
 
-    def get_project_versions(self):
+    def get_project_versions(self, query=None):
         """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
         :return: A response object with data containing project versions
         """
 
         url = "/ssc/api/v1/projectVersions?start=-1&limit=-1"
-        return self._request('GET', url)
+        return self._request('GET', url, params=query_params(query))
 
-    def get_projects(self):
+    def get_projects(self, query=None):
         """
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
         :return: A response object with data containing projects
         """
 
         url = "/ssc/api/v1/projects?start=-1&limit=-1"
-        return self._request('GET', url)
+        return self._request('GET', url, params=query_params(query))
 
     def get_token(self, token_type=None, ttl=None):
         """
+        Tokens are always requested with the basic credentials, also when requests are authenticated with a token
+        minted by the token_minter.
         :param token_type: token type to get
         :param ttl: ttl for the token
         :return: A response object with data containing create date, terminal date, and the actual token
@@ -371,7 +620,144 @@ class FortifyApi(object):
         if ttl is not None:
             url = url + 'ttl=' + str(ttl)
 
-        return self._request('GET', url)
+        return self._request('GET', url, auth=self._basic_auth())
+
+    def iter_attribute_definitions(self, page_size=None, concurrency=1, query=None):
+        """
+        Lazily page through all attribute definitions
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: a generator yielding one attribute definition at a time
+        """
+        return self._iter_paged('/ssc/api/v1/attributeDefinitions', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_cloudscan_jobs(self, page_size=None, concurrency=1, query=None):
+        """
+        Lazily page through all cloudscan jobs
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: a generator yielding one cloudscan job at a time
+        """
+        return self._iter_paged('/ssc/api/v1/cloudjobs', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_project_version_artifacts(self, parent_id, page_size=None, concurrency=1, query=None):
+        """
+        Lazily page through the artifacts of a project version
+        :param parent_id: parent resource identifier
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: a generator yielding one artifact at a time
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(parent_id) + '/artifacts'
+        return self._iter_paged(url, params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_project_version_attributes(self, project_version_id, page_size=None, concurrency=1, query=None):
+        """
+        Lazily page through the attributes of a project version
+        :param project_version_id: Project version id
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: a generator yielding one attribute at a time
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/attributes'
+        return self._iter_paged(url, params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_project_version_issues(self, project_version_id, page_size=None, concurrency=1, query=None,
+                                    filterset=None, folder=None, show_hidden=False, show_removed=False,
+                                    show_suppressed=False):
+        """
+        Lazily page through the issues of a project version
+        :param project_version_id: Project version id
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering. A search
+                      expression uses the issue search syntax.
+        :param filterset: guid of the filter set to apply, defaults to the version's default filter set
+        :param folder: guid of the folder, e.g. Critical, to restrict the issues to
+        :param show_hidden: include hidden issues
+        :param show_removed: include removed issues
+        :param show_suppressed: include suppressed issues
+        :return: a generator yielding one issue at a time
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/issues'
+        params = self._issue_params(query, filterset, folder, show_hidden, show_removed, show_suppressed)
+        return self._iter_paged(url, params=params, page_size=page_size, concurrency=concurrency)
+
+    def iter_project_versions(self, page_size=None, concurrency=1, query=None):
+        """
+        Lazily page through all project versions
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: a generator yielding one project version at a time
+        """
+        return self._iter_paged('/ssc/api/v1/projectVersions', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    def iter_projects(self, page_size=None, concurrency=1, query=None):
+        """
+        Lazily page through all projects
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the total count is known
+        :param query: optional Query, or dict of query parameters, selecting fields, filtering and ordering
+        :return: a generator yielding one project at a time
+        """
+        return self._iter_paged('/ssc/api/v1/projects', params=query_params(query), page_size=page_size,
+                                concurrency=concurrency)
+
+    @contextlib.contextmanager
+    def open_artifact_scan(self, artifact_id):
+        """
+        Open the current state FPR of a project version as a stream, so that it can be read while it downloads
+        without being written to disk first, e.g. by the fortifyapi.fpr parser
+            with api.open_artifact_scan(project_version_id) as stream:
+                for finding in fpr.iter_findings(stream):
+                    print finding.type, finding.file, finding.line
+
+        The artifact_cache is not used; download the FPR with download_artifact_scan to read a cached copy.
+        :param artifact_id: the id of the project version whose current state FPR is downloaded
+        :return: a context manager yielding a readable, non-seekable binary stream of the FPR
+        :raises FortifyApiError: if the download could not be started
+        """
+        response = self.get_file_token('DOWNLOAD')
+        if not response.success:
+            raise FortifyApiError(response)
+        url = self._artifact_scan_url(artifact_id, response.data['data']['token'])
+        record = self._begin_record('GET', url)
+        response = None
+        # The throttle slot is held until the caller is done reading
+        with self._throttle_for(url) as throttle:
+            try:
+                response = self._send('GET', url, headers=dict(DOWNLOAD_HEADERS), stream=True, throttle=throttle)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                if response is not None:
+                    response.close()
+                result = self._error_response(e)
+                if record is not None:
+                    record.retries = getattr(e, 'retries', 0)
+                self._end_record(record, result, response)
+                self._invalidate_cache('file_token', 'DOWNLOAD')
+                raise FortifyApiError(result)
+
+            # Undo any Content-Encoding, as iter_content would
+            response.raw.decode_content = True
+            try:
+                yield response.raw
+            finally:
+                response.close()
+                if record is not None:
+                    record.bytes_received = response.raw.tell()
+                self._end_record(record, FortifyResponse(success=True, response_code=response.status_code,
+                                                         headers=response.headers), response)
 
     def post_attribute_definition(self, attribute_definition):
         """
@@ -382,21 +768,35 @@ class FortifyApi(object):
         data = json.dumps(attribute_definition)
         return self._request('POST', url, data=data)
 
-    def upload_artifact_scan(self, file_path, project_version_id):
+    def remove_hook(self, event, callback):
+        """
+        Unregister a callback registered with add_hook
+        :param event: 'pre_request' or 'post_response'
+        :param callback: the callback to remove
+        """
+        self._hooks[event].remove(callback)
+
+    def upload_artifact_scan(self, file_path, project_version_id, chunk_size=UPLOAD_CHUNK_SIZE, progress=None,
+                             file_token=None):
         """
+        The file is streamed from disk as a multipart body in chunk_size pieces, so memory use does not depend on the
+        size of the file, and the file is closed once the upload finishes.
+        SSC processes the artifact after the upload has returned; use fortifyapi.upload.UploadPipeline to wait for
+        processing to complete.
         :param file_path: full path to the file to upload
         :param project_version_id: project_version_id
+        :param chunk_size: number of bytes read from the file at a time
+        :param progress: optional callable invoked each time another chunk_size bytes have been sent, and once the
+                         whole body has, as progress(bytes_sent, total_bytes, bytes_per_second)
+        :param file_token: optional UPLOAD file token, e.g. one shared by several uploads; fetched if omitted
         :return: Response from the file upload operation
         """
-        file_token = self.get_file_token('UPLOAD').data['data']['token']
+        if file_token is None:
+            response = self.get_file_token('UPLOAD')
+            if not response.success:
+                return response
+            file_token = response.data['data']['token']
         url = "/ssc/upload/resultFileUpload.html?mat=" + file_token
-        files = {'file': (ntpath.basename(file_path), open(file_path, 'rb'))}
-
-        headers = {
-            'Accept': 'Accept:application/xml, text/xml, */*; q=0.01',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive'
-        }
 
         params = {
             'entityId': project_version_id,
@@ -405,12 +805,468 @@ class FortifyApi(object):
             'Filename': ntpath.basename(file_path)
         }
 
-        response = self._request('POST', url, params, files=files, stream=True, headers=headers)
+        with MultipartFileEncoder('file', file_path, chunk_size=chunk_size, progress=progress) as body:
+            headers = {
+                'Accept': 'Accept:application/xml, text/xml, */*; q=0.01',
+                'Accept-Encoding': 'gzip, deflate, br',
+                'Connection': 'keep-alive',
+                'Content-Type': body.content_type
+            }
+
+            response = self._request('POST', url, params, data=body, stream=True, headers=headers)
+        if not response.success:
+            self._invalidate_cache('file_token', 'UPLOAD')
 
         return response
 
-    def _request(self, method, url, params=None, files=None, data=None, headers=None, stream=False):
-        """Common handler for all HTTP requests."""
+    def _artifact_cache_key(self, *parts):
+        """
+        :param parts: values identifying a download, e.g. kind, id and revision
+        :return: the artifact_cache key of the download, qualified by server and identity: a hit skips SSC, so a
+                 cached file must only be served to callers SSC has already given it to
+        """
+        return self.artifact_cache.key(self.host, self.auth_type, self.username or self.token, *parts)
+
+    def _artifact_scan_url(self, artifact_id, file_token):
+        return "/ssc/download/currentStateFprDownload.html?mat=" + file_token + "&id=" + str(
+            artifact_id) + "&clientVersion=" + self.client_version + "&includeSource=true"
+
+    def _basic_auth(self):
+        """:return: the basic credentials as a requests auth, or None if there are none"""
+        return (self.username, self.password) if self.auth_type == 'basic' else None
+
+    def _begin_record(self, method, url, data=None):
+        """
+        Start timing a request if any hook is registered, and call the pre_request hooks.
+        :return: a RequestRecord, or None when instrumentation is disabled
+        """
+        if not self._hooks['pre_request'] and not self._hooks['post_response']:
+            return None
+
+        record = RequestRecord(method, url, bytes_sent=len(data) if hasattr(data, '__len__') else 0)
+        for hook in self._hooks['pre_request']:
+            hook(record)
+        return record
+
+    def _cache_key(self, key):
+        """
+        :param key: lookup key within a cache resource
+        :return: the key qualified by server and identity, since a cache may be shared by several FortifyApi objects
+                 and what SSC returns depends on who asks
+        """
+        return self.host, self.auth_type, self.username or self.token, key
+
+    def _cached(self, resource, key, fetch):
+        """
+        Serve a lookup from the cache when caching is enabled, otherwise fetch it. Only successful responses are cached.
+        :param resource: cache resource name, which selects the TTL
+        :param key: lookup key within the resource
+        :param fetch: callable performing the request on a cache miss
+        :return: A response object
+        """
+        if self.cache is None:
+            return fetch()
+
+        key = self._cache_key(key)
+        response = self.cache.get(resource, key)
+        if response is None:
+            response = fetch()
+            if response.success:
+                self.cache.set(resource, key, response)
+        return response
+
+    def _download(self, url, destination, headers=None, chunk_size=DOWNLOAD_CHUNK_SIZE, progress=None,
+                  checksum=None):
+        """
+        Stream a GET response body to disk without buffering it. At most one chunk is held in memory at a time.
+        :param url: url to download
+        :param destination: file path, or a writable binary file-like object, to write the body to
+        :param headers: request headers
+        :param chunk_size: number of bytes read from the socket and written per chunk
+        :param progress: optional callable invoked after every chunk as progress(bytes_written, total_bytes,
+                         bytes_per_second). total_bytes is None when the server did not send a usable Content-Length.
+        :param checksum: optional hashlib algorithm name, e.g. 'sha256', computed over the bytes as they are written
+        :return: A response object whose data is a dict holding the number of bytes written and the hex digest
+        """
+        digest = hashlib.new(checksum) if checksum else None
+        owns_file = isinstance(destination, string_types)
+        written = 0
+        record = self._begin_record('GET', url)
+        response = None
+        try:
+            with self._throttle_for(url) as throttle:
+                response = self._send('GET', url, headers=headers, stream=True, throttle=throttle)
+                try:
+                    response.raise_for_status()
+
+                    total = response.headers.get('Content-Length')
+                    # Content-Length counts encoded bytes, which does not match what iter_content hands back
+                    total = int(total) if total and not response.headers.get('Content-Encoding') else None
+
+                    out = open(destination, 'wb') if owns_file else destination
+                    try:
+                        started = time.time()
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            out.write(chunk)
+                            written += len(chunk)
+                            if digest is not None:
+                                digest.update(chunk)
+                            if progress is not None:
+                                elapsed = time.time() - started
+                                progress(written, total, written / elapsed if elapsed > 0 else None)
+                    finally:
+                        if owns_file:
+                            out.close()
+                finally:
+                    response.close()
+        except (requests.exceptions.RequestException, IOError, OSError) as e:
+            if owns_file and os.path.exists(destination):
+                os.remove(destination)
+            if isinstance(e, requests.exceptions.RequestException):
+                result = self._error_response(e)
+                if record is not None:
+                    record.retries = getattr(e, 'retries', 0)
+            else:
+                result = FortifyResponse(message='Could not write the download to {0}. {1}'.format(destination, e),
+                                         success=False)
+        else:
+            data = {'size': written, 'checksum': digest.hexdigest() if digest is not None else None}
+            result = FortifyResponse(success=True, response_code=response.status_code, data=data,
+                                     headers=response.headers)
+
+        if record is not None:
+            record.bytes_received = written
+        self._end_record(record, result, response)
+        return result
+
+    def _download_artifact(self, url, destination, chunk_size, progress, checksum, cache_key=None):
+        """
+        Download an artifact through the artifact_cache when a cache key is given, otherwise from SSC.
+        :param url: callable building the download url from a file token
+        :return: A response object and the file name
+        """
+        if cache_key is not None:
+            response = self._download_cached(url, destination, chunk_size, progress, checksum, cache_key)
+        else:
+            response = self._download_from_ssc(url, destination, chunk_size, progress, checksum)
+
+        try:
+            file_name = response.headers['Content-Disposition'].split('=')[1].strip("\"'")
+        except:
+            file_name = ''
+
+        return response, file_name
+
+    def _download_cached(self, url, destination, chunk_size, progress, checksum, cache_key):
+        """
+        Serve a download from the artifact_cache, filling it from SSC on a miss. The key is locked meanwhile, so
+        concurrent downloads of the same artifact are made only once.
+        """
+        cache = self.artifact_cache
+        with cache.locked(cache_key):
+            entry = cache.lookup(cache_key)
+            source = _open_or_none(entry['path']) if entry is not None else None
+            hit = source is not None
+            if not hit:
+                temp_path = cache.temp_path()
+                try:
+                    # Progress is reported while downloading, so copying the file out of the cache is not reported
+                    # again
+                    response = self._download_from_ssc(url, temp_path, chunk_size, progress, 'sha256')
+                    if not response.success:
+                        return response
+                    entry = cache.store(cache_key, temp_path, response.data['checksum'],
+                                        response.headers.get('Content-Disposition'))
+                    source = open(entry['path'], 'rb')
+                except (IOError, OSError) as e:
+                    # e.g. the cache directory is not writable or its disk is full
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    return FortifyResponse(message='Could not store the download in the artifact cache. {0}'.format(e),
+                                           success=False)
+                progress = None
+
+        # The file is open, so it can be copied out after the lock is released even if it is evicted meanwhile
+        headers = {'Content-Disposition': entry['content_disposition']} if entry['content_disposition'] else {}
+        owns_file = isinstance(destination, string_types)
+        digest = hashlib.new(checksum) if checksum and checksum != 'sha256' else None
+        written = 0
+        try:
+            with source:
+                if destination is None:
+                    content = source.read()
+                    return FortifyResponse(success=True, response_code=200, data=content, headers=headers)
+
+                out = open(destination, 'wb') if owns_file else destination
+                try:
+                    started = time.time()
+                    for chunk in iter(lambda: source.read(chunk_size), b''):
+                        out.write(chunk)
+                        written += len(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                        if progress is not None:
+                            elapsed = time.time() - started
+                            progress(written, entry['size'], written / elapsed if elapsed > 0 else None)
+                finally:
+                    if owns_file:
+                        out.close()
+        except (IOError, OSError) as e:
+            if owns_file and os.path.exists(destination):
+                os.remove(destination)
+            return FortifyResponse(message='Could not write the download to {0}. {1}'.format(destination, e),
+                                   success=False)
+
+        if checksum:
+            checksum = entry['sha256'] if digest is None else digest.hexdigest()
+        data = {'size': written, 'checksum': checksum or None, 'cached': hit}
+        return FortifyResponse(success=True, response_code=200, data=data, headers=headers)
+
+    def _download_from_ssc(self, url, destination, chunk_size, progress, checksum):
+        """
+        Get a download file token and download from SSC.
+        :param url: callable building the download url from a file token
+        """
+        response = self.get_file_token('DOWNLOAD')
+        if not response.success:
+            return response
+        file_token = response.data['data']['token']
+        if destination is not None:
+            response = self._download(url(file_token), destination, headers=dict(DOWNLOAD_HEADERS),
+                                      chunk_size=chunk_size, progress=progress, checksum=checksum)
+        else:
+            response = self._request('GET', url(file_token), stream=True, headers=dict(DOWNLOAD_HEADERS))
+        if not response.success:
+            self._invalidate_cache('file_token', 'DOWNLOAD')
+        return response
+
+    def _end_record(self, record, result, response=None):
+        """
+        Complete a record started by _begin_record and call the post_response hooks.
+        :param record: the record, or None when instrumentation is disabled
+        :param result: the FortifyResponse handed back to the caller
+        :param response: the raw requests response, if one was received
+        """
+        if record is None:
+            return
+
+        record.elapsed = time.time() - record.started
+        if record.network_time is None:
+            record.network_time = record.elapsed
+        if response is not None:
+            record.response_code = response.status_code
+            record.retries = getattr(response, 'retries', 0)
+        record.success = result.success
+        record.response = result
+        if result._raw is not None:
+            # Decoded on first access to data, which writes the decode time back to the record
+            record.defer_parse()
+            result._record = record
+        for hook in self._hooks['post_response']:
+            hook(record)
+
+    def _error_response(self, e):
+        """
+        Translate a requests exception into an unsuccessful response object.
+        :param e: the exception raised while sending the request or reading its response
+        :return: A response object describing the failure
+        """
+        if isinstance(e, CircuitOpenError):
+            return FortifyResponse(message='The request was not sent. {0}'.format(e), success=False)
+        if isinstance(e, requests.exceptions.SSLError):
+            return FortifyResponse(message='An SSL error occurred. {0}'.format(e), success=False)
+        if isinstance(e, requests.exceptions.ConnectionError):
+            return FortifyResponse(message='A connection error occurred. {0}'.format(e), success=False)
+        if isinstance(e, requests.exceptions.Timeout):
+            return FortifyResponse(message='The request timed out after ' + str(self.timeout) + ' seconds.',
+                                   success=False)
+        response = getattr(e, 'response', None)
+        return FortifyResponse(message='There was an error while handling the request. {0}'.format(e), success=False,
+                               response_code=response.status_code if response is not None else -1)
+
+    def _get_page(self, url, params, start, limit):
+        """
+        Fetch a single page of a listing endpoint.
+        :return: a tuple of the entities on the page and the total count reported by SSC (None if not reported)
+        :raises FortifyApiError: if the page could not be retrieved
+        """
+        page_params = dict(params or {})
+        page_params.update({'start': start, 'limit': limit})
+        response = self._request('GET', url, params=page_params)
+        if not response.success:
+            raise FortifyApiError(response)
+        return response.data.get('data') or [], response.data.get('count')
+
+    def _invalidate_cache(self, resource, key=None):
+        if self.cache is not None:
+            self.cache.invalidate(resource, self._cache_key(key) if key is not None else None)
+
+    @staticmethod
+    def _issue_params(query, filterset, folder, show_hidden, show_removed, show_suppressed):
+        """
+        :return: the query parameters of an issue listing
+        """
+        params = query_params(query) or {}
+        if 'q' in params:
+            # Search expressions on issues only work in the issue query mode
+            params.setdefault('qm', 'issues')
+        if filterset:
+            params['filterset'] = filterset
+        if folder:
+            params['filter'] = 'FOLDER:' + folder
+        for name, show in (('showhidden', show_hidden), ('showremoved', show_removed),
+                           ('showsuppressed', show_suppressed)):
+            if show:
+                params[name] = 'true'
+        return params
+
+    def _iter_paged(self, url, params=None, page_size=None, concurrency=1):
+        """
+        Page through a listing endpoint with start/limit, using the count reported by SSC to know when to stop.
+        :param url: listing url, without start/limit parameters
+        :param params: additional query parameters sent with every page
+        :param page_size: number of entities fetched per request, defaults to the instance page_size
+        :param concurrency: number of pages requested in parallel once the first page has reported the total count.
+                            With the default of 1 pages are fetched one after the other and only one page is held in
+                            memory at a time; otherwise at most concurrency + 1 pages are held.
+        :return: a generator yielding one entity at a time, in server order
+        :raises FortifyApiError: if a page could not be retrieved
+        """
+        page_size = page_size or self.page_size
+        start = 0
+        entities, count = self._get_page(url, params, start, page_size)
+        while True:
+            for entity in entities:
+                yield entity
+
+            start += len(entities)
+            if not entities or (count is not None and start >= count) or (count is None and len(entities) < page_size):
+                return
+
+            if concurrency > 1 and count is not None:
+                # SSC may cap the page size below what was asked for, so step by what the first page actually held
+                for entity in self._iter_pages_concurrently(url, params, start, count, concurrency):
+                    yield entity
+                return
+
+            del entities
+            entities, count = self._get_page(url, params, start, page_size)
+
+    def _iter_pages_concurrently(self, url, params, page_size, count, concurrency):
+        """
+        Fetch the remaining pages of a listing through a bounded thread pool, keeping at most concurrency requests
+        in flight, and yield their entities in order.
+        """
+        offsets = iter(range(page_size, count, page_size))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        pending = collections.deque()
+        try:
+            for start in itertools.islice(offsets, concurrency):
+                pending.append(executor.submit(self._get_page, url, params, start, page_size))
+
+            while pending:
+                entities, _ = pending.popleft().result()
+                # Refill the window before handing entities to the caller so the pool never sits idle
+                for start in itertools.islice(offsets, 1):
+                    pending.append(executor.submit(self._get_page, url, params, start, page_size))
+                for entity in entities:
+                    yield entity
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _latest_artifact_revision(self, project_version_id):
+        """
+        :return: id and upload date of the most recently uploaded artifact of a project version, or None if the
+                 project version has no artifacts or they could not be listed
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/artifacts'
+        params = Query(fields=('id', 'uploadDate'), orderby='-uploadDate').params()
+        params.update({'start': 0, 'limit': 1})
+        response = self._request('GET', url, params=params)
+        artifacts = response.data.get('data') if response.success and isinstance(response.data, dict) else None
+        if not artifacts:
+            return None
+        return '{0}@{1}'.format(artifacts[0].get('id'), artifacts[0].get('uploadDate'))
+
+    def _may_retry(self):
+        """A retry is abandoned, keeping the last outcome, once the circuit breaker has opened."""
+        return self.circuit_breaker is None or self.circuit_breaker.allow()
+
+    def _mint_token(self, token_type, ttl):
+        """
+        Mint a token from the basic credentials for the token_minter. The request goes straight to the session: it is
+        made while the request needing the token already holds a throttle slot and, when the circuit breaker is half
+        open, the trial, so going through _send would refuse it and count the refusal as an SSC failure.
+        :return: the token and the epoch time of its terminalDate, or None if SSC did not report one
+        :raises TokenMintError: if no token could be minted
+        """
+        url = '/ssc/api/v1/auth/token'
+        params = {'token': token_type}
+        if ttl is not None:
+            params['ttl'] = ttl
+        headers = {'Accept': 'application/json', 'User-Agent': self.user_agent}
+        record = self._begin_record('GET', url)
+        response = None
+        try:
+            response = self._session.request(method='GET', url=self.host + url, params=params, headers=headers,
+                                             timeout=self.timeout, auth=self._basic_auth(), verify=self.verify_ssl)
+            response.raise_for_status()
+            token = response.json()['data']
+            minted = token['token'], parse_ssc_date(token.get('terminalDate'))
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            result = FortifyResponse(message='Could not mint a {0} from the basic credentials. {1}'.format(
+                token_type, e), success=False, response_code=response.status_code if response is not None else -1)
+            self._end_record(record, result, response)
+            raise TokenMintError(result.message)
+        self._end_record(record, FortifyResponse(success=True, response_code=response.status_code), response)
+        return minted
+
+    def _perform(self, method, url, params, files, data, headers, stream, auth=None):
+        """Send a request prepared by _request and translate the outcome into a response object."""
+        record = self._begin_record(method, url, data)
+        response = None
+        try:
+            # The throttle slot is held until the body has been read, which matters for streamed responses
+            with self._throttle_for(url) as throttle:
+                response = self._send(method, url, params=params, files=files, data=data, headers=headers,
+                                      stream=stream, auth=auth, throttle=throttle)
+                body = response.content
+                if record is not None:
+                    record.network_time = time.time() - record.started
+                    record.bytes_received = len(body or b'')
+
+                response.raise_for_status()
+
+                # two flavors of response are successful, GETs return 200, PUTs return 204 with empty response text.
+                # The body is kept as bytes and only decoded when the caller first reads data.
+                response_code = response.status_code
+                success = True if response_code // 100 == 2 else False
+                result = FortifyResponse(success=success, response_code=response_code, raw=body,
+                                         headers=response.headers)
+        except requests.exceptions.RequestException as e:
+            result = self._error_response(e)
+            if record is not None:
+                record.retries = getattr(e, 'retries', 0)
+
+        self._end_record(record, result, response)
+        return result
+
+    def _perform_shared(self, method, url, params, headers, stream, auth):
+        """
+        Send a GET whose response may be handed to several callers by the single_flight. The body is decoded before
+        the response is shared, so every caller reads the same data rather than decoding it again concurrently.
+        """
+        result = self._perform(method, url, params, None, None, headers, stream, auth)
+        result.data
+        return result
+
+    def _request(self, method, url, params=None, files=None, data=None, headers=None, stream=False, auth=None):
+        """
+        Common handler for all HTTP requests.
+        :param auth: optional requests auth replacing the session auth for this request
+        """
         if not params:
             params = {}
 
@@ -422,49 +1278,342 @@ class FortifyApi(object):
                 headers.update({'Content-Type': 'application/json'})
         headers.update({'User-Agent': self.user_agent})
 
-        try:
+        if method == 'GET' and self.single_flight is not None:
+            key = (self.host, self.auth_type, self.username or self.token, url, _freeze(params), _freeze(headers),
+                   stream, auth is not None)
+            return self.single_flight.do(key, lambda: self._perform_shared(method, url, params, headers, stream, auth))
+        return self._perform(method, url, params, files, data, headers, stream, auth)
 
-            if self.auth_type == 'basic':
-                response = requests.request(method=method, url=self.host + url, params=params, files=files,
-                                            headers=headers, data=data,
-                                            timeout=self.timeout, verify=self.verify_ssl,
-                                            auth=(self.username, self.password), stream=stream)
-            elif self.auth_type == 'token':
-                response = requests.request(method=method, url=self.host + url, params=params, files=files,
-                                            headers=headers, data=data,
-                                            timeout=self.timeout, verify=self.verify_ssl,
-                                            auth=FortifyTokenAuth(self.token), stream=stream)
+    def _send(self, method, url, params=None, files=None, data=None, headers=None, stream=False, auth=None,
+              throttle=None):
+        """
+        Send a request through the pooled session, retrying according to the retry policy and refusing to send while
+        the circuit breaker is open. A request rejected with 401 while authenticated with a minted token is sent once
+        more with a newly minted token.
+        :param auth: optional requests auth replacing the session auth for this request
+        :param throttle: the Throttle held by the caller for this request; every further attempt takes a token from
+                         it, and its in-flight slot is given back while waiting between retries
+        :return: the raw requests response
+        :raises requests.exceptions.RequestException: if the request could not be completed
+        """
+        # A streamed body (file upload) is consumed by the first attempt and cannot be sent again
+        replayable = files is None and not hasattr(data, 'read')
+        if self.retry is not None:
+            self.retry.on_request()
+
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            raise CircuitOpenError('SSC is failing, requests are refused for another {0:.1f} seconds.'.format(
+                self.circuit_breaker.retry_in()))
+
+        if throttle is None:
+            throttle = _UNTHROTTLED
+        attempt = 0
+        renewed = False
+        while True:
+            try:
+                response = self._session.request(method=method, url=self.host + url, params=params, files=files,
+                                                 headers=headers, data=data, timeout=self.timeout, stream=stream,
+                                                 auth=auth, verify=self.verify_ssl)
+            except TokenMintError as e:
+                # Raised by the auth handler before the request was sent, e.g. for bad credentials: it says nothing
+                # about SSC's health
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release()
+                e.retries = attempt
+                raise
+            except requests.exceptions.RequestException as e:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure()
+                delay = None
+                if self.retry is not None:
+                    delay = self.retry.delay_for_exception(method, e, attempt, replayable=replayable)
+                if delay is None or not self._may_retry():
+                    e.retries = attempt
+                    raise
+            except BaseException:
+                # Raised on the client side, e.g. by an auth handler or an interrupt: SSC's health is unknown
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release()
+                raise
             else:
-                response = requests.request(method=method, url=self.host + url, params=params, files=files,
-                                            headers=headers, data=data,
-                                            timeout=self.timeout, verify=self.verify_ssl, stream=stream)
+                if response.status_code == 401 and isinstance(self._session.auth, MintedTokenAuth) and auth is None \
+                        and replayable and not renewed:
+                    # The token was revoked or expired early; mint a new one and send again, once
+                    renewed = True
+                    self.token_minter.invalidate(_token_of(response.request))
+                    response.close()
+                    throttle.backoff(0)
+                    continue
+                if self.circuit_breaker is not None:
+                    if response.status_code >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                delay = None
+                if self.retry is not None:
+                    delay = self.retry.delay_for_response(method, response, attempt, replayable=replayable)
+                if delay is None or not self._may_retry():
+                    response.retries = attempt
+                    return response
+                # Release the connection back to the pool before waiting
+                response.close()
+
+            attempt += 1
+            throttle.backoff(delay)
+
+    def _throttle_for(self, url):
+        """
+        :param url: url of the request about to be sent
+        :return: the Throttle the request must go through, a no-op one if throttling is disabled
+        """
+        if self.heavy_throttle is not None and any(marker in url for marker in HEAVY_URL_MARKERS):
+            return self.heavy_throttle
+        return self.throttle or _UNTHROTTLED
 
-            try:
-                response.raise_for_status()
 
-                # two flavors of response are successful, GETs return 200, PUTs return 204 with empty response text
-                response_code = response.status_code
-                success = True if response_code // 100 == 2 else False
-                if response.text:
-                    try:
-                        data = response.json()
-                    except ValueError:  # Sometimes the returned data isn't JSON, so return raw
-                        data = response.content
-
-                return FortifyResponse(success=success, response_code=response_code, data=data,
-                                       headers=response.headers)
-            except ValueError as e:
-                return FortifyResponse(success=False, message="JSON response could not be decoded {0}.".format(e))
-        except requests.exceptions.SSLError as e:
-            return FortifyResponse(message='An SSL error occurred. {0}'.format(e.message), success=False)
-        except requests.exceptions.ConnectionError as e:
-            return FortifyResponse(message='A connection error occurred. {0}'.format(e.message), success=False)
-        except requests.exceptions.Timeout:
-            return FortifyResponse(message='The request timed out after ' + str(self.timeout) + ' seconds.',
-                                   success=False)
-        except requests.exceptions.RequestException as e:
-            return FortifyResponse(
-                message='There was an error while handling the request. {0}'.format(e.message), success=False)
+class FortifyBulkRequest(object):
+    """
+    Collects operations and sends them through /ssc/api/v1/bulk, at most max_batch_size sub-requests per round trip.
+    Each operation gets its own FortifyResponse, built from the matching sub-response, in the order it was added.
+    """
+
+    def __init__(self, api, max_batch_size=50):
+        """
+        :param api: the FortifyApi instance used to send the bulk requests
+        :param max_batch_size: maximum number of sub-requests sent in a single bulk request
+        """
+        self.api = api
+        self.max_batch_size = max_batch_size
+        self.responses = []
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, method, url, data=None):
+        """
+        Queue an arbitrary sub-request. A full batch is sent as soon as max_batch_size operations are pending.
+        :param method: HTTP verb of the sub-request
+        :param url: SSC api url, e.g. /ssc/api/v1/projectVersions/1
+        :param data: optional JSON-serializable body of the sub-request
+        :return: the index of the operation's response in responses once it has been flushed
+        """
+        sub_request = {'uri': self.api.host + url, 'httpVerb': method}
+        if data is not None:
+            sub_request['postData'] = data
+        self._pending.append(sub_request)
+        index = len(self.responses) + len(self._pending) - 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        return index
+
+    def add_project_version_attribute(self, project_version_id, attribute_definition_id, value, values, guid=None):
+        """
+        Queue the equivalent of FortifyApi.add_project_version_attribute
+        :return: the index of the operation's response in responses
+        """
+        project_version_attribute = FortifyApi.__formatted_project_version_attribute_payload__(
+            attribute_definition_id=attribute_definition_id, value=value, values=values, guid=guid)
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id) + '/attributes'
+        return self.add('POST', url, data=project_version_attribute)
+
+    def commit_project_version(self, project_version_id):
+        """
+        Queue the equivalent of FortifyApi.commit_project_version
+        :return: the index of the operation's response in responses
+        """
+        return self.update_project_version(project_version_id, {"committed": True})
+
+    def update_project_version(self, project_version_id, project_version):
+        """
+        Queue an update of the specified project version
+        :param project_version_id: Project version id
+        :param project_version: dict of project version fields to set
+        :return: the index of the operation's response in responses
+        """
+        url = '/ssc/api/v1/projectVersions/' + str(project_version_id)
+        return self.add('PUT', url, data=project_version)
+
+    def flush(self):
+        """
+        Send all pending operations, splitting them into bulk requests of at most max_batch_size sub-requests. If a
+        bulk request as a whole fails, each of its operations gets the failed response.
+        :return: the responses of the operations that were pending, in the order they were added
+        """
+        flushed = []
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            flushed.extend(self._send(batch))
+        self.responses.extend(flushed)
+        return flushed
+
+    def _send(self, batch):
+        response = self.api._request('POST', '/ssc/api/v1/bulk', data=json.dumps({'requests': batch}))
+        if not response.success:
+            return [response] * len(batch)
+
+        results = response.data.get('data') or []
+        if len(results) != len(batch):
+            message = 'Expected {0} bulk responses but received {1}.'.format(len(batch), len(results))
+            return [FortifyResponse(message=message, success=False, response_code=response.response_code)] * len(batch)
+
+        responses = []
+        for result in results:
+            sub_responses = result.get('responses') or [{}]
+            body = sub_responses[-1].get('body') or {}
+            response_code = body.get('responseCode', -1)
+            success = response_code // 100 == 2
+            message = 'OK' if success else body.get('message', 'The bulk sub-request failed.')
+            responses.append(FortifyResponse(success=success, message=message, response_code=response_code,
+                                             data=body, headers=response.headers))
+        return responses
+
+
+class MultipartFileEncoder(object):
+    """
+    Read-only file-like object producing a multipart/form-data body with a single file field. The file is read in
+    fixed-size chunks as the body is consumed, and the total length is known up front so requests sends a
+    Content-Length instead of falling back to chunked transfer encoding.
+    """
+
+    def __init__(self, field_name, file_path, chunk_size=UPLOAD_CHUNK_SIZE, progress=None,
+                 content_type='application/octet-stream'):
+        """
+        :param field_name: name of the form field holding the file
+        :param file_path: full path to the file to send
+        :param chunk_size: number of bytes read from the file at a time
+        :param progress: optional callable invoked each time another chunk_size bytes have been sent, and once the
+                         whole body has, as progress(bytes_sent, total_bytes, bytes_per_second)
+        :param content_type: content type of the file part
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + self.boundary
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.bytes_read = 0
+        self.started = None
+        self.finished = None
+        # Number of whole chunks sent when progress was last reported
+        self._reported_chunks = 0
+
+        file_name = ntpath.basename(file_path).replace('"', '%22')
+        disposition = 'form-data; name="' + field_name + '"; filename="' + file_name + '"'
+        self._preamble = ('--' + self.boundary + '\r\n' +
+                          'Content-Disposition: ' + disposition + '\r\n' +
+                          'Content-Type: ' + content_type + '\r\n\r\n').encode('utf-8')
+        self._epilogue = ('\r\n--' + self.boundary + '--\r\n').encode('utf-8')
+        self._file = open(file_path, 'rb')
+        self.len = len(self._preamble) + os.fstat(self._file.fileno()).st_size + len(self._epilogue)
+        self._chunks = self._generate_chunks()
+        self._buffer = b''
+        self._offset = 0
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def throughput(self):
+        """Average bytes per second sent so far, or None before the first chunk."""
+        if self.started is None:
+            return None
+        elapsed = (self.finished or time.time()) - self.started
+        return self.bytes_read / elapsed if elapsed > 0 else None
+
+    def close(self):
+        self._file.close()
+
+    def read(self, size=-1):
+        """
+        :param size: maximum number of bytes to return, or -1 for the rest of the body
+        :return: the next bytes of the body, or an empty byte string once it has been fully read
+        """
+        if self.started is None:
+            self.started = time.time()
+
+        # Slice out of the current chunk by offset rather than re-concatenating, so each read copies only what it
+        # returns
+        parts = []
+        wanted = size
+        while size < 0 or wanted > 0:
+            if self._offset >= len(self._buffer):
+                self._buffer = next(self._chunks, b'')
+                self._offset = 0
+                if not self._buffer:
+                    break
+            end = len(self._buffer) if size < 0 else min(len(self._buffer), self._offset + wanted)
+            parts.append(self._buffer[self._offset:end])
+            wanted -= end - self._offset
+            self._offset = end
+        data = b''.join(parts)
+
+        if data:
+            self.bytes_read += len(data)
+            if self.bytes_read >= self.len:
+                self.finished = time.time()
+            # requests reads far less than a chunk at a time: report once per chunk rather than once per read
+            chunks = self.bytes_read // self.chunk_size
+            if self.progress is not None and (chunks > self._reported_chunks or self.finished is not None):
+                self._reported_chunks = chunks
+                self.progress(self.bytes_read, self.len, self.throughput)
+        return data
+
+    def _generate_chunks(self):
+        yield self._preamble
+        while True:
+            chunk = self._file.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        self._file.close()
+        yield self._epilogue
+
+
+def _freeze(mapping):
+    """:return: a hashable copy of a dict of parameters or headers"""
+    return tuple(sorted((key, tuple(value) if isinstance(value, list) else value) for key, value in mapping.items()))
+
+
+def _open_or_none(path):
+    """Open a file for reading, or return None if it has been removed."""
+    try:
+        return open(path, 'rb')
+    except (IOError, OSError):
+        return None
+
+
+def _token_of(request):
+    """:return: the token a prepared request was authenticated with"""
+    return request.headers.get('Authorization', '').replace('FortifyToken ', '', 1)
+
+
+class FortifyApiError(Exception):
+    """Raised by the generator based methods, which cannot hand back a FortifyResponse on failure."""
+
+    def __init__(self, response):
+        super(FortifyApiError, self).__init__(response.message)
+        self.response = response
 
 
 class FortifyTokenAuth(requests.auth.AuthBase):
@@ -477,14 +1626,53 @@ class FortifyTokenAuth(requests.auth.AuthBase):
 
 
 class FortifyResponse(object):
-    """Container for all Fortify SSC API responses, even errors."""
+    """
+    Container for all Fortify SSC API responses, even errors. A response built from a raw body keeps only the bytes
+    and decodes them on first access to data, after which the bytes are released; a body that is not JSON is handed
+    back as bytes.
+    """
 
-    def __init__(self, success, message='OK', response_code=-1, data=None, headers=None):
+    __slots__ = ('message', 'success', 'response_code', 'headers', 'parse_time', '_data', '_raw', '_record')
+
+    def __init__(self, success, message='OK', response_code=-1, data=None, headers=None, raw=None):
+        """
+        :param raw: undecoded response body, decoded lazily in place of data
+        """
         self.message = message
         self.success = success
         self.response_code = response_code
-        self.data = data
         self.headers = headers
+        # Seconds spent decoding raw, None until it has been decoded
+        self.parse_time = None
+        self._data = data
+        self._raw = raw or None
+        # RequestRecord to report parse_time to, if the request was instrumented
+        self._record = None
+
+    @property
+    def data(self):
+        raw = self._raw
+        if raw is not None:
+            started = time.time()
+            try:
+                self._data = _json_loads(raw)
+            except ValueError:  # Sometimes the returned data isn't JSON, so return raw
+                self._data = raw
+            self.parse_time = time.time() - started
+            self._raw = None
+            if self._record is not None:
+                self._record.set_parse_time(self.parse_time)
+                self._record = None
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._raw = None
+        if self._record is not None:
+            # The body is replaced without ever being decoded
+            self._record.set_parse_time(0.0)
+            self._record = None
 
     def __str__(self):
         if self.data:
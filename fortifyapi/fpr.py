@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import collections
+import concurrent.futures
+import contextlib
+import struct
+import zipfile
+import zlib
+
+try:
+    # defusedxml guards against entity expansion attacks when it is installed
+    from defusedxml.ElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+try:
+    string_types = basestring  # Python 2
+except NameError:
+    string_types = str  # Python 3
+
+FVDL_MEMBER = 'audit.fvdl'
+
+Finding = collections.namedtuple('Finding', [
+    'instance_id', 'class_id', 'kingdom', 'type', 'subtype', 'analyzer', 'default_severity', 'instance_severity',
+    'confidence', 'file', 'line', 'function', 'snippet_id'])
+Rule = collections.namedtuple('Rule', ['rule_id', 'metadata'])
+Description = collections.namedtuple('Description', ['class_id', 'abstract', 'explanation', 'recommendations'])
+Snippet = collections.namedtuple('Snippet', ['snippet_id', 'file', 'start_line', 'end_line', 'text'])
+
+# Record kind to the FVDL element it is built from
+KINDS = {
+    'finding': 'Vulnerability',
+    'rule': 'Rule',
+    'description': 'Description',
+    'snippet': 'Snippet',
+}
+# Record kind to the FVDL section after which no record of that kind follows; descriptions have no section
+_SECTIONS = {
+    'finding': 'Vulnerabilities',
+    'rule': 'EngineData',
+    'snippet': 'Snippets',
+}
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_LOCAL_HEADER_SIGNATURE = 0x04034b50
+_DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+_ZIP64_EXTRA_ID = 0x0001
+_FLAG_DATA_DESCRIPTOR = 0x08
+_READ_SIZE = 64 * 1024
+
+
+def iter_records(source, kinds=None):
+    """
+    :param source: path of an FPR file, or a binary file-like object holding one, which need not be seekable
+    :param kinds: record kinds to yield, from KINDS; defaults to all of them
+    :return: a generator yielding Finding, Rule, Description and Snippet records in document order. Parsing stops
+             as soon as no more records of the requested kinds can follow.
+    """
+    kinds = frozenset(kinds or KINDS)
+    wanted = dict((KINDS[kind], kind) for kind in kinds)
+    # Without descriptions, which have no section of their own, parsing can stop after the last wanted section
+    remaining_sections = set(_SECTIONS[kind] for kind in kinds) if 'description' not in kinds else None
+
+    # Looked up once per distinct tag rather than once per element
+    kind_of = _TagMap(lambda tag: wanted.get(_LOCAL_NAMES[tag]))
+    with open_fvdl(source) as fvdl:
+        stack = []
+        # Number of wanted record elements among the open elements
+        open_records = 0
+        for event, element in iterparse(fvdl, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                if kind_of[element.tag] is not None:
+                    open_records += 1
+                continue
+
+            stack.pop()
+            kind = kind_of[element.tag]
+            if kind is not None:
+                open_records -= 1
+                yield _BUILDERS[kind](element)
+            elif open_records:
+                # Part of a record still being read
+                continue
+            # Every other element is dropped as soon as it ends, at any depth, so memory stays flat however large the
+            # sections skipped on the way to the wanted records
+            if stack:
+                stack[-1].remove(element)
+            element.clear()
+            if remaining_sections is not None and len(stack) == 1:
+                remaining_sections.discard(_LOCAL_NAMES[element.tag])
+                if not remaining_sections:
+                    return
+
+
+def iter_findings(source):
+    """
+    :param source: path of an FPR file, or a binary file-like object holding one
+    :return: a generator yielding one Finding at a time
+    """
+    return iter_records(source, kinds=['finding'])
+
+
+def iter_rules(source):
+    """
+    :param source: path of an FPR file, or a binary file-like object holding one
+    :return: a generator yielding one Rule at a time
+    """
+    return iter_records(source, kinds=['rule'])
+
+
+def iter_snippets(source):
+    """
+    :param source: path of an FPR file, or a binary file-like object holding one
+    :return: a generator yielding one Snippet at a time
+    """
+    return iter_records(source, kinds=['snippet'])
+
+
+def summarize(source):
+    """
+    :param source: path of an FPR file, or a binary file-like object holding one
+    :return: a dict holding the number of findings, and the number of findings per type, analyzer and severity
+    """
+    summary = {'findings': 0, 'by_type': collections.Counter(), 'by_analyzer': collections.Counter(),
+               'by_severity': collections.Counter()}
+    for finding in iter_findings(source):
+        summary['findings'] += 1
+        summary['by_type'][finding.type] += 1
+        summary['by_analyzer'][finding.analyzer] += 1
+        summary['by_severity'][finding.instance_severity] += 1
+    for key in ('by_type', 'by_analyzer', 'by_severity'):
+        summary[key] = dict(summary[key])
+    return summary
+
+
+def map_fprs(paths, function=summarize, max_workers=None):
+    """
+    Apply a function to many FPR files on a process pool, so that parsing is spread over several CPUs.
+    :param paths: paths of the FPR files
+    :param function: picklable (module level) callable taking an FPR path; its result must be picklable too
+    :param max_workers: number of worker processes, defaults to the number of CPUs
+    :return: a generator yielding (path, result) tuples in the order of paths
+    """
+    paths = list(paths)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for path, result in zip(paths, executor.map(function, paths)):
+            yield path, result
+
+
+@contextlib.contextmanager
+def open_fvdl(source):
+    """
+    Open the audit.fvdl member of an FPR. Seekable sources are read through zipfile; other streams are read front to
+    back through their local file headers, skipping the members before audit.fvdl.
+    :param source: path of an FPR file, or a binary file-like object holding one
+    :return: a context manager yielding a binary file-like object of the decompressed audit.fvdl
+    :raises KeyError: if the FPR holds no audit.fvdl
+    """
+    if isinstance(source, string_types) or _seekable(source):
+        with zipfile.ZipFile(source) as archive:
+            with archive.open(FVDL_MEMBER) as fvdl:
+                yield fvdl
+    else:
+        yield _StreamingZipMember(source, FVDL_MEMBER)
+
+
+class _StreamingZipMember(object):
+    """Read-only file-like object decompressing one member of a zip file read from a non-seekable stream."""
+
+    def __init__(self, stream, name):
+        self._stream = stream
+        self._pushback = b''
+        method, compressed_size, size = self._find(name)
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if method == zipfile.ZIP_DEFLATED else None
+        # Bytes of the member left to read from the stream, None if only the deflate stream knows where it ends
+        self._remaining = compressed_size
+        self._buffer = b''
+        self._eof = False
+
+    def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _fill(self):
+        wanted = _READ_SIZE if self._remaining is None else min(_READ_SIZE, self._remaining)
+        chunk = self._read_raw(wanted) if wanted else b''
+        if self._remaining is not None:
+            self._remaining -= len(chunk)
+        if self._decompressor is None:
+            self._buffer += chunk
+            self._eof = not chunk or self._remaining == 0
+            return
+        self._buffer += self._decompressor.decompress(chunk)
+        if self._decompressor.eof or not chunk:
+            self._eof = True
+
+    def _find(self, name):
+        while True:
+            header = self._read_exactly(_LOCAL_HEADER.size)
+            (signature, _, flags, method, _, _, _, compressed_size, size, name_length,
+             extra_length) = _LOCAL_HEADER.unpack(header) if len(header) == _LOCAL_HEADER.size else (0,) * 11
+            if signature != _LOCAL_HEADER_SIGNATURE:
+                # The central directory follows the last member
+                raise KeyError('There is no item named {0!r} in the archive'.format(name))
+
+            member_name = self._read_exactly(name_length).decode('utf-8', 'replace')
+            zip64 = _zip64_sizes(self._read_exactly(extra_length))
+            if zip64:
+                size, compressed_size = zip64[0] if size == 0xFFFFFFFF else size, \
+                    zip64[-1] if compressed_size == 0xFFFFFFFF else compressed_size
+            if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                raise ValueError('Unsupported compression method {0} of {1!r}'.format(method, member_name))
+            has_descriptor = bool(flags & _FLAG_DATA_DESCRIPTOR)
+            if has_descriptor and method == zipfile.ZIP_STORED:
+                raise ValueError('Cannot stream {0!r}, a stored member of unknown size'.format(member_name))
+
+            if member_name == name:
+                return method, None if has_descriptor else compressed_size, size
+            if has_descriptor:
+                self._skip_deflated()
+                self._skip_data_descriptor(zip64 is not None)
+            else:
+                self._skip(compressed_size)
+
+    def _read_raw(self, size):
+        if self._pushback:
+            data, self._pushback = self._pushback[:size], self._pushback[size:]
+            return data
+        return self._stream.read(size)
+
+    def _read_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._read_raw(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def _skip(self, size):
+        while size > 0:
+            chunk = self._read_raw(min(_READ_SIZE, size))
+            if not chunk:
+                return
+            size -= len(chunk)
+
+    def _skip_deflated(self):
+        # The member size is only known from the deflate stream itself, so it is decompressed and thrown away
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        while not decompressor.eof:
+            chunk = self._read_raw(_READ_SIZE)
+            if not chunk:
+                return
+            decompressor.decompress(chunk)
+        self._pushback = decompressor.unused_data + self._pushback
+
+    def _skip_data_descriptor(self, zip64):
+        sizes_length = 16 if zip64 else 8
+        first = self._read_exactly(4)
+        if struct.unpack('<I', first)[0] == _DATA_DESCRIPTOR_SIGNATURE:
+            self._read_exactly(4)
+        self._read_exactly(sizes_length)
+
+
+def _zip64_sizes(extra):
+    """:return: the sizes held by the zip64 extra field, or None if there is none"""
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, length = struct.unpack('<HH', extra[offset:offset + 4])
+        if header_id == _ZIP64_EXTRA_ID:
+            data = extra[offset + 4:offset + 4 + length]
+            return [struct.unpack('<Q', data[index:index + 8])[0] for index in range(0, len(data) - 7, 8)][:2]
+        offset += 4 + length
+    return None
+
+
+def _seekable(fileobj):
+    try:
+        return fileobj.seekable()
+    except AttributeError:
+        return hasattr(fileobj, 'seek') and hasattr(fileobj, 'tell')
+
+
+class _TagMap(dict):
+    """Memoizes a function of an element tag."""
+
+    def __init__(self, function):
+        super(_TagMap, self).__init__()
+        self.function = function
+
+    def __missing__(self, tag):
+        value = self[tag] = self.function(tag)
+        return value
+
+
+# Element tag, qualified with the FVDL namespace, to its local name
+_LOCAL_NAMES = _TagMap(lambda tag: tag.rsplit('}', 1)[-1])
+
+
+def _child(element, *path):
+    """:return: the descendant reached by following the local tag names in path, or None"""
+    for name in path:
+        for child in element:
+            if _LOCAL_NAMES[child.tag] == name:
+                element = child
+                break
+        else:
+            return None
+    return element
+
+
+def _text(element, *path):
+    found = _child(element, *path)
+    return found.text if found is not None else None
+
+
+def _number(value, convert=float):
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_finding(element):
+    location = None
+    function = None
+    trace = _child(element, 'AnalysisInfo', 'Unified', 'Trace', 'Primary')
+    if trace is not None:
+        nodes = [node for entry in trace for node in entry if _LOCAL_NAMES[node.tag] == 'Node']
+        default = [node for node in nodes if node.get('isDefault') == 'true']
+        node = (default or nodes or [None])[-1 if not default else 0]
+        if node is not None:
+            location = _child(node, 'SourceLocation')
+    context_function = _child(element, 'AnalysisInfo', 'Unified', 'Context', 'Function')
+    if context_function is not None:
+        function = context_function.get('name')
+
+    return Finding(
+        instance_id=_text(element, 'InstanceInfo', 'InstanceID'),
+        class_id=_text(element, 'ClassInfo', 'ClassID'),
+        kingdom=_text(element, 'ClassInfo', 'Kingdom'),
+        type=_text(element, 'ClassInfo', 'Type'),
+        subtype=_text(element, 'ClassInfo', 'Subtype'),
+        analyzer=_text(element, 'ClassInfo', 'AnalyzerName'),
+        default_severity=_number(_text(element, 'ClassInfo', 'DefaultSeverity')),
+        instance_severity=_number(_text(element, 'InstanceInfo', 'InstanceSeverity')),
+        confidence=_number(_text(element, 'InstanceInfo', 'Confidence')),
+        file=location.get('path') if location is not None else None,
+        line=_number(location.get('line'), int) if location is not None else None,
+        function=function,
+        snippet_id=location.get('snippet') if location is not None else None,
+    )
+
+
+def _build_rule(element):
+    meta_info = _child(element, 'MetaInfo')
+    metadata = {}
+    if meta_info is not None:
+        metadata = dict((group.get('name'), group.text) for group in meta_info if _LOCAL_NAMES[group.tag] == 'Group')
+    return Rule(rule_id=element.get('id'), metadata=metadata)
+
+
+def _build_description(element):
+    return Description(class_id=element.get('classID'), abstract=_text(element, 'Abstract'),
+                       explanation=_text(element, 'Explanation'), recommendations=_text(element, 'Recommendations'))
+
+
+def _build_snippet(element):
+    return Snippet(snippet_id=element.get('id'), file=_text(element, 'File'),
+                   start_line=_number(_text(element, 'StartLine'), int),
+                   end_line=_number(_text(element, 'EndLine'), int), text=_text(element, 'Text'))
+
+
+_BUILDERS = {
+    'finding': _build_finding,
+    'rule': _build_rule,
+    'description': _build_description,
+    'snippet': _build_snippet,
+}
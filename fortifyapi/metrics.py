@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import bisect
+import collections
+import json
+import re
+import threading
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Path segments that identify an entity rather than a resource: numeric ids, GUIDs and job tokens
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27,}|[0-9a-fA-F]{16,})$')
+
+# Guards the parse time of every record, which is set by whichever thread first decodes the response
+_parse_lock = threading.Lock()
+
+
+def endpoint_template(url):
+    """
+    Reduce a request url to the endpoint it calls, so that timings of different entities are aggregated together.
+        /ssc/api/v1/projectVersions/42/attributes?start=0 -> /ssc/api/v1/projectVersions/{id}/attributes
+    :param url: url path, optionally with a query string
+    :return: the path with the query string removed and entity identifiers replaced by {id}
+    """
+    path = url.split('?', 1)[0]
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+class RequestRecord(object):
+    """
+    Describes one request made by FortifyApi. Hooks registered for 'pre_request' receive the record before the
+    request is sent, with only method, url, endpoint and started set; hooks registered for 'post_response' receive it
+    once the response has been handled, with every field set. Times are in seconds.
+
+    The body of an API response is decoded on first access to its data, usually after the hooks have run. Until then
+    parse_time is 0; the decode time is written back to the record once it is known, and callbacks registered with
+    when_parsed are called with the record at that point.
+    """
+
+    __slots__ = ('method', 'url', 'endpoint', 'started', 'elapsed', 'network_time', 'parse_time', 'bytes_sent',
+                 'bytes_received', 'retries', 'response_code', 'success', 'response', '_parse_callbacks')
+
+    def __init__(self, method, url, bytes_sent=0):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint_template(url)
+        self.started = time.time()
+        self.elapsed = None
+        self.network_time = None
+        self.parse_time = 0.0
+        self.bytes_sent = bytes_sent
+        self.bytes_received = 0
+        self.retries = 0
+        self.response_code = -1
+        self.success = None
+        self.response = None
+        # Callbacks waiting for parse_time, None unless the response is still to be decoded
+        self._parse_callbacks = None
+
+    def defer_parse(self):
+        """Mark the response body as still to be decoded, so that when_parsed callbacks wait for set_parse_time."""
+        with _parse_lock:
+            if self._parse_callbacks is None:
+                self._parse_callbacks = []
+
+    def set_parse_time(self, parse_time):
+        """
+        Record the time spent decoding the response body and call the callbacks waiting for it.
+        :param parse_time: seconds spent decoding
+        """
+        with _parse_lock:
+            self.parse_time = parse_time
+            callbacks, self._parse_callbacks = self._parse_callbacks, None
+        for callback in callbacks or ():
+            callback(self)
+
+    def when_parsed(self, callback):
+        """
+        :param callback: callable receiving the record once parse_time is final, which is immediately unless the
+                         response body is still to be decoded
+        """
+        with _parse_lock:
+            if self._parse_callbacks is not None:
+                self._parse_callbacks.append(callback)
+                return
+        callback(self)
+
+
+class Histogram(object):
+    """Fixed-bucket histogram. Percentiles are estimated by interpolating within the matching bucket."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        """
+        :param q: percentile between 0 and 100
+        :return: the estimated value below which q percent of the observations fall, or None if there are none
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': dict(zip([str(bucket) for bucket in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+class _EndpointStats(object):
+
+    def __init__(self, buckets):
+        self.latency = Histogram(buckets)
+        self.network_time = Histogram(buckets)
+        self.parse_time = Histogram(buckets)
+        self.counters = collections.Counter()
+        self.status_codes = collections.Counter()
+
+    def add(self, record):
+        self.latency.add(record.elapsed)
+        self.network_time.add(record.network_time or 0.0)
+        self.counters['requests'] += 1
+        self.counters['errors'] += 0 if record.success else 1
+        self.counters['retries'] += record.retries
+        self.counters['bytes_sent'] += record.bytes_sent
+        self.counters['bytes_received'] += record.bytes_received
+        self.status_codes[str(record.response_code)] += 1
+
+    def snapshot(self):
+        snapshot = dict(self.counters)
+        snapshot.update({
+            'status_codes': dict(self.status_codes),
+            'latency': self.latency.snapshot(),
+            'network_time': self.network_time.snapshot(),
+            'parse_time': self.parse_time.snapshot(),
+        })
+        return snapshot
+
+
+class MetricsCollector(object):
+    """
+    In-memory aggregator of request records, keyed by method and endpoint template. Register it as a post_response
+    hook:
+        metrics = MetricsCollector()
+        api.add_hook('post_response', metrics)
+        ...
+        print metrics.dump()
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: upper bounds, in seconds, of the latency histogram buckets
+        """
+        self.buckets = buckets
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        self.record(record)
+
+    def record(self, record):
+        """
+        :param record: a completed RequestRecord
+        """
+        key = record.method + ' ' + record.endpoint
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = _EndpointStats(self.buckets)
+            stats.add(record)
+        record.when_parsed(lambda parsed: self._add_parse_time(stats, parsed))
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self):
+        """
+        :return: a dict of 'METHOD endpoint' to counters, status codes and latency, network and parse histograms
+        """
+        with self._lock:
+            return dict((key, stats.snapshot()) for key, stats in self._endpoints.items())
+
+    def dump(self, fp=None):
+        """
+        :param fp: optional writable text file to write the snapshot to
+        :return: the snapshot as a JSON string
+        """
+        dumped = json.dumps(self.snapshot(), sort_keys=True, indent=4, separators=(',', ': '))
+        if fp is not None:
+            fp.write(dumped)
+        return dumped
+
+    def to_prometheus(self, prefix='fortifyapi'):
+        """
+        :param prefix: metric name prefix
+        :return: the aggregated metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            for name in ('requests', 'errors', 'retries', 'bytes_sent', 'bytes_received'):
+                lines.append('# TYPE {0}_{1}_total counter'.format(prefix, name))
+                for key, stats in items:
+                    lines.append('{0}_{1}_total{{{2}}} {3}'.format(prefix, name, _labels(key), stats.counters[name]))
+
+            for name, attribute in (('request_duration_seconds', 'latency'), ('parse_duration_seconds', 'parse_time')):
+                lines.append('# TYPE {0}_{1} histogram'.format(prefix, name))
+                for key, stats in items:
+                    histogram = getattr(stats, attribute)
+                    cumulative = 0
+                    for bucket, bucket_count in zip([str(bucket) for bucket in histogram.buckets] + ['+Inf'],
+                                                    histogram.counts):
+                        cumulative += bucket_count
+                        lines.append('{0}_{1}_bucket{{{2},le="{3}"}} {4}'.format(prefix, name, _labels(key), bucket,
+                                                                                 cumulative))
+                    lines.append('{0}_{1}_sum{{{2}}} {3}'.format(prefix, name, _labels(key), histogram.sum))
+                    lines.append('{0}_{1}_count{{{2}}} {3}'.format(prefix, name, _labels(key), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def _add_parse_time(self, stats, record):
+        with self._lock:
+            stats.parse_time.add(record.parse_time or 0.0)
+
+
+def _labels(key):
+    method, endpoint = key.split(' ', 1)
+    return 'method="{0}",endpoint="{1}"'.format(method, endpoint.replace('\\', '\\\\').replace('"', '\\"'))
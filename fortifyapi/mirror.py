@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import json
+import sqlite3
+import threading
+import time
+
+from .query import Query
+
+# Resource name to the FortifyApi method paging through it
+RESOURCES = {
+    'projects': 'iter_projects',
+    'project_versions': 'iter_project_versions',
+    'attribute_definitions': 'iter_attribute_definitions',
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entities (
+    resource TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    parent_id INTEGER,
+    parent_name TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (resource, id)
+);
+CREATE INDEX IF NOT EXISTS entities_by_name ON entities (resource, parent_name, name);
+CREATE INDEX IF NOT EXISTS entities_by_parent ON entities (resource, parent_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    resource TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    full_sync_at REAL NOT NULL
+);
+'''
+
+
+class FortifyMirror(object):
+    """
+    Local SQLite index of projects, project versions and attribute definitions, so that scripts can resolve names to
+    ids without listing everything from SSC on every run. Lookups are served from indexed tables; refresh() brings the
+    mirror up to date.
+
+    SSC listings carry no modification time, so an incremental refresh pages through each resource newest first
+    (orderby=-id) and stops at the first id already mirrored: entities created since the last refresh are added, but
+    renamed or deleted ones are only picked up by refresh(full=True), which replaces the mirrored copy of a resource
+    in a single transaction.
+        mirror = FortifyMirror(api, '/var/cache/fortify/mirror.db')
+        mirror.refresh()
+        api.create_project_version('WebGoat', mirror.project_id('WebGoat'), template, '8.1', 'release')
+    """
+
+    def __init__(self, api, path=':memory:', page_size=None):
+        """
+        :param api: FortifyApi used to refresh the mirror
+        :param path: SQLite database file, created if missing; ':memory:' keeps the mirror in memory only
+        :param page_size: number of entities fetched per request during a refresh, defaults to the api page_size
+        """
+        self.api = api
+        self.path = path
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def refresh(self, full=False, resources=None):
+        """
+        Bring the mirror up to date. A resource that has never been synced is always fully synced.
+        :param full: re-list every entity, dropping deleted ones and updating renamed ones
+        :param resources: names of the resources to refresh, defaults to every resource in RESOURCES
+        :return: a dict of resource name to the number of entities written
+        :raises FortifyApiError: if a page could not be retrieved; the mirror keeps its previous content
+        """
+        return dict((resource, self._refresh(resource, full)) for resource in resources or sorted(RESOURCES))
+
+    def synced_at(self, resource):
+        """
+        :return: epoch time of the last refresh of the resource, or None if it was never synced
+        """
+        row = self._one('SELECT synced_at FROM sync_state WHERE resource = ?', (resource,))
+        return row[0] if row else None
+
+    def project(self, project_id):
+        """
+        :return: the mirrored project, or None
+        """
+        return self._entity('projects', project_id)
+
+    def project_id(self, name):
+        """
+        :return: id of the project with this name, or None
+        """
+        return self._id('projects', name)
+
+    def project_version(self, project_version_id):
+        """
+        :return: the mirrored project version, or None
+        """
+        return self._entity('project_versions', project_version_id)
+
+    def project_version_id(self, project_name, version_name):
+        """
+        :return: id of the version with this name in the named project, or None
+        """
+        return self._id('project_versions', version_name, project_name)
+
+    def project_versions(self, project_name):
+        """
+        :return: a list of the mirrored versions of the named project, ordered by id
+        """
+        rows = self._all('SELECT data FROM entities WHERE resource = ? AND parent_name = ? ORDER BY id',
+                         ('project_versions', project_name))
+        return [json.loads(row[0]) for row in rows]
+
+    def attribute_definition(self, attribute_definition_id):
+        """
+        :return: the mirrored attribute definition, or None
+        """
+        return self._entity('attribute_definitions', attribute_definition_id)
+
+    def attribute_definition_id(self, name):
+        """
+        :return: id of the attribute definition with this name, or None
+        """
+        return self._id('attribute_definitions', name)
+
+    def _refresh(self, resource, full):
+        row = self._one('SELECT MAX(id) FROM entities WHERE resource = ?', (resource,))
+        newest = row[0] if row else None
+        if newest is None or self.synced_at(resource) is None:
+            full = True
+
+        # Listed without holding the lock, so lookups are served from the previous content meanwhile; only the
+        # compact rows are kept until they are written
+        started = time.time()
+        rows = []
+        entities = getattr(self.api, RESOURCES[resource])(page_size=self.page_size, query=Query(orderby='-id'))
+        try:
+            for entity in entities:
+                if not full and entity['id'] <= newest:
+                    break
+                rows.append(_row(resource, entity))
+        finally:
+            entities.close()
+
+        with self._lock:
+            try:
+                if full:
+                    # Deleted and replaced within one transaction, so readers never see a partial mirror
+                    self._db.execute('DELETE FROM entities WHERE resource = ?', (resource,))
+                    full_sync_at = started
+                else:
+                    full_sync_at = self._db.execute('SELECT full_sync_at FROM sync_state WHERE resource = ?',
+                                                    (resource,)).fetchone()[0]
+                self._db.executemany('INSERT OR REPLACE INTO entities (resource, id, name, parent_id, parent_name, '
+                                     'data) VALUES (?, ?, ?, ?, ?, ?)', rows)
+                self._db.execute('INSERT OR REPLACE INTO sync_state (resource, synced_at, full_sync_at) '
+                                 'VALUES (?, ?, ?)', (resource, started, full_sync_at))
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return len(rows)
+
+    def _entity(self, resource, entity_id):
+        row = self._one('SELECT data FROM entities WHERE resource = ? AND id = ?', (resource, entity_id))
+        return json.loads(row[0]) if row else None
+
+    def _id(self, resource, name, parent_name=None):
+        row = self._one('SELECT id FROM entities WHERE resource = ? AND parent_name IS ? AND name = ?',
+                        (resource, parent_name, name))
+        return row[0] if row else None
+
+    def _one(self, sql, args):
+        with self._lock:
+            return self._db.execute(sql, args).fetchone()
+
+    def _all(self, sql, args):
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+
+def _row(resource, entity):
+    parent = entity.get('project') if resource == 'project_versions' else None
+    parent = parent or {}
+    return (resource, entity['id'], entity.get('name'), parent.get('id'), parent.get('name'),
+            json.dumps(entity, separators=(',', ':')))
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import concurrent.futures
+import threading
+import time
+
+from .fortify import FortifyApiError
+
+
+class _Tracked(object):
+    __slots__ = ('key', 'future', 'state', 'entity', 'next_poll', 'unchanged')
+
+    def __init__(self, key, future, next_poll):
+        self.key = key
+        self.future = future
+        self.state = None
+        self.entity = None
+        self.next_poll = next_poll
+        self.unchanged = 0
+
+
+class BulkPoller(object):
+    """
+    Tracks a set of SSC entities until each reaches a terminal state. Every tick, the entities that are due are
+    fetched together through the bulk endpoint, so a tick costs one request per max_batch_size entities however many
+    are tracked. After each poll an entity is next due after the interval of its state, multiplied by backoff_factor
+    for every poll that found the state unchanged, up to max_interval.
+
+    track() returns a concurrent.futures.Future resolved with the entity once it reaches a terminal state. Polling is
+    driven either by a background thread, started by start() or by using the poller as a context manager, or by
+    calling poll() or wait() from the caller's thread.
+
+    Subclasses set STATE_FIELD, TERMINAL_STATES and INTERVALS and implement url().
+    """
+
+    STATE_FIELD = None
+    TERMINAL_STATES = frozenset()
+    # Seconds between polls per state, for states that change faster or slower than default_interval
+    INTERVALS = {}
+
+    def __init__(self, api, default_interval=15, intervals=None, backoff_factor=1.5, max_interval=300,
+                 terminal_states=None, max_batch_size=50, on_state_change=None, coalesce_window=1.0):
+        """
+        :param api: FortifyApi used to poll
+        :param default_interval: seconds between polls of an entity in a state missing from intervals
+        :param intervals: dict of state to seconds between polls, merged over INTERVALS
+        :param backoff_factor: multiplier applied to the interval for every poll that found the state unchanged
+        :param max_interval: upper bound in seconds of the time between two polls of an entity
+        :param terminal_states: states that end tracking, defaults to TERMINAL_STATES
+        :param max_batch_size: maximum number of entities fetched in a single bulk request
+        :param on_state_change: optional callable invoked as on_state_change(key, state, entity) on the polling
+                                thread whenever a tracked entity is seen in a new state. An exception it raises
+                                fails the future of that entity.
+        :param coalesce_window: entities due within this many seconds are polled early, in the same tick, rather
+                                than in a request of their own moments later
+        """
+        self.api = api
+        self.default_interval = default_interval
+        self.intervals = dict(self.INTERVALS)
+        self.intervals.update(intervals or {})
+        self.backoff_factor = backoff_factor
+        self.max_interval = max_interval
+        self.terminal_states = frozenset(terminal_states) if terminal_states is not None else self.TERMINAL_STATES
+        self.max_batch_size = max_batch_size
+        self.on_state_change = on_state_change
+        self.coalesce_window = coalesce_window
+        self.requests = 0
+        self._tracked = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._tracked)
+
+    def url(self, key):
+        """
+        :param key: key of a tracked entity
+        :return: SSC api url of the entity
+        """
+        raise NotImplementedError
+
+    def track(self, key, callback=None):
+        """
+        Start tracking an entity; it is polled on the next tick. Tracking a key that is already tracked returns the
+        existing future.
+        :param key: key of the entity, e.g. a cloudscan job token
+        :param callback: optional callable invoked with the future once it is done
+        :return: a Future resolved with the entity once it reaches a terminal state, or failed with FortifyApiError
+                 if SSC reports that the entity does not exist
+        """
+        with self._condition:
+            tracked = self._tracked.get(key)
+            if tracked is None:
+                tracked = self._tracked[key] = _Tracked(key, concurrent.futures.Future(), time.time())
+                self._condition.notify_all()
+        if callback is not None:
+            tracked.future.add_done_callback(callback)
+        return tracked.future
+
+    def untrack(self, key):
+        """
+        Stop tracking an entity and cancel its future.
+        """
+        with self._condition:
+            tracked = self._tracked.pop(key, None)
+        if tracked is not None:
+            tracked.future.cancel()
+
+    def poll(self):
+        """
+        Fetch every tracked entity that is due, in bulk requests of at most max_batch_size entities.
+        :return: number of entities polled
+        """
+        now = time.time()
+        with self._condition:
+            for key in [key for key, tracked in self._tracked.items() if tracked.future.cancelled()]:
+                del self._tracked[key]
+            due = [tracked for tracked in self._tracked.values() if tracked.next_poll <= now + self.coalesce_window]
+        if not due:
+            return 0
+
+        batch = self.api.bulk(max_batch_size=self.max_batch_size)
+        polled = []
+        error = None
+        try:
+            for tracked in due:
+                try:
+                    url = self.url(tracked.key)
+                except Exception as e:
+                    self._finish(tracked, exception=e)
+                    continue
+                polled.append(tracked)
+                batch.add('GET', url)
+            # Full batches are sent as they fill up, so responses holds every response, not just those of the last
+            # flush
+            batch.flush()
+        except Exception as e:
+            # e.g. a bulk response that is not JSON; the entities left without a response fail with it
+            error = e
+        responses = batch.responses
+        self.requests += (len(responses) + self.max_batch_size - 1) // self.max_batch_size
+
+        for tracked, response in zip(polled, responses):
+            self._update(tracked, response)
+        for tracked in polled[len(responses):]:
+            self._finish(tracked, exception=error)
+        return len(due)
+
+    def start(self):
+        """Start polling on a background thread."""
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread. Tracked entities stay tracked and can be polled again later."""
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._condition.notify_all()
+        if thread is not None:
+            thread.join()
+
+    def wait(self, timeout=None):
+        """
+        Block until every tracked entity has reached a terminal state, polling from this thread unless the background
+        thread is running.
+        :param timeout: maximum number of seconds to wait, None to wait indefinitely
+        :return: True if nothing is left to track, False if the timeout expired first
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._condition:
+                futures = [tracked.future for tracked in self._tracked.values()]
+                background = self._thread is not None
+            if not futures:
+                return True
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            if background:
+                concurrent.futures.wait(futures, timeout=remaining)
+            else:
+                self.poll()
+                next_due = self._next_due()
+                if next_due is None:
+                    continue
+                delay = next_due - time.time()
+                if remaining is not None:
+                    delay = min(delay, remaining)
+                if delay > 0:
+                    time.sleep(delay)
+
+    def _interval(self, tracked):
+        interval = self.intervals.get(tracked.state, self.default_interval)
+        return min(self.max_interval, interval * self.backoff_factor ** tracked.unchanged)
+
+    def _next_due(self):
+        """:return: time at which the next entity is due, None if nothing is tracked"""
+        with self._condition:
+            return min([tracked.next_poll for tracked in self._tracked.values()] or [None])
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+            try:
+                self.poll()
+                failed = False
+            except Exception:
+                # The thread must outlive a failed tick, or the tracked futures would never resolve
+                failed = True
+            with self._condition:
+                if self._stopping:
+                    return
+                next_due = self._next_due()
+                if failed:
+                    delay = self.default_interval
+                else:
+                    delay = self.max_interval if next_due is None else next_due - time.time()
+                if delay > 0:
+                    # Woken early by track() and stop()
+                    self._condition.wait(delay)
+
+    def _update(self, tracked, response):
+        if not response.success:
+            if response.response_code == 404:
+                self._finish(tracked, exception=FortifyApiError(response))
+                return
+            # A failed poll is retried later, backing off as if the state were unchanged
+            tracked.unchanged += 1
+            tracked.next_poll = time.time() + self._interval(tracked)
+            return
+
+        entity = response.data.get('data') if isinstance(response.data, dict) else None
+        state = (entity or {}).get(self.STATE_FIELD)
+        tracked.entity = entity
+        if state != tracked.state:
+            tracked.state = state
+            tracked.unchanged = 0
+            if self.on_state_change is not None:
+                try:
+                    self.on_state_change(tracked.key, state, entity)
+                except Exception as e:
+                    # Ends the tracking of this entity only, the error is handed to its future
+                    self._finish(tracked, exception=e)
+                    return
+        else:
+            tracked.unchanged += 1
+
+        if state in self.terminal_states:
+            self._finish(tracked, result=entity)
+        else:
+            tracked.next_poll = time.time() + self._interval(tracked)
+
+    def _finish(self, tracked, result=None, exception=None):
+        with self._condition:
+            if self._tracked.get(tracked.key) is tracked:
+                del self._tracked[tracked.key]
+        if not tracked.future.set_running_or_notify_cancel():
+            return
+        if exception is not None:
+            tracked.future.set_exception(exception)
+        else:
+            tracked.future.set_result(result)
+
+
+class ArtifactPoller(BulkPoller):
+    """
+    Tracks uploaded artifacts by id until SSC has processed them.
+        with ArtifactPoller(api) as poller:
+            artifact = poller.track(artifact_id).result()
+            if artifact['status'] != 'PROCESS_COMPLETE':
+                print artifact['status']
+    Artifacts needing approval end in REQUIRE_AUTH, as they stay in that state until someone approves them in SSC.
+    """
+
+    STATE_FIELD = 'status'
+    TERMINAL_STATES = frozenset(['PROCESS_COMPLETE', 'ERROR_PROCESSING', 'REQUIRE_AUTH'])
+    INTERVALS = {
+        'SCHED_PROCESSING': 10,
+        'PROCESSING': 5,
+    }
+
+    def url(self, key):
+        return '/ssc/api/v1/artifacts/' + str(key)
+
+
+class CloudscanPoller(BulkPoller):
+    """
+    Tracks cloudscan jobs by job token until they finish.
+        with CloudscanPoller(api) as poller:
+            futures = [poller.track(token) for token in job_tokens]
+            for future in concurrent.futures.as_completed(futures):
+                print future.result()['jobState']
+    Queued jobs are polled rarely and jobs uploading their results to SSC often.
+    """
+
+    STATE_FIELD = 'jobState'
+    TERMINAL_STATES = frozenset(['UPLOAD_COMPLETED', 'SCAN_FAILED', 'SCAN_CANCELED', 'UPLOAD_FAILED', 'FAILED',
+                                 'CANCELED', 'FAULTED'])
+    INTERVALS = {
+        'QUEUED': 60,
+        'PENDING': 60,
+        'SCAN_RUNNING': 30,
+        'SCAN_COMPLETED': 10,
+        'UPLOAD_QUEUED': 10,
+        'UPLOAD_RUNNING': 5,
+    }
+
+    def url(self, key):
+        return '/ssc/api/v1/cloudjobs/' + str(key)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import re
+
+try:
+    string_types = basestring  # Python 2
+except NameError:
+    string_types = str  # Python 3
+
+# Search values made only of these characters are sent unquoted
+_BARE_VALUE = re.compile(r'^[\w.\-]+$')
+
+
+class Query(object):
+    """
+    Builds the fields, q and orderby parameters understood by the SSC listing endpoints. The parameters are passed to
+    requests, which takes care of url encoding them.
+        query = Query().select('id', 'name', 'project.name').where(name='1.0').order_by('-id')
+        api.get_project_versions(query=query)
+
+    SSC can only project top-level fields, so a dotted field such as project.name selects the whole project object.
+    Several search terms are combined with +, which SSC treats as AND.
+    """
+
+    def __init__(self, fields=None, q=None, orderby=None):
+        """
+        :param fields: field name, or list of field names, to return for every entity
+        :param q: a raw SSC search expression, or a dict of field name to value that must match
+        :param orderby: field name, or list of field names, to sort on; prefix a name with - to sort descending
+        """
+        self._fields = []
+        self._terms = []
+        self._orderby = []
+        if fields:
+            self.select(*_as_list(fields))
+        if isinstance(q, dict):
+            self.where(**q)
+        elif q:
+            self.where(q)
+        if orderby:
+            self.order_by(*_as_list(orderby))
+
+    def __eq__(self, other):
+        return isinstance(other, Query) and self.params() == other.params()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return 'Query({0!r})'.format(self.params())
+
+    def select(self, *fields):
+        """
+        :param fields: names of the fields to return
+        :return: this query
+        """
+        for field in fields:
+            top_level = field.split('.', 1)[0]
+            if top_level not in self._fields:
+                self._fields.append(top_level)
+        return self
+
+    def where(self, expression=None, **terms):
+        """
+        Add search terms. Values are quoted when they contain anything other than letters, digits, _, . and -.
+        :param expression: a raw SSC search expression, e.g. name:"Development Phase"
+        :param terms: field name to value that must match
+        :return: this query
+        """
+        if expression:
+            self._terms.append(str(expression))
+        for field in sorted(terms):
+            self._terms.append('{0}:{1}'.format(field, quote_value(terms[field])))
+        return self
+
+    def order_by(self, *fields):
+        """
+        :param fields: names of the fields to sort on, prefixed with - to sort descending
+        :return: this query
+        """
+        self._orderby.extend(fields)
+        return self
+
+    def params(self):
+        """
+        :return: a dict of query parameters, holding only the parts that were set
+        """
+        params = {}
+        if self._fields:
+            params['fields'] = ','.join(self._fields)
+        if self._terms:
+            params['q'] = '+'.join(self._terms)
+        if self._orderby:
+            params['orderby'] = ','.join(self._orderby)
+        return params
+
+    def key(self):
+        """
+        :return: a hashable representation of the parameters, usable as a cache key
+        """
+        return tuple(sorted(self.params().items()))
+
+
+def quote_value(value):
+    """
+    :param value: value of a search term
+    :return: the value as it must appear in an SSC search expression
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    value = value if isinstance(value, string_types) else str(value)
+    if _BARE_VALUE.match(value):
+        return value
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def query_params(query):
+    """
+    :param query: a Query, a dict of query parameters, or None
+    :return: a dict of query parameters, None if there are none
+    """
+    if query is None:
+        return None
+    params = query.params() if isinstance(query, Query) else dict(query)
+    return params or None
+
+
+def _as_list(value):
+    return [value] if isinstance(value, string_types) else list(value)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import calendar
+import email.utils
+import random
+import threading
+import time
+
+import requests.exceptions
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed attempt is retried and how long to wait before the next one. Idempotent methods are
+    retried on the configured status codes and on connection errors; any method is retried when the connection could
+    not be established at all, since the request never reached SSC. Delays use exponential backoff with full jitter,
+    and a Retry-After header sent by SSC takes precedence.
+
+    Retries are limited by a budget shared by every request using the policy: each request deposits budget_ratio
+    tokens, each retry spends one, and at most budget_cap tokens are saved up. While SSC is failing, retries therefore
+    add at most budget_ratio extra load once the saved up tokens are gone.
+    """
+
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30, status_forcelist=(429, 502, 503, 504),
+                 max_retry_after=120, budget_ratio=0.2, budget_cap=10):
+        """
+        :param max_retries: maximum number of retries of a single request
+        :param backoff_factor: base delay in seconds, doubled on each attempt
+        :param max_backoff: upper bound of the computed delay in seconds
+        :param status_forcelist: response codes that are retried for idempotent methods
+        :param max_retry_after: upper bound in seconds of a delay requested through Retry-After
+        :param budget_ratio: retry tokens deposited by every request
+        :param budget_cap: maximum number of retry tokens saved up
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.status_forcelist = frozenset(status_forcelist)
+        self.max_retry_after = max_retry_after
+        self.budget_ratio = budget_ratio
+        self.budget_cap = budget_cap
+        self._tokens = float(budget_cap)
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        """Deposit into the retry budget; called once per request, not per attempt."""
+        with self._lock:
+            self._tokens = min(self.budget_cap, self._tokens + self.budget_ratio)
+
+    def delay_for_exception(self, method, e, attempt, replayable=True):
+        """
+        :param method: HTTP method of the request
+        :param e: the requests exception raised by the attempt
+        :param attempt: number of retries already made
+        :param replayable: False if the request body is a stream that cannot be sent again
+        :return: seconds to wait before retrying, or None if the exception must be raised
+        """
+        if isinstance(e, CircuitOpenError) or not self._can_retry(attempt):
+            return None
+        connect_failure = isinstance(e, requests.exceptions.ConnectTimeout) or (
+            isinstance(e, requests.exceptions.ConnectionError) and _is_new_connection_error(e))
+        retriable = connect_failure or (
+            method.upper() in self.IDEMPOTENT_METHODS and
+            isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)))
+        if not retriable or not (replayable or connect_failure) or not self._spend():
+            return None
+        return self._backoff(attempt)
+
+    def delay_for_response(self, method, response, attempt, replayable=True):
+        """
+        :param method: HTTP method of the request
+        :param response: the requests response of the attempt
+        :param attempt: number of retries already made
+        :param replayable: False if the request body is a stream that cannot be sent again
+        :return: seconds to wait before retrying, or None if the response must be returned
+        """
+        if (response.status_code not in self.status_forcelist or method.upper() not in self.IDEMPOTENT_METHODS or
+                not replayable or not self._can_retry(attempt) or not self._spend()):
+            return None
+        retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self._backoff(attempt)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def _can_retry(self, attempt):
+        return attempt < self.max_retries
+
+    def _spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @staticmethod
+    def _parse_retry_after(value):
+        """
+        :param value: Retry-After header, either delta-seconds or an HTTP date
+        :return: seconds to wait, or None if the header is missing or malformed
+        """
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            parsed = email.utils.parsedate_tz(value)
+            if parsed is None:
+                return None
+            return max(0.0, email.utils.mktime_tz(parsed) - calendar.timegm(time.gmtime()))
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests fast while SSC is unhealthy. After failure_threshold consecutive failures (connection errors,
+    timeouts and 5xx responses) the circuit opens and requests are refused for reset_timeout seconds. After that a
+    single trial request is let through: success closes the circuit, failure opens it again. An instance may be shared
+    by several FortifyApi objects talking to the same server.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """
+        :param failure_threshold: number of consecutive failures that opens the circuit
+        :param reset_timeout: seconds the circuit stays open before a trial request is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        :return: True if a request may be sent now
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.time()
+                self._trial_in_flight = False
+
+    def release(self):
+        """
+        End an attempt that neither succeeded nor failed as far as SSC is concerned, e.g. one interrupted by an
+        exception raised on the client side, so that a half open circuit lets the next trial request through.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def retry_in(self):
+        """
+        :return: seconds until a trial request will be allowed, 0 if requests are currently allowed
+        """
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0
+            return max(0, self.reset_timeout - (time.time() - self._opened_at))
+
+
+def _is_new_connection_error(e):
+    """True if a requests ConnectionError was raised because no connection could be established."""
+    reason = e.args[0] if e.args else None
+    reason = getattr(reason, 'reason', reason)
+    return type(reason).__name__ in ('NewConnectionError', 'ConnectTimeoutError', 'NameResolutionError')
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import threading
+import time
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Tokens are added at rate per second up to burst, and acquire() blocks until one is
+    available, so callers are held to rate requests per second on average with bursts of at most burst requests.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: tokens added per second
+        :param burst: maximum number of tokens held, defaults to max(1, rate)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._updated = _clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Block until the requested number of tokens is available and take them.
+        :param tokens: number of tokens to take
+        """
+        while True:
+            with self._lock:
+                now = _clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Throttle(object):
+    """
+    Limits the request rate and the number of requests in flight. Use it as a context manager around a request: the
+    in-flight slot is taken first and then a token, so the rate applies to requests actually being sent. A single
+    instance may be shared by several FortifyApi objects to put one budget on all of them.
+    """
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        """
+        :param rate: maximum average number of requests per second, None for no rate limit
+        :param burst: number of requests that may be sent back to back, defaults to max(1, rate)
+        :param max_in_flight: maximum number of concurrent requests, None for no limit
+        """
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_in_flight = max_in_flight
+        self._semaphore = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def __enter__(self):
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        if self.bucket is not None:
+            try:
+                self.bucket.acquire()
+            except BaseException:
+                self._release()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._release()
+
+    def backoff(self, delay):
+        """
+        Wait before a request holding this throttle is sent again. The in-flight slot is given back for the wait, then
+        a slot and a token are taken for the next attempt, which is limited like any other request.
+        :param delay: number of seconds to wait
+        """
+        self._release()
+        try:
+            time.sleep(delay)
+        finally:
+            # Taken back even if the wait is interrupted, so the slot is released exactly once when the request exits
+            if self._semaphore is not None:
+                self._semaphore.acquire()
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+    def _release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Brandon Spruth (brandon.spruth2@target.com), Jim Nelson (jim.nelson2@target.com)"
+__copyright__ = "(C) 2017 Target Brands, Inc."
+__contributors__ = ["Brandon Spruth", "Jim Nelson", "Matthew Dunaj"]
+__status__ = "Production"
+__license__ = "MIT"
+
+import concurrent.futures
+import ntpath
+import threading
+
+from .coalesce import SingleFlight
+from .fortify import FortifyApiError, FortifyResponse, UPLOAD_CHUNK_SIZE
+from .poller import ArtifactPoller
+from .query import Query
+
+# Artifacts listed per request while looking for the one just uploaded
+FIND_PAGE_SIZE = 20
+
+
+class UploadPipeline(object):
+    """
+    Uploads many scan files concurrently and tracks every uploaded artifact until SSC has processed it.
+        with UploadPipeline(api, max_workers=8) as pipeline:
+            futures = pipeline.upload_all([('/scans/a.fpr', 101), ('/scans/b.fpr', 102)])
+            for future in concurrent.futures.as_completed(futures):
+                print future.result()['status']
+
+    Uploads run on a pool of max_workers threads and share one UPLOAD file token, which is fetched again only after an
+    upload with it has failed. SSC does not return the id of an uploaded artifact, so it is found by listing the
+    artifacts of the project version that are newer than the newest one before the upload, matching the file name.
+    Processing is then tracked by an ArtifactPoller, which polls every artifact being processed in bulk requests.
+    """
+
+    def __init__(self, api, max_workers=4, poller=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        """
+        :param api: FortifyApi used to upload; keep its pool_maxsize at least max_workers + 1
+        :param max_workers: number of uploads run in parallel
+        :param poller: ArtifactPoller tracking processing, started if it is not running; defaults to one owned by the
+                       pipeline, stopped by close()
+        :param chunk_size: number of bytes read from a file at a time
+        """
+        self.api = api
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.poller = poller if poller is not None else ArtifactPoller(api)
+        self._owns_poller = poller is None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._file_token = None
+        self._token_flight = SingleFlight()
+        self._claimed = set()
+        self._pending = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Wait for the submitted uploads to finish and to be processed, then stop the poller if the pipeline owns it.
+        """
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            pending = list(self._pending)
+        concurrent.futures.wait(pending)
+        if self._owns_poller:
+            self.poller.stop()
+
+    def submit(self, file_path, project_version_id, progress=None):
+        """
+        Queue a file for upload.
+        :param file_path: full path to the file to upload
+        :param project_version_id: id of the project version to upload to
+        :param progress: optional callable invoked after every chunk as progress(bytes_sent, total_bytes,
+                         bytes_per_second)
+        :return: a Future resolved with the artifact once SSC has processed it, its 'status' being PROCESS_COMPLETE,
+                 ERROR_PROCESSING or REQUIRE_AUTH. It fails with FortifyApiError if the upload failed or the artifact
+                 could not be found.
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        upload = self._executor.submit(self._upload, file_path, project_version_id, progress)
+        upload.add_done_callback(lambda upload: self._uploaded(upload, future))
+        return future
+
+    def upload_all(self, uploads):
+        """
+        :param uploads: iterable of (file_path, project_version_id) tuples
+        :return: a list of Futures, as returned by submit, in the order of uploads
+        """
+        return [self.submit(file_path, project_version_id) for file_path, project_version_id in uploads]
+
+    def _discard(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _find_artifact(self, project_version_id, file_name, newest_id):
+        """
+        :return: id of the oldest artifact named file_name, newer than newest_id and not yet claimed by this pipeline,
+                 or None. Files of the same name uploaded to one version at the same time may be told apart in the
+                 wrong order.
+        """
+        candidates = []
+        artifacts = self.api.iter_project_version_artifacts(
+            project_version_id, page_size=FIND_PAGE_SIZE, query=Query(fields=['id', 'originalFileName'], orderby='-id'))
+        try:
+            for artifact in artifacts:
+                if newest_id is not None and artifact['id'] <= newest_id:
+                    break
+                if artifact.get('originalFileName') == file_name:
+                    candidates.append(artifact['id'])
+        finally:
+            artifacts.close()
+
+        with self._lock:
+            for artifact_id in sorted(candidates):
+                if artifact_id not in self._claimed:
+                    self._claimed.add(artifact_id)
+                    return artifact_id
+        return None
+
+    def _newest_artifact_id(self, project_version_id):
+        artifacts = self.api.iter_project_version_artifacts(project_version_id, page_size=1,
+                                                            query=Query(fields='id', orderby='-id'))
+        try:
+            newest = next(artifacts, None)
+        finally:
+            artifacts.close()
+        return newest['id'] if newest else None
+
+    def _shared_file_token(self):
+        """
+        :return: the UPLOAD file token shared by the uploads
+        :raises FortifyApiError: if no token could be fetched
+        """
+        with self._lock:
+            if self._file_token is not None:
+                return self._file_token
+        # Fetched outside the lock so the other workers are not held up for the round trip; workers needing a token
+        # at the same time share one fetch
+        response = self._token_flight.do('UPLOAD', lambda: self.api.get_file_token('UPLOAD'))
+        if not response.success:
+            raise FortifyApiError(response)
+        with self._lock:
+            if self._file_token is None:
+                self._file_token = response.data['data']['token']
+            return self._file_token
+
+    def _upload(self, file_path, project_version_id, progress):
+        """Upload a file on a worker thread and return the id of its artifact."""
+        newest_id = self._newest_artifact_id(project_version_id)
+        file_token = self._shared_file_token()
+        response = self.api.upload_artifact_scan(file_path, project_version_id, chunk_size=self.chunk_size,
+                                                 progress=progress, file_token=file_token)
+        if not response.success:
+            # The token may have expired; the next upload fetches a new one
+            with self._lock:
+                if self._file_token == file_token:
+                    self._file_token = None
+            raise FortifyApiError(response)
+
+        artifact_id = self._find_artifact(project_version_id, ntpath.basename(file_path), newest_id)
+        if artifact_id is None:
+            raise FortifyApiError(FortifyResponse(
+                success=False, message='The artifact uploaded from {0} was not found in project version {1}.'.format(
+                    file_path, project_version_id)))
+        return artifact_id
+
+    def _uploaded(self, upload, future):
+        if upload.exception() is not None:
+            _resolve(future, exception=upload.exception())
+            return
+        self.poller.start()
+        self.poller.track(upload.result(), callback=lambda processed: _resolve_from(processed, future))
+
+
+def _resolve(future, result=None, exception=None):
+    if not future.set_running_or_notify_cancel():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+def _resolve_from(source, future):
+    if source.cancelled():
+        future.cancel()
+    elif source.exception() is not None:
+        _resolve(future, exception=source.exception())
+    else:
+        _resolve(future, result=source.result())
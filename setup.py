@@ -43,7 +43,8 @@ setup(
     download_url='https://github.com/target/fortifyapi/tarball/' + version,
     license='MIT',
     zip_safe=True,
-    install_requires=['requests'],
+    install_requires=['requests', 'futures; python_version < "3"'],
+    extras_require={'async': ['aiohttp; python_version >= "3.6"'], 'parquet': ['pyarrow']},
     keywords=['fortify', 'api', 'security', 'software', 'hpe', 'micro focus', 'ssc', 'sast'],
     classifiers=[
         'Development Status :: 4 - Beta',
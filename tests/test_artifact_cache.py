@@ -0,0 +1,102 @@
+import errno
+import hashlib
+import os
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.artifact_cache import ArtifactCache
+from fortifyapi.fortify import FortifyApi
+
+DOWNLOAD_SIZE = 3 * 1024 * 1024 + 5
+DOWNLOAD_SHA256 = hashlib.sha256(b'\x5a' * DOWNLOAD_SIZE).hexdigest()
+
+
+def test_hits_skip_the_network(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    with MockSSC(download_size=DOWNLOAD_SIZE) as ssc:
+        with FortifyApi(ssc.url, token='test', artifact_cache=cache) as api:
+            first, file_name = api.download_artifact(7, destination=str(tmpdir.join('a.fpr')), checksum='sha256')
+            requests = ssc.requests
+            second, cached_name = api.download_artifact(7, destination=str(tmpdir.join('b.fpr')), checksum='md5')
+            content, _ = api.download_artifact(7)
+            assert ssc.requests == requests
+
+    assert first.data == {'size': DOWNLOAD_SIZE, 'checksum': DOWNLOAD_SHA256, 'cached': False}
+    assert second.data['cached'] and second.data['size'] == DOWNLOAD_SIZE
+    assert second.data['checksum'] == hashlib.md5(b'\x5a' * DOWNLOAD_SIZE).hexdigest()
+    assert file_name == cached_name == 'benchmark.fpr'
+    assert len(content.data) == DOWNLOAD_SIZE
+    assert os.path.getsize(str(tmpdir.join('b.fpr'))) == DOWNLOAD_SIZE
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'stores': 1, 'evictions': 0}
+
+
+def test_batch_downloads_are_deduplicated(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    with MockSSC(download_size=DOWNLOAD_SIZE) as ssc:
+        with FortifyApi(ssc.url, token='test', artifact_cache=cache) as api:
+            results = api.download_artifacts([1, 2, 1, 3, 2], str(tmpdir), max_workers=4)
+            # A file token and a transfer per distinct artifact
+            assert ssc.requests == 6
+            api.download_artifacts([3, 2, 1], str(tmpdir), max_workers=4)
+            assert ssc.requests == 6
+
+    assert sorted(results) == [1, 2, 3]
+    assert all(response.success for response, _ in results.values())
+    # Identical content is stored once
+    assert sum(len(files) for _, _, files in os.walk(str(tmpdir.join('cache', 'objects')))) == 1
+
+
+def test_hits_are_served_only_to_the_same_identity(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    with MockSSC(download_size=1000) as ssc:
+        with FortifyApi(ssc.url, token='first', artifact_cache=cache) as first, \
+                FortifyApi(ssc.url, token='second', artifact_cache=cache) as second:
+            assert not first.download_artifact(7, destination=str(tmpdir.join('a.fpr')))[0].data['cached']
+            # Another user must get the file from SSC, which checks their access to it
+            assert not second.download_artifact(7, destination=str(tmpdir.join('b.fpr')))[0].data['cached']
+            assert first.download_artifact(7, destination=str(tmpdir.join('c.fpr')))[0].data['cached']
+    assert sum(len(files) for _, _, files in os.walk(str(tmpdir.join('cache', 'objects')))) == 1
+
+
+def test_scan_cache_key_follows_the_latest_upload(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    with MockSSC(download_size=DOWNLOAD_SIZE) as ssc:
+        with FortifyApi(ssc.url, token='test', artifact_cache=cache) as api:
+            api.download_artifact_scan(4, destination=str(tmpdir.join('a.fpr')))
+            requests = ssc.requests
+            response, _ = api.download_artifact_scan(4, destination=str(tmpdir.join('b.fpr')))
+            # Only the revision lookup
+            assert response.data['cached'] and ssc.requests == requests + 1
+            response, _ = api.download_artifact_scan(4, destination=str(tmpdir.join('c.fpr')), revision='new')
+            assert not response.data['cached']
+
+
+def test_least_recently_used_files_are_evicted(tmpdir):
+    cache = ArtifactCache(str(tmpdir), max_bytes=10)
+    for index, content in enumerate([b'first', b'second', b'third']):
+        temp_path = cache.temp_path()
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        cache.store(cache.key(index), temp_path, hashlib.sha256(content).hexdigest())
+    assert cache.lookup(cache.key(0)) is None
+    assert cache.lookup(cache.key(1)) is None
+    assert cache.lookup(cache.key(2))['size'] == 5
+
+
+def test_failure_to_store_returns_a_failed_response(tmpdir, monkeypatch):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+
+    def full(*args, **kwargs):
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    monkeypatch.setattr(cache, 'store', full)
+    with MockSSC(download_size=DOWNLOAD_SIZE) as ssc:
+        with FortifyApi(ssc.url, token='test', artifact_cache=cache) as api:
+            response, _ = api.download_artifact(7, destination=str(tmpdir.join('a.fpr')))
+            assert not response.success and 'No space left on device' in response.message
+            # The partial download is not left behind
+            assert os.listdir(str(tmpdir.join('cache', 'tmp'))) == []
+            assert not tmpdir.join('a.fpr').exists()
+
+            monkeypatch.undo()
+            response, _ = api.download_artifact(7, destination=str(tmpdir.join('a.fpr')))
+            assert response.success and not response.data['cached']
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import threading
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from fortifyapi.async_fortify import AsyncFortifyApi
+from fortifyapi.fortify import FortifyApiError
+
+VERSION_COUNT = 57
+DOWNLOAD_BODY = b'PK' + b'\x00' * 300000
+
+
+class StubSSCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    uploads = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body, content_type='application/json', extra_headers=None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if self.headers.get('Authorization') != 'FortifyToken secret':
+            self._send(401, b'{}')
+        elif url.path == '/ssc/api/v1/projectVersions':
+            start = max(int(query['start'][0]), 0)
+            limit = int(query['limit'][0])
+            ids = list(range(VERSION_COUNT))
+            page = ids[start:] if limit < 0 else ids[start:start + limit]
+            self._send(200, json.dumps({'data': [{'id': i} for i in page], 'count': VERSION_COUNT}).encode())
+        elif url.path == '/ssc/download/currentStateFprDownload.html':
+            assert query['mat'] == ['file-token']
+            self._send(200, DOWNLOAD_BODY, 'application/octet-stream',
+                       {'Content-Disposition': 'attachment; filename="scan.fpr"'})
+        else:
+            self._send(404, b'{}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.path == '/ssc/api/v1/fileTokens':
+            self._send(201, json.dumps({'data': {'token': 'file-token'}}).encode())
+        elif self.path.startswith('/ssc/upload/resultFileUpload.html'):
+            self.uploads.append((self.headers['Content-Type'], body))
+            self._send(200, b'<RequestStatus><code>0</code></RequestStatus>', 'text/xml')
+        else:
+            self._send(404, b'{}')
+
+
+@pytest.fixture(scope='module')
+def ssc():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubSSCHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d' % server.server_port
+    server.shutdown()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_get_project_versions(ssc):
+    async def scenario():
+        async with AsyncFortifyApi(ssc, token='secret') as api:
+            return await api.get_project_versions()
+
+    response = run(scenario())
+    assert response.success
+    assert response.response_code == 200
+    assert len(response.data['data']) == VERSION_COUNT
+
+
+def test_error_response(ssc):
+    async def scenario():
+        async with AsyncFortifyApi(ssc, token='wrong') as api:
+            return await api.get_project_versions()
+
+    response = run(scenario())
+    assert not response.success
+    assert '401' in response.message
+    assert response.response_code == 401
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_iter_project_versions(ssc, concurrency):
+    async def scenario():
+        async with AsyncFortifyApi(ssc, token='secret') as api:
+            return [version['id'] async for version in api.iter_project_versions(page_size=10,
+                                                                                  concurrency=concurrency)]
+
+    assert run(scenario()) == list(range(VERSION_COUNT))
+
+
+def test_closing_iterator_waits_for_cancelled_pages(ssc):
+    async def scenario():
+        async with AsyncFortifyApi(ssc, token='secret') as api:
+            versions = api.iter_project_versions(page_size=10, concurrency=4)
+            # Past the first page, with further pages in flight
+            ids = [(await versions.__anext__())['id'] for _ in range(15)]
+            await versions.aclose()
+            return ids, [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    ids, tasks = run(scenario())
+    assert ids == list(range(15))
+    assert tasks == []
+
+
+def test_iter_raises_on_failure(ssc):
+    async def scenario():
+        async with AsyncFortifyApi(ssc, token='wrong') as api:
+            async for _ in api.iter_project_versions():
+                pass
+
+    with pytest.raises(FortifyApiError):
+        run(scenario())
+
+
+def test_download_artifact_scan_streams_to_file(ssc, tmp_path):
+    destination = str(tmp_path / 'scan.fpr')
+
+    async def scenario():
+        async with AsyncFortifyApi(ssc, token='secret') as api:
+            return await api.download_artifact_scan(1, destination=destination, chunk_size=4096, checksum='sha256')
+
+    response, file_name = run(scenario())
+    assert response.success
+    assert file_name == 'scan.fpr'
+    assert response.data == {'size': len(DOWNLOAD_BODY), 'checksum': hashlib.sha256(DOWNLOAD_BODY).hexdigest()}
+    with open(destination, 'rb') as f:
+        assert f.read() == DOWNLOAD_BODY
+
+
+def test_upload_artifact_scan(ssc, tmp_path):
+    scan = tmp_path / 'upload.fpr'
+    scan.write_bytes(b'fpr content' * 1000)
+
+    async def scenario():
+        async with AsyncFortifyApi(ssc, token='secret') as api:
+            return await api.upload_artifact_scan(str(scan), 3, chunk_size=1024)
+
+    response = run(scenario())
+    assert response.success
+    content_type, body = StubSSCHandler.uploads[-1]
+    assert content_type.startswith('multipart/form-data; boundary=')
+    assert b'filename="upload.fpr"' in body
+    assert b'fpr content' * 1000 in body
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.auth import TokenMinter, parse_ssc_date
+from fortifyapi.fortify import FortifyApi
+from fortifyapi.retry import CircuitBreaker
+
+
+def test_credentials_are_sent_once_per_token():
+    with MockSSC(check_tokens=True) as ssc:
+        minter = TokenMinter(token_type='UnifiedLoginToken')
+        with FortifyApi(ssc.url, username='user', password='secret', token_minter=minter, pool_maxsize=8) as api:
+            threads = [threading.Thread(target=api.get_projects) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert api.get_projects().success
+            assert ssc.basic_auths == 1 and minter.mints == 1
+
+            # A revoked token is replaced and the request sent again, once
+            ssc.revoke_tokens()
+            assert api.get_projects().success
+            assert ssc.basic_auths == 2 and minter.mints == 2
+
+            # Tokens are always requested with the credentials
+            assert api.get_token('AnalysisUploadToken').success
+            assert ssc.basic_auths == 3
+
+    with MockSSC(check_tokens=True) as ssc:
+        with FortifyApi(ssc.url, token='unknown') as api:
+            assert api.get_projects().response_code == 401
+
+
+def test_half_open_circuit_recovers_with_a_new_token():
+    with MockSSC(check_tokens=True) as ssc:
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+        with FortifyApi(ssc.url, username='user', password='secret', token_minter=TokenMinter(),
+                        circuit_breaker=breaker) as api:
+            assert api.get_projects().success
+            ssc.error_rate = 1.0
+            assert not api.get_projects().success
+            assert breaker.state == CircuitBreaker.OPEN
+
+            # The token expires while the circuit is open: the trial request has to mint a new one
+            ssc.error_rate = 0.0
+            ssc.revoke_tokens()
+            time.sleep(0.25)
+            assert api.get_projects().success
+            assert breaker.state == CircuitBreaker.CLOSED and ssc.basic_auths == 2
+
+            # Bad credentials are not an SSC failure
+            ssc.revoke_tokens()
+            ssc.reject_basic = True
+            for _ in range(3):
+                response = api.get_projects()
+                assert not response.success and 'Could not mint' in response.message
+            assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_refresh_does_not_stall_concurrent_callers():
+    minted = []
+    release = threading.Event()
+
+    def mint(token_type, ttl):
+        if minted:
+            release.wait(5)
+        minted.append('token-%d' % len(minted))
+        # Within the refresh margin from the start, so every call after the first wants a new token
+        return minted[-1], time.time() + 10
+
+    minter = TokenMinter(refresh_margin=60)
+    assert minter.token(mint) == 'token-0'
+    refreshed = []
+    refresher = threading.Thread(target=lambda: refreshed.append(minter.token(mint)))
+    refresher.start()
+    time.sleep(0.1)
+    # The refresh is in progress: the current token is handed out without waiting for it
+    assert minter.token(mint) == 'token-0'
+    release.set()
+    refresher.join()
+    assert refreshed == ['token-1'] and minter.mints == 2
+
+    minter.invalidate('token-0')
+    assert minter.mints == 2
+    minter.invalidate('token-1')
+    assert minter.token(mint) == 'token-2'
+
+
+def test_parse_ssc_date():
+    assert parse_ssc_date('2017-10-20T14:22:35.000+0000') == 1508509355
+    assert parse_ssc_date('2017-10-20T16:22:35.000+02:00') == 1508509355
+    assert parse_ssc_date('2017-10-20T14:22:35Z') == 1508509355
+    assert parse_ssc_date(None) is None
@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks.run import SCENARIOS, compare, run_scenario
+
+OPTIONS = {
+    'latency': 0.0,
+    'jitter': 0.0,
+    'error_rate': 0.0,
+    'payload_size': 16,
+    'versions': 45,
+    'issues': 7,
+    'page_size': 10,
+    'operations': 12,
+    'batch_size': 5,
+    'concurrency': 3,
+    'transfer_size': 3 * 1024 * 1024 + 17,
+}
+
+
+@pytest.mark.parametrize('name', sorted(SCENARIOS))
+def test_scenario_runs(name):
+    result = run_scenario(name, OPTIONS)
+    assert result['requests'] > 0
+    assert result['p50'] <= result['p99']
+    if 'bytes' in result:
+        assert result['bytes'] == OPTIONS['transfer_size']
+    if name.startswith('list_'):
+        assert result['entities'] == OPTIONS['versions']
+    if name == 'export_issues':
+        assert result['entities'] == 16 * OPTIONS['issues']
+    if name == 'upload_pipeline':
+        assert result['entities'] == OPTIONS['operations']
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': {'list_paged': {'requests_per_second': 100.0, 'p99': 0.010}}}
+    results = {'list_paged': {'requests_per_second': 80.0, 'p99': 0.0105}}
+    rows = dict(((name, metric), regressed) for name, metric, _, _, _, regressed in
+                compare(baseline, results, threshold=0.1))
+    assert rows == {('list_paged', 'requests_per_second'): True, ('list_paged', 'p99'): False}
@@ -0,0 +1,63 @@
+import json
+
+from fortifyapi.fortify import FortifyBulkRequest, FortifyResponse
+
+
+class _Api(object):
+    """Stands in for FortifyApi, answering each bulk POST with the next of the given responses."""
+
+    host = 'https://ssc.example.com'
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.batches = []
+
+    def _request(self, method, url, data=None):
+        assert (method, url) == ('POST', '/ssc/api/v1/bulk')
+        self.batches.append(json.loads(data)['requests'])
+        return self.responses.pop(0)
+
+
+def _bulk_response(*response_codes):
+    data = [{'responses': [{'body': {'responseCode': 200}}, {'body': {'responseCode': code, 'message': str(code)}}]}
+            for code in response_codes]
+    return FortifyResponse(success=True, response_code=200, data={'data': data})
+
+
+def test_sub_responses_are_mapped_to_operations_in_order():
+    api = _Api(_bulk_response(201, 200), _bulk_response(404))
+    with FortifyBulkRequest(api, max_batch_size=2) as bulk:
+        assert bulk.add('POST', '/ssc/api/v1/projectVersions/1/attributes', data=[{'id': 1}]) == 0
+        assert bulk.commit_project_version(2) == 1
+        # The full batch has been sent
+        assert len(bulk) == 0 and len(bulk.responses) == 2
+        assert bulk.update_project_version(3, {'active': False}) == 2
+        assert len(bulk) == 1
+
+    assert api.batches == [
+        [{'uri': api.host + '/ssc/api/v1/projectVersions/1/attributes', 'httpVerb': 'POST', 'postData': [{'id': 1}]},
+         {'uri': api.host + '/ssc/api/v1/projectVersions/2', 'httpVerb': 'PUT', 'postData': {'committed': True}}],
+        [{'uri': api.host + '/ssc/api/v1/projectVersions/3', 'httpVerb': 'PUT', 'postData': {'active': False}}],
+    ]
+    # Each operation gets the last of its sub-responses
+    assert [(response.success, response.response_code) for response in bulk.responses] == \
+        [(True, 201), (True, 200), (False, 404)]
+    assert bulk.responses[0].message == 'OK' and bulk.responses[2].message == '404'
+    assert bulk.responses[1].data == {'responseCode': 200, 'message': '200'}
+
+
+def test_failed_bulk_request_fails_every_operation():
+    failed = FortifyResponse(success=False, message='Service Unavailable', response_code=503)
+    api = _Api(failed, _bulk_response(200))
+    bulk = FortifyBulkRequest(api)
+    for project_version_id in range(3):
+        bulk.commit_project_version(project_version_id)
+    assert bulk.flush() == [failed] * 3
+
+    # A bulk response that does not match the batch fails every operation too
+    bulk.commit_project_version(1)
+    bulk.commit_project_version(2)
+    responses = bulk.flush()
+    assert [(response.success, response.response_code) for response in responses] == [(False, 200)] * 2
+    assert responses[0].message == 'Expected 2 bulk responses but received 1.'
+    assert len(bulk.responses) == 5
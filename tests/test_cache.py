@@ -0,0 +1,71 @@
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi import cache as cache_module
+from fortifyapi.cache import TTLCache
+from fortifyapi.fortify import FortifyApi
+
+
+class _Clock(object):
+    def __init__(self, now=1500000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    cache = TTLCache(ttls={'issue_template': 10}, default_ttl=5)
+    cache.set('issue_template', 1, 'template')
+    cache.set('other', 1, 'other')
+    clock.now += 5
+    assert cache.get('issue_template', 1) == 'template'
+    assert cache.get('other', 1) is None
+    clock.now += 5
+    assert cache.get('issue_template', 1) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set('issue_template', 1, 'one')
+    cache.set('issue_template', 2, 'two')
+    assert cache.get('issue_template', 1) == 'one'
+    cache.set('issue_template', 3, 'three')
+    assert cache.get('issue_template', 2) is None
+    assert cache.get('issue_template', 1) == 'one' and cache.get('issue_template', 3) == 'three'
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'evictions': 1, 'size': 2,
+                             'resources': {'issue_template': {'hits': 3, 'misses': 1}}}
+
+
+def test_invalidate_by_key_resource_or_everything():
+    cache = TTLCache()
+    for resource in ('issue_template', 'file_token'):
+        for key in (1, 2):
+            cache.set(resource, key, key)
+    cache.invalidate('issue_template', 1)
+    assert len(cache) == 3 and cache.get('issue_template', 2) == 2
+    cache.invalidate('issue_template')
+    assert len(cache) == 2 and cache.get('file_token', 1) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_shared_cache_is_keyed_by_host_and_identity():
+    cache = TTLCache()
+    with MockSSC() as ssc, MockSSC() as other:
+        apis = [FortifyApi(ssc.url, token='first', cache=cache), FortifyApi(ssc.url, token='second', cache=cache),
+                FortifyApi(other.url, token='first', cache=cache), FortifyApi(ssc.url, token='first', cache=cache)]
+        for api in apis:
+            assert api.get_file_token('UPLOAD').success
+            assert api.get_issue_template(1).success
+        assert ssc.requests == 4 and other.requests == 2
+        assert cache.stats()['hits'] == 2
+
+        # Only the entry of the instance whose upload failed is dropped
+        apis[0]._invalidate_cache('file_token', 'UPLOAD')
+        apis[1].get_file_token('UPLOAD')
+        assert ssc.requests == 4
+        apis[3].get_file_token('UPLOAD')
+        assert ssc.requests == 5
+        for api in apis:
+            api.close()
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.coalesce import SingleFlight
+from fortifyapi.fortify import FortifyApi
+
+
+def _run_together(count, target):
+    results = [None] * count
+
+    def worker(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_result_or_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def slow(value):
+        release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    error = ValueError('failed')
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results = _run_together(8, lambda: flight.do('ok', lambda: slow(object())))
+    assert all(result is results[0] for result in results)
+
+    release.clear()
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    errors = _run_together(4, lambda: flight.do('error', lambda: slow(error)))
+    assert errors == [error] * 4
+    assert flight.stats() == {'calls': 2, 'shared': 10}
+    assert len(flight) == 0
+
+    # Nothing is kept once a call has returned
+    assert flight.do('ok', lambda: 1) == 1
+    with pytest.raises(KeyError):
+        flight.do('ok', lambda: {}['missing'])
+
+
+@pytest.mark.parametrize('error_rate', [0.0, 1.0])
+def test_identical_gets_are_sent_once(error_rate):
+    with MockSSC(latency=0.2, error_rate=error_rate) as ssc:
+        with FortifyApi(ssc.url, token='test', pool_maxsize=16, single_flight=SingleFlight()) as api:
+            responses = _run_together(16, lambda: api.get_project_version_attributes(3))
+            assert ssc.requests == 1
+            # Writes are never merged
+            _run_together(4, lambda: api.commit_project_version(3))
+            assert ssc.requests == 5
+
+    assert all(response is responses[0] for response in responses)
+    assert responses[0].success == (error_rate == 0.0)
@@ -0,0 +1,87 @@
+import errno
+import hashlib
+import io
+import os
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.fortify import FortifyApi, FortifyResponse
+
+
+def test_failed_file_token_is_returned(tmpdir, monkeypatch):
+    failed = FortifyResponse(success=False, message='Service Unavailable', response_code=503)
+    with MockSSC() as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            monkeypatch.setattr(api, 'get_file_token', lambda purpose: failed)
+            assert api.download_artifact(7, destination=str(tmpdir.join('a.fpr'))) == (failed, '')
+            assert api.download_artifact_scan(7) == (failed, '')
+            path = tmpdir.join('scan.fpr')
+            path.write(b'x')
+            assert api.upload_artifact_scan(str(path), 7) is failed
+            assert ssc.requests == 0
+
+
+def test_batch_keeps_the_downloads_that_succeeded(tmpdir, monkeypatch):
+    with MockSSC(download_size=1000) as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            download = api.download_artifact
+
+            def flaky(artifact_id, **kwargs):
+                if artifact_id == 2:
+                    raise IOError('disk on fire')
+                return download(artifact_id, **kwargs)
+
+            monkeypatch.setattr(api, 'download_artifact', flaky)
+            results = api.download_artifacts([1, 2, 3], str(tmpdir))
+
+    assert results[1][0].success and results[3][0].success
+    response, file_name = results[2]
+    assert not response.success and 'disk on fire' in response.message and file_name == ''
+
+
+def test_download_streams_to_a_file_with_progress_and_checksum(tmpdir):
+    body = os.urandom(300000)
+    calls = []
+    with MockSSC(download_body=body) as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            response, file_name = api.download_artifact(
+                7, destination=str(tmpdir.join('a.fpr')), chunk_size=65536, checksum='sha256',
+                progress=lambda written, total, rate: calls.append((written, total)))
+
+    assert response.success and file_name == 'benchmark.fpr'
+    assert response.data == {'size': len(body), 'checksum': hashlib.sha256(body).hexdigest()}
+    assert tmpdir.join('a.fpr').read_binary() == body
+    assert calls == [(min(n * 65536, len(body)), len(body)) for n in range(1, 6)]
+
+
+def test_download_to_a_file_like_object(tmpdir):
+    body = os.urandom(100000)
+    out = io.BytesIO()
+    with MockSSC(download_body=body) as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            response, _ = api.download_artifact(7, destination=out, checksum='md5')
+    # The caller's file is written to but left open
+    assert out.getvalue() == body and not out.closed
+    assert response.data == {'size': len(body), 'checksum': hashlib.md5(body).hexdigest()}
+
+
+def test_failed_download_removes_the_partial_file(tmpdir):
+    destination = tmpdir.join('a.fpr')
+    with MockSSC(download_body=os.urandom(300000)) as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            # The connection drops half way through the body
+            ssc.download_cut = 150000
+            response, _ = api.download_artifact(7, destination=str(destination), chunk_size=65536)
+            assert not response.success and not destination.exists()
+            ssc.download_cut = None
+
+            # A write that fails, e.g. on a full disk
+            def full(written, total, rate):
+                raise IOError(errno.ENOSPC, 'No space left on device')
+
+            response, _ = api.download_artifact(7, destination=str(destination), progress=full)
+            assert not response.success and 'No space left on device' in response.message
+            assert not destination.exists()
+
+            # An HTTP error status
+            response = api._download('/ssc/api/v1/missing', str(destination))
+            assert response.response_code == 404 and not destination.exists()
@@ -0,0 +1,62 @@
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi import export
+from fortifyapi.fortify import FortifyApi
+
+
+def test_issue_params():
+    params = FortifyApi._issue_params({'q': 'analyzer:"Data Flow"'}, 'filterset-guid', 'folder-guid', True, False,
+                                      False)
+    assert params == {'q': 'analyzer:"Data Flow"', 'qm': 'issues', 'filterset': 'filterset-guid',
+                      'filter': 'FOLDER:folder-guid', 'showhidden': 'true'}
+
+
+def test_export_issues_of_several_versions(tmpdir):
+    with MockSSC(issue_count=25) as ssc:
+        with FortifyApi(ssc.url, token='test', page_size=10) as api:
+            results = api.export_issues([1, 2, 3], str(tmpdir), max_workers=2)
+            missing = api.export_project_version_issues(1, str(tmpdir.join('1.csv')))
+
+    assert sorted(results) == [1, 2, 3]
+    for project_version_id, response in results.items():
+        assert response.success
+        assert response.data['count'] == 25
+        with gzip.open(response.data['path'], 'rb') as f:
+            issues = [json.loads(line.decode('utf-8')) for line in f]
+        assert [issue['id'] for issue in issues] == list(range(25))
+    assert not missing.success and not os.path.exists(str(tmpdir.join('1.csv')))
+
+
+def test_failed_export_removes_the_partial_file(tmpdir):
+    with MockSSC(issue_count=25, error_rate=1.0) as ssc:
+        with FortifyApi(ssc.url, token='test', page_size=10) as api:
+            response = api.export_project_version_issues(1, str(tmpdir.join('1.ndjson.gz')))
+    assert not response.success
+    assert tmpdir.listdir() == []
+
+
+def test_parquet_export(tmpdir):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    with MockSSC(issue_count=25) as ssc:
+        with FortifyApi(ssc.url, token='test', page_size=10) as api:
+            response = api.export_project_version_issues(1, str(tmpdir.join('1.parquet')))
+    table = parquet.read_table(response.data['path'])
+    assert table.num_rows == 25
+    assert table.column('id').to_pylist() == list(range(25))
+    assert json.loads(table.column('project').to_pylist()[0]) == {'id': 0, 'name': 'project-0'}
+
+
+def test_parquet_writer_without_pyarrow(tmpdir, monkeypatch):
+    monkeypatch.setattr(export, 'pyarrow', None)
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    monkeypatch.setitem(sys.modules, 'pyarrow.parquet', None)
+    # Only asking for parquet needs pyarrow
+    export.open_writer(str(tmpdir.join('issues.ndjson'))).close()
+    with pytest.raises(ImportError, match='pip install fortifyapi\\[parquet\\]'):
+        export.open_writer(str(tmpdir.join('issues.parquet')))
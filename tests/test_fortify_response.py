@@ -0,0 +1,46 @@
+import json
+
+import requests
+
+from fortifyapi.fortify import FortifyApi, FortifyResponse
+
+
+def test_raw_body_is_decoded_once_on_first_access():
+    body = json.dumps({'data': [{'id': 1}], 'count': 1}).encode('utf-8')
+    response = FortifyResponse(success=True, response_code=200, raw=body)
+
+    assert response.parse_time is None
+    data = response.data
+    assert data == {'data': [{'id': 1}], 'count': 1}
+    assert response.data is data
+    assert response.parse_time is not None
+
+
+def test_non_json_body_is_returned_as_bytes():
+    response = FortifyResponse(success=True, response_code=200, raw=b'<html></html>')
+    assert response.data == b'<html></html>'
+
+
+def test_empty_body_has_no_data():
+    response = FortifyResponse(success=True, response_code=204, raw=b'')
+    assert response.data is None
+    assert str(response) == 'OK'
+
+
+def test_responses_have_no_instance_dict():
+    assert not hasattr(FortifyResponse(success=True), '__dict__')
+
+
+def test_verify_is_passed_with_every_request(monkeypatch):
+    # A session-level verify=False alone is overridden by REQUESTS_CA_BUNDLE
+    monkeypatch.setenv('REQUESTS_CA_BUNDLE', '/nonexistent/ca.pem')
+    api = FortifyApi('https://ssc.example.com', token='test', verify_ssl=False)
+    sent = []
+
+    def request(**kwargs):
+        sent.append(kwargs)
+        raise requests.exceptions.ConnectionError('not sent')
+
+    monkeypatch.setattr(api._session, 'request', request)
+    assert not api.get_projects().success
+    assert sent[0]['verify'] is False
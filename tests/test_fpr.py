@@ -0,0 +1,151 @@
+import io
+import tracemalloc
+import zipfile
+
+import pytest
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi import fpr
+from fortifyapi.fortify import FortifyApi, FortifyApiError
+
+VULNERABILITY = '''
+    <Vulnerability>
+      <ClassInfo>
+        <ClassID>CLASS-{0}</ClassID>
+        <Kingdom>Input Validation and Representation</Kingdom>
+        <Type>SQL Injection</Type>
+        <AnalyzerName>dataflow</AnalyzerName>
+        <DefaultSeverity>4.0</DefaultSeverity>
+      </ClassInfo>
+      <InstanceInfo>
+        <InstanceID>INSTANCE-{0}</InstanceID>
+        <InstanceSeverity>{1}</InstanceSeverity>
+        <Confidence>5.0</Confidence>
+      </InstanceInfo>
+      <AnalysisInfo>
+        <Unified>
+          <Context><Function name="lookup"/></Context>
+          <Trace><Primary>
+            <Entry><Node><SourceLocation path="src/Source.java" line="3" snippet="S1#3:3"/></Node></Entry>
+            <Entry><Node isDefault="true"><SourceLocation path="src/Dao.java" line="{0}" snippet="S2#{0}:{0}"/></Node></Entry>
+          </Primary></Trace>
+        </Unified>
+      </AnalysisInfo>
+    </Vulnerability>'''
+
+SOURCE_INSTANCE = '''
+    <SourceInstance ruleID="RULE-1"><FunctionCall><SourceLocation path="src/Source.java" line="3"/></FunctionCall>
+    </SourceInstance>'''
+
+FVDL = '''<?xml version="1.0" encoding="UTF-8"?>
+<FVDL xmlns="xmlns://www.fortifysoftware.com/schema/fvdl" version="1.12">
+  <Build><BuildID>test</BuildID></Build>
+  <Vulnerabilities>{vulnerabilities}
+  </Vulnerabilities>
+  <ContextPool><Context id="1"/></ContextPool>
+  <ProgramData><Sources>{sources}</Sources></ProgramData>
+  <Description classID="CLASS-1"><Abstract>Untrusted input in SQL.</Abstract></Description>
+  <Snippets>
+    <Snippet id="S2#10:10"><File>src/Dao.java</File><StartLine>8</StartLine><EndLine>12</EndLine>
+      <Text><![CDATA[stmt.execute(query);]]></Text></Snippet>
+  </Snippets>
+  <EngineData><RuleInfo>
+    <Rule id="RULE-1"><MetaInfo><Group name="Accuracy">4.0</Group><Group name="Impact">5.0</Group></MetaInfo></Rule>
+  </RuleInfo></EngineData>
+</FVDL>'''
+
+
+class _Unseekable(object):
+    """A download stream: read() only."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._data.read(size)
+
+    def write(self, data):
+        return self._data.write(data)
+
+    def flush(self):
+        pass
+
+
+def _fpr(count=3, stream=False, source_count=0):
+    vulnerabilities = ''.join(VULNERABILITY.format(line, 2.0 + line % 2) for line in range(10, 10 + count))
+    sources = SOURCE_INSTANCE * source_count
+    members = [('src-archive/src/Dao.java', b'x' * 100000), ('audit.fvdl', FVDL.format(
+        vulnerabilities=vulnerabilities, sources=sources).encode('utf-8')), ('audit.xml', b'<Audit/>')]
+    buffer = io.BytesIO()
+    # Written to a non-seekable file, zipfile falls back on data descriptors, as Java does
+    out = _Unseekable(b'') if stream else buffer
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return out._data.getvalue() if stream else buffer.getvalue()
+
+
+def test_records_from_a_file(tmpdir):
+    path = str(tmpdir.join('scan.fpr'))
+    with open(path, 'wb') as f:
+        f.write(_fpr())
+
+    records = list(fpr.iter_records(path))
+    findings = [record for record in records if isinstance(record, fpr.Finding)]
+    assert len(findings) == 3
+    assert findings[0] == fpr.Finding(
+        instance_id='INSTANCE-10', class_id='CLASS-10', kingdom='Input Validation and Representation',
+        type='SQL Injection', subtype=None, analyzer='dataflow', default_severity=4.0, instance_severity=2.0,
+        confidence=5.0, file='src/Dao.java', line=10, function='lookup', snippet_id='S2#10:10')
+    assert fpr.Description('CLASS-1', 'Untrusted input in SQL.', None, None) in records
+    assert list(fpr.iter_snippets(path)) == [fpr.Snippet('S2#10:10', 'src/Dao.java', 8, 12, 'stmt.execute(query);')]
+    assert list(fpr.iter_rules(path)) == [fpr.Rule('RULE-1', {'Accuracy': '4.0', 'Impact': '5.0'})]
+    assert fpr.summarize(path) == {'findings': 3, 'by_type': {'SQL Injection': 3}, 'by_analyzer': {'dataflow': 3},
+                                   'by_severity': {2.0: 2, 3.0: 1}}
+
+
+def test_streams_with_data_descriptors():
+    data = _fpr(count=500, stream=True)
+    findings = list(fpr.iter_findings(_Unseekable(data)))
+    assert len(findings) == 500
+    assert findings[-1].instance_id == 'INSTANCE-509'
+
+
+def test_memory_stays_flat_across_skipped_sections():
+    data = _fpr(source_count=20000)
+    tracemalloc.start()
+    try:
+        # Rules come after ProgramData, which is parsed through and dropped element by element
+        rules = list(fpr.iter_rules(io.BytesIO(data)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert rules == [fpr.Rule('RULE-1', {'Accuracy': '4.0', 'Impact': '5.0'})]
+    assert peak < 2 * 1024 * 1024
+
+
+def test_download_stream():
+    with MockSSC(download_body=_fpr(stream=True)) as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            with api.open_artifact_scan(5) as stream:
+                findings = list(fpr.iter_findings(stream))
+    assert [finding.line for finding in findings] == [10, 11, 12]
+
+    with MockSSC(error_rate=1.0) as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            with pytest.raises(FortifyApiError) as raised:
+                with api.open_artifact_scan(5):
+                    pass
+    assert raised.value.response.response_code == 503
+
+
+def test_map_fprs(tmpdir):
+    paths = []
+    for count in (1, 2):
+        path = str(tmpdir.join('{0}.fpr'.format(count)))
+        with open(path, 'wb') as f:
+            f.write(_fpr(count))
+        paths.append(path)
+
+    counts = [(path, summary['findings']) for path, summary in fpr.map_fprs(paths, max_workers=2)]
+    assert counts == [(paths[0], 1), (paths[1], 2)]
@@ -0,0 +1,74 @@
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.fortify import FortifyApi
+from fortifyapi.metrics import Histogram, MetricsCollector, RequestRecord, endpoint_template
+
+
+def test_parse_time_is_reported_on_first_decode():
+    metrics = MetricsCollector()
+    records = []
+    with MockSSC() as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            api.add_hook('post_response', metrics)
+            api.add_hook('post_response', records.append)
+            response = api.get_projects()
+
+    key = 'GET /ssc/api/v1/projects'
+    # Nothing has been decoded yet, so there is no parse time to report
+    assert records[0].parse_time == 0.0
+    assert metrics.snapshot()[key]['parse_time']['count'] == 0
+
+    assert response.data['data']
+    assert records[0].parse_time == response.parse_time > 0
+    parse_time = metrics.snapshot()[key]['parse_time']
+    assert parse_time['count'] == 1 and parse_time['sum'] == response.parse_time
+    assert 'fortifyapi_parse_duration_seconds_count{method="GET",endpoint="/ssc/api/v1/projects"} 1' in \
+        metrics.to_prometheus()
+
+
+def test_percentile_edge_cases():
+    histogram = Histogram(buckets=(1, 2, 4))
+    assert histogram.percentile(50) is None
+    assert histogram.snapshot()['mean'] is None
+
+    histogram.add(1.5)
+    assert [histogram.percentile(q) for q in (0, 50, 99, 100)] == [1.5] * 4
+
+    for value in (0.5, 3, 10):
+        histogram.add(value)
+    assert histogram.percentile(0) == 0.5
+    assert histogram.percentile(100) == 10
+    # Interpolated within the bucket: half of the (2, 4] bucket's single sample
+    assert histogram.percentile(62.5) == 3
+    assert histogram.counts == [1, 1, 1, 1]
+
+
+def test_prometheus_text_format():
+    metrics = MetricsCollector(buckets=(0.1, 1))
+    for elapsed, success, code in ((0.05, True, 200), (0.5, False, 500)):
+        record = RequestRecord('GET', '/ssc/api/v1/projects/7/versions?start=0')
+        record.elapsed, record.success, record.response_code = elapsed, success, code
+        metrics(record)
+
+    labels = 'method="GET",endpoint="/ssc/api/v1/projects/{id}/versions"'
+    lines = metrics.to_prometheus(prefix='ssc').splitlines()
+    assert lines[:4] == ['# TYPE ssc_requests_total counter', 'ssc_requests_total{%s} 2' % labels,
+                         '# TYPE ssc_errors_total counter', 'ssc_errors_total{%s} 1' % labels]
+    start = lines.index('# TYPE ssc_request_duration_seconds histogram')
+    assert lines[start + 1:start + 6] == [
+        'ssc_request_duration_seconds_bucket{%s,le="0.1"} 1' % labels,
+        'ssc_request_duration_seconds_bucket{%s,le="1"} 2' % labels,
+        'ssc_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels,
+        'ssc_request_duration_seconds_sum{%s} 0.55' % labels,
+        'ssc_request_duration_seconds_count{%s} 2' % labels,
+    ]
+    assert metrics.snapshot()['GET /ssc/api/v1/projects/{id}/versions']['status_codes'] == {'200': 1, '500': 1}
+
+
+def test_endpoint_template_collapses_identifiers():
+    assert endpoint_template('/ssc/api/v1/projectVersions/42/attributes?start=0') == \
+        '/ssc/api/v1/projectVersions/{id}/attributes'
+    assert endpoint_template('/ssc/api/v1/projects/1/versions/22') == '/ssc/api/v1/projects/{id}/versions/{id}'
+    assert endpoint_template('/ssc/api/v1/cloudjobs/6b1e2f7c-1a2b-4c3d-8e9f-0123456789ab') == \
+        '/ssc/api/v1/cloudjobs/{id}'
+    # Version segments and names are kept
+    assert endpoint_template('/ssc/api/v1/projects') == '/ssc/api/v1/projects'
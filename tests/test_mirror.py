@@ -0,0 +1,25 @@
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.fortify import FortifyApi
+from fortifyapi.mirror import FortifyMirror
+
+
+def test_refresh_is_incremental_and_lookups_use_names():
+    with MockSSC(project_count=4, version_count=10, attribute_definition_count=3) as ssc:
+        with FortifyApi(ssc.url, token='test', page_size=4) as api, FortifyMirror(api) as mirror:
+            assert mirror.refresh() == {'attribute_definitions': 3, 'project_versions': 10, 'projects': 4}
+            assert mirror.project_id('projects-2') == 2
+            assert mirror.project_version(7)['name'] == 'projectVersions-7'
+            assert mirror.project_version_id('project-7', 'projectVersions-7') == 7
+            assert mirror.attribute_definition_id('attributeDefinitions-1') == 1
+            assert mirror.project_id('missing') is None
+
+            ssc.version_count = 13
+            requests_before = ssc.requests
+            assert mirror.refresh(resources=['project_versions']) == {'project_versions': 3}
+            # The newest page holds the three new versions and the first known one, so one request is enough
+            assert ssc.requests == requests_before + 1
+            assert mirror.project_version_id('project-12', 'projectVersions-12') == 12
+
+            ssc.version_count = 5
+            assert mirror.refresh(full=True, resources=['project_versions']) == {'project_versions': 5}
+            assert mirror.project_version(12) is None
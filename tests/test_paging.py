@@ -0,0 +1,80 @@
+import random
+import threading
+import time
+
+import pytest
+
+from fortifyapi.fortify import FortifyApi, FortifyApiError, FortifyResponse
+
+TOTAL = 95
+
+
+class _Pages(object):
+    """Stands in for FortifyApi._get_page, serving ids 0 to TOTAL - 1 with a random delay per page."""
+
+    def __init__(self, fail_at=None, gate=None):
+        self.fail_at = fail_at
+        self.gate = gate
+        self.started = []
+        self.finished = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, params, start, limit):
+        with self._lock:
+            self.started.append(start)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.gate is not None and start >= 20:
+                self.gate.wait(5)
+            time.sleep(random.uniform(0, 0.02))
+            if start == self.fail_at:
+                raise FortifyApiError(FortifyResponse(success=False, message='Service Unavailable',
+                                                      response_code=503))
+            return list(range(start, min(start + limit, TOTAL))), TOTAL
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.finished.append(start)
+
+
+@pytest.fixture
+def api():
+    with FortifyApi('http://localhost:1', token='test') as api:
+        yield api
+
+
+def test_concurrent_pages_are_yielded_in_order(api, monkeypatch):
+    pages = _Pages()
+    monkeypatch.setattr(api, '_get_page', pages)
+    assert list(api.iter_projects(page_size=10, concurrency=4)) == list(range(TOTAL))
+    assert sorted(pages.started) == list(range(0, TOTAL, 10))
+    assert pages.max_in_flight <= 4
+
+
+def test_failed_page_raises(api, monkeypatch):
+    monkeypatch.setattr(api, '_get_page', _Pages(fail_at=50))
+    seen = []
+    with pytest.raises(FortifyApiError) as raised:
+        for entity in api.iter_projects(page_size=10, concurrency=4):
+            seen.append(entity)
+    assert seen == list(range(50))
+    assert raised.value.response.response_code == 503
+
+
+def test_close_cancels_and_joins_pending_pages(api, monkeypatch):
+    gate = threading.Event()
+    pages = _Pages(gate=gate)
+    monkeypatch.setattr(api, '_get_page', pages)
+    projects = api.iter_projects(page_size=10, concurrency=3)
+    # Into the second page: pages 20, 30 and 40 are in flight or queued, held by the gate
+    assert [next(projects) for _ in range(11)] == list(range(11))
+
+    threading.Timer(0.1, gate.set).start()
+    projects.close()
+    # Nothing beyond the window was requested; pages not cancelled in time had finished by the time close() returned
+    assert set(pages.started) <= set([0, 10, 20, 30, 40]) and set([0, 10, 20, 30]) <= set(pages.started)
+    assert sorted(pages.finished) == sorted(pages.started)
+    assert pages.in_flight == 0
@@ -0,0 +1,115 @@
+import pytest
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.fortify import FortifyApi, FortifyApiError
+from fortifyapi.poller import CloudscanPoller
+
+INTERVALS = dict((state, 0.01) for state in CloudscanPoller.INTERVALS)
+
+
+def test_jobs_are_polled_in_bulk_until_terminal():
+    with MockSSC() as ssc:
+        ssc.cloudscan_jobs.update(('job-%d' % n, ['QUEUED', 'SCAN_RUNNING', 'UPLOAD_COMPLETED']) for n in range(60))
+        ssc.cloudscan_jobs['failing'] = ['SCAN_RUNNING', 'SCAN_FAILED']
+        changes = []
+        with FortifyApi(ssc.url, token='test') as api:
+            poller = CloudscanPoller(api, intervals=INTERVALS, default_interval=0.01,
+                                     on_state_change=lambda key, state, job: changes.append((key, state)))
+            futures = dict((token, poller.track(token)) for token in ssc.cloudscan_jobs)
+            missing = poller.track('missing')
+            assert poller.wait(timeout=10)
+
+    assert all(futures['job-%d' % n].result()['jobState'] == 'UPLOAD_COMPLETED' for n in range(60))
+    assert futures['failing'].result()['jobState'] == 'SCAN_FAILED'
+    with pytest.raises(FortifyApiError):
+        missing.result()
+    # Three ticks of 62 jobs, two bulk requests each
+    assert poller.requests == ssc.requests == 6
+    assert changes.count(('job-0', 'SCAN_RUNNING')) == 1
+
+
+def test_background_thread_and_callbacks():
+    done = []
+    with MockSSC() as ssc:
+        ssc.cloudscan_jobs['job'] = ['PENDING', 'UPLOAD_RUNNING', 'UPLOAD_COMPLETED']
+        with FortifyApi(ssc.url, token='test') as api:
+            with CloudscanPoller(api, intervals=INTERVALS) as poller:
+                future = poller.track('job', callback=done.append)
+                assert future.result(timeout=10)['jobState'] == 'UPLOAD_COMPLETED'
+                assert len(poller) == 0
+    assert done == [future]
+
+
+def test_backoff_grows_while_the_state_is_unchanged():
+    poller = CloudscanPoller(api=None, backoff_factor=2, max_interval=100)
+    tracked = type('Tracked', (), {'state': 'SCAN_RUNNING', 'unchanged': 0})()
+    assert poller._interval(tracked) == 30
+    tracked.unchanged = 1
+    assert poller._interval(tracked) == 60
+    tracked.unchanged = 5
+    assert poller._interval(tracked) == 100
+
+
+class _FailingPoller(CloudscanPoller):
+    def url(self, key):
+        if key == 'bad-url':
+            raise ValueError('no url for ' + key)
+        return super(_FailingPoller, self).url(key)
+
+
+def test_errors_fail_only_the_affected_futures():
+    def on_state_change(key, state, job):
+        if key == 'bad-callback' and state == 'SCAN_RUNNING':
+            raise RuntimeError('callback failed')
+
+    with MockSSC() as ssc:
+        for key in ('job', 'bad-callback', 'bad-url'):
+            ssc.cloudscan_jobs[key] = ['QUEUED', 'SCAN_RUNNING', 'SCAN_RUNNING', 'UPLOAD_COMPLETED']
+        with FortifyApi(ssc.url, token='test') as api:
+            bulk = api.bulk
+            calls = []
+
+            def malformed_once(max_batch_size):
+                calls.append(max_batch_size)
+                batch = bulk(max_batch_size=max_batch_size)
+                if len(calls) == 3:
+                    # The bulk body of the third tick is not what FortifyBulkRequest expects
+                    batch._send = lambda sub_requests: [][0]
+                return batch
+
+            api.bulk = malformed_once
+            with _FailingPoller(api, intervals=INTERVALS, default_interval=0.01,
+                                on_state_change=on_state_change) as poller:
+                futures = dict((key, poller.track(key)) for key in ('job', 'bad-callback', 'bad-url'))
+                with pytest.raises(ValueError):
+                    futures['bad-url'].result(timeout=10)
+                with pytest.raises(RuntimeError):
+                    futures['bad-callback'].result(timeout=10)
+                # Failed along with the third tick
+                with pytest.raises(IndexError):
+                    futures['job'].result(timeout=10)
+
+                # The thread survives, later entities are polled normally
+                ssc.cloudscan_jobs['later'] = ['SCAN_RUNNING', 'UPLOAD_COMPLETED']
+                assert poller.track('later').result(timeout=10)['jobState'] == 'UPLOAD_COMPLETED'
+                assert poller.wait(timeout=10)
+
+
+def test_background_thread_survives_a_failing_tick():
+    with MockSSC() as ssc:
+        ssc.cloudscan_jobs['job'] = ['SCAN_RUNNING', 'UPLOAD_COMPLETED']
+        with FortifyApi(ssc.url, token='test') as api:
+            poller = CloudscanPoller(api, intervals=INTERVALS, default_interval=0.01)
+            poll = poller.poll
+            failures = []
+
+            def fail_once():
+                if not failures:
+                    failures.append(True)
+                    raise RuntimeError('tick failed')
+                return poll()
+
+            poller.poll = fail_once
+            with poller:
+                assert poller.track('job').result(timeout=10)['jobState'] == 'UPLOAD_COMPLETED'
+    assert failures
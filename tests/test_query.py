@@ -0,0 +1,34 @@
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.fortify import FortifyApi
+from fortifyapi.query import Query, query_params
+
+
+def test_params_combine_projection_search_and_ordering():
+    query = Query().select('id', 'name', 'project.name', 'project.id').where(name='1.0', issueTemplateId='a b"c')
+    query.order_by('-id', 'name')
+    assert query.params() == {
+        'fields': 'id,name,project',
+        'q': 'issueTemplateId:"a b\\"c"+name:1.0',
+        'orderby': '-id,name',
+    }
+
+
+def test_constructor_matches_builder():
+    built = Query().select('id').where('name:"Development Phase"').order_by('-id')
+    assert Query(fields='id', q='name:"Development Phase"', orderby='-id') == built
+    assert Query(q={'id': 7}).params() == {'q': 'id:7'}
+
+
+def test_query_params_accepts_dicts_and_none():
+    assert query_params(None) is None
+    assert query_params(Query()) is None
+    assert query_params({'fields': 'id'}) == {'fields': 'id'}
+
+
+def test_listing_is_projected():
+    with MockSSC(version_count=3) as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            response = api.get_project_versions(query=Query().select('id', 'project.name'))
+            versions = list(api.iter_project_versions(page_size=2, query={'fields': 'name'}))
+    assert [sorted(version) for version in response.data['data']] == [['id', 'project']] * 3
+    assert versions == [{'name': 'projectVersions-%d' % n} for n in range(3)]
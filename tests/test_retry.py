@@ -0,0 +1,122 @@
+import email.utils
+import time
+
+import pytest
+import requests
+
+from fortifyapi import retry
+from fortifyapi.fortify import FortifyApi
+from fortifyapi.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class _Clock(object):
+    def __init__(self, now=1500000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def gmtime(self):
+        return time.gmtime(self.now)
+
+
+def _response(status_code, retry_after=None):
+    response = requests.Response()
+    response.status_code = status_code
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return response
+
+
+def test_backoff_is_jittered_below_the_exponential_bound(monkeypatch):
+    policy = RetryPolicy(max_retries=10, backoff_factor=0.5, max_backoff=3, budget_cap=1000)
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: high)
+    assert [policy.delay_for_response('GET', _response(503), attempt) for attempt in range(5)] == [0.5, 1, 2, 3, 3]
+    monkeypatch.undo()
+
+    for attempt in range(5):
+        for _ in range(20):
+            assert 0 <= policy.delay_for_response('GET', _response(503), attempt) <= min(3, 0.5 * 2 ** attempt)
+    assert policy.delay_for_response('GET', _response(503), 10) is None
+    # Writes are not retried on a response, and nothing is retried on success
+    assert policy.delay_for_response('POST', _response(503), 0) is None
+    assert policy.delay_for_response('GET', _response(200), 0) is None
+
+
+def test_retry_after_takes_precedence(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(retry, 'time', clock)
+    policy = RetryPolicy(max_retry_after=60)
+    assert policy.delay_for_response('GET', _response(429, '7'), 0) == 7
+    assert policy.delay_for_response('GET', _response(429, '600'), 0) == 60
+    date = email.utils.formatdate(clock.now + 20, usegmt=True)
+    assert policy.delay_for_response('GET', _response(503, date), 0) == 20
+    # A date in the past means retry now, a malformed header falls back to backoff
+    assert policy.delay_for_response('GET', _response(503, email.utils.formatdate(clock.now - 20)), 0) == 0
+    assert 0 <= policy.delay_for_response('GET', _response(503, 'soon'), 0) <= policy.backoff_factor
+
+
+def test_budget_limits_retries_across_requests():
+    policy = RetryPolicy(budget_ratio=0.5, budget_cap=2)
+    error = requests.exceptions.ConnectTimeout()
+    assert policy.delay_for_exception('GET', error, 0) is not None
+    assert policy.delay_for_exception('GET', error, 0) is not None
+    assert policy.delay_for_exception('GET', error, 0) is None
+    policy.on_request()
+    assert policy.delay_for_exception('GET', error, 0) is None
+    policy.on_request()
+    assert policy.delay_for_exception('GET', error, 0) is not None
+    # The budget never grows beyond its cap
+    for _ in range(10):
+        policy.on_request()
+    assert [policy.delay_for_exception('GET', error, 0) is not None for _ in range(3)] == [True, True, False]
+
+
+def test_circuit_opens_and_closes_again_after_a_trial(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(retry, 'time', clock)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    assert breaker.retry_in() == 30
+
+    clock.now += 30
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    # A single trial at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow() and breaker.retry_in() == 0
+
+
+def test_client_side_error_releases_the_trial(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(retry, 'time', clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    api = FortifyApi('http://localhost:1', token='test', circuit_breaker=breaker)
+
+    def fail(**kwargs):
+        raise ValueError('client side')
+
+    monkeypatch.setattr(api._session, 'request', fail)
+    with pytest.raises(ValueError):
+        api._send('GET', '/ssc/api/v1/projects')
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(ValueError):
+        api._send('GET', '/ssc/api/v1/projects')
+
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        api._send('GET', '/ssc/api/v1/projects')
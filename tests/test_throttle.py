@@ -0,0 +1,130 @@
+import io
+
+import pytest
+import requests
+
+from fortifyapi import retry, throttle
+from fortifyapi.fortify import FortifyApi
+from fortifyapi.retry import RetryPolicy
+from fortifyapi.throttle import Throttle, TokenBucket
+
+
+class _Clock(object):
+    """Fake clock: sleeping advances it instead of waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(throttle, '_clock', clock)
+    monkeypatch.setattr(throttle, 'time', clock)
+    return clock
+
+
+def test_burst_is_served_without_waiting(clock):
+    bucket = TokenBucket(rate=2, burst=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [0.5]
+    assert TokenBucket(rate=0.5).burst == 1 and TokenBucket(rate=10).burst == 10
+
+
+def test_tokens_refill_at_rate_up_to_burst(clock):
+    bucket = TokenBucket(rate=4, burst=2)
+    bucket.acquire(2)
+    clock.now += 0.25
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [0.25]
+
+    # A long idle period saves up no more than burst tokens
+    clock.now += 60
+    bucket.acquire(2)
+    bucket.acquire()
+    assert clock.sleeps == [0.25, 0.25]
+
+    # Sustained use is held to rate per second
+    started, clock.sleeps = clock.now, []
+    for _ in range(40):
+        bucket.acquire()
+    assert clock.now - started == pytest.approx(10)
+
+
+def test_in_flight_limit_is_released_on_exit(clock):
+    limited = Throttle(max_in_flight=2)
+    with limited:
+        with limited:
+            assert not limited._semaphore.acquire(False)
+        assert limited._semaphore.acquire(False)
+        limited._semaphore.release()
+    # Unlimited throttles never block or sleep
+    for _ in range(100):
+        with Throttle():
+            pass
+    assert clock.sleeps == []
+
+
+def test_heavy_endpoints_have_their_own_bucket(clock):
+    light, heavy = Throttle(rate=10, burst=1), Throttle(rate=1, burst=1)
+    api = FortifyApi('http://localhost:1', token='test', throttle=light, heavy_throttle=heavy)
+    for url in ('/ssc/upload/resultFileUpload.html?mat=1', '/ssc/download/artifactDownload.html?mat=1',
+                '/ssc/api/v1/projects?start=-1&limit=-1'):
+        assert api._throttle_for(url) is heavy
+    assert api._throttle_for('/ssc/api/v1/projects?start=0&limit=200') is light
+
+    with api._throttle_for('/ssc/upload/resultFileUpload.html?mat=1'):
+        pass
+    # The heavy bucket is empty, the light one is untouched
+    with api._throttle_for('/ssc/api/v1/projects'):
+        pass
+    assert clock.sleeps == []
+    with api._throttle_for('/ssc/download/artifactDownload.html?mat=1'):
+        pass
+    assert clock.sleeps == [1.0]
+
+    assert FortifyApi('http://localhost:1', throttle=light)._throttle_for('/ssc/upload/x') is light
+
+
+def test_retries_take_a_token_each_and_free_the_slot_while_waiting(clock, monkeypatch):
+    limited = Throttle(rate=0.1, burst=1, max_in_flight=1)
+    api = FortifyApi('http://localhost:1', token='test', throttle=limited,
+                     retry=RetryPolicy(max_retries=2, backoff_factor=4, max_backoff=8))
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: high)
+    sent, waits = [], []
+
+    def request(**kwargs):
+        sent.append(clock.now)
+        response = requests.Response()
+        response.status_code, response.raw = 503, io.BytesIO()
+        return response
+
+    def sleep(seconds, advance=clock.sleep):
+        free = limited._semaphore.acquire(False)
+        if free:
+            limited._semaphore.release()
+        waits.append((seconds, free))
+        advance(seconds)
+
+    monkeypatch.setattr(api._session, 'request', request)
+    monkeypatch.setattr(clock, 'sleep', sleep)
+    assert api.get_projects().response_code == 503
+    # Each retry waits out its backoff, then for a token as one is added every 10 seconds
+    assert sent == pytest.approx([1000, 1010, 1020])
+    # The slot is free during the backoff and held while waiting for a token
+    assert [seconds for seconds, _ in waits] == pytest.approx([4, 6, 8, 2])
+    assert [free for _, free in waits] == [True, False, True, False]
+    assert limited._semaphore.acquire(False)
@@ -0,0 +1,73 @@
+import pytest
+
+from benchmarks.mock_ssc import MockSSC
+from fortifyapi.fortify import FortifyApi, FortifyApiError, FortifyResponse, MultipartFileEncoder
+from fortifyapi.poller import ArtifactPoller
+from fortifyapi.upload import UploadPipeline
+
+INTERVALS = dict((state, 0.01) for state in ArtifactPoller.INTERVALS)
+
+
+def _scans(tmpdir, count):
+    for n in range(3):
+        tmpdir.join('scan-{0}.fpr'.format(n)).write(b'x' * 1000)
+    return [str(tmpdir.join('scan-{0}.fpr'.format(n % 3))) for n in range(count)]
+
+
+def test_uploads_share_a_token_and_wait_for_processing(tmpdir):
+    urls = []
+    with MockSSC() as ssc:
+        with FortifyApi(ssc.url, token='test', pool_maxsize=8) as api:
+            api.add_hook('post_response', lambda record: urls.append(record.url))
+            poller = ArtifactPoller(api, intervals=INTERVALS, default_interval=0.01)
+            with UploadPipeline(api, max_workers=4, poller=poller) as pipeline:
+                # Files of the same name uploaded to the same version are all found
+                uploads = [(path, 100 + n % 2) for n, path in enumerate(_scans(tmpdir, 12))]
+                futures = pipeline.upload_all(uploads)
+                artifacts = [future.result(timeout=10) for future in futures]
+            poller.stop()
+
+    assert [artifact['status'] for artifact in artifacts] == ['PROCESS_COMPLETE'] * 12
+    assert len(set(artifact['id'] for artifact in artifacts)) == 12
+    assert [artifact['projectVersionId'] for artifact in artifacts] == [version for _, version in uploads]
+    assert sum(1 for url in urls if url.endswith('/fileTokens')) == 1
+
+
+def test_processing_errors_resolve_the_future(tmpdir):
+    with MockSSC() as ssc:
+        ssc.artifact_states = ['PROCESSING', 'ERROR_PROCESSING']
+        with FortifyApi(ssc.url, token='test') as api:
+            pipeline = UploadPipeline(api, poller=ArtifactPoller(api, intervals=INTERVALS))
+            with pipeline:
+                future = pipeline.submit(_scans(tmpdir, 1)[0], 7)
+            # Leaving the pipeline waits for processing
+            assert future.done()
+    assert future.result()['status'] == 'ERROR_PROCESSING'
+
+
+def test_file_token_failure_fails_the_uploads(tmpdir, monkeypatch):
+    failed = FortifyResponse(success=False, message='Service Unavailable', response_code=503)
+    with MockSSC() as ssc:
+        with FortifyApi(ssc.url, token='test') as api:
+            monkeypatch.setattr(api, 'get_file_token', lambda purpose: failed)
+            with UploadPipeline(api, poller=ArtifactPoller(api, intervals=INTERVALS)) as pipeline:
+                futures = pipeline.upload_all((path, 7) for path in _scans(tmpdir, 4))
+    for future in futures:
+        with pytest.raises(FortifyApiError) as raised:
+            future.result()
+        assert raised.value.response is failed
+
+
+def test_encoder_reports_progress_once_per_chunk(tmpdir):
+    path = tmpdir.join('scan.fpr')
+    path.write(b'x' * 10000)
+    calls = []
+    with MultipartFileEncoder('file', str(path), chunk_size=1000,
+                              progress=lambda sent, total, rate: calls.append((sent, total))) as body:
+        # Read the way http.client does, in blocks much smaller than a chunk
+        sent = b''.join(iter(lambda: body.read(100), b''))
+
+    assert len(sent) == body.len
+    assert len(calls) == body.len // 1000 + 1
+    assert [sent for sent, _ in calls[:-1]] == [n * 1000 for n in range(1, len(calls))]
+    assert calls[-1] == (body.len, body.len)